@@ -5,11 +5,13 @@
 
 
 # Purpose: Publish android packages to local maven repo, but only if changed since last publish.
+#          Only the components that changed, and the components depending on them, are published.
 # Dependencies: None
 # Usage: ./automation/publish_to_maven_local_if_modified.py
 
 import argparse
 import hashlib
+import json
 import os
 import subprocess
 import sys
@@ -39,95 +41,279 @@ def find_project_root():
 
 LAST_CONTENTS_HASH_FILE = ".lastAutoPublishContentsHash"
 
+# Maps every file to its content hash and the stat() values it was hashed with, like git's
+# own index does, so that unchanged files are never read again.
+INDEX_FILE = ".lastAutoPublishIndex"
+INDEX_VERSION = 1
+
+# Never part of the hashed contents, they change on every publication.
+STATE_FILES = {LAST_CONTENTS_HASH_FILE, INDEX_FILE}
+
+BUILD_CONFIG_FILE = ".buildconfig.yml"
+
 GITIGNORED_FILES_THAT_AFFECT_THE_BUILD = ["local.properties"]
 
-parser = argparse.ArgumentParser(
-    description="Publish android packages to local maven repo, but only if changed since last publish"
-)
-parser.parse_args()
+# Key of the hash covering everything outside of components, e.g. build scripts and plugins.
+# When it changes, every component is published.
+GLOBAL_HASH_KEY = ""
+
+
+def load_components():
+    """Read name, path, publish flag and upstream dependencies of every project in .buildconfig.yml.
+
+    The file is always written by yaml.safe_dump (see taskcluster/scripts/lint), so a line
+    based reader is enough and keeps this script free of dependencies.
+    """
+    components = {}
+    current = None
+    in_dependencies = False
+    with open(BUILD_CONFIG_FILE) as f:
+        for line in f:
+            stripped = line.strip()
+            indent = len(line) - len(line.lstrip(" "))
+            if indent == 2 and stripped.endswith(":"):
+                current = components.setdefault(
+                    stripped[:-1],
+                    {"path": None, "publish": False, "upstream_dependencies": []},
+                )
+                in_dependencies = False
+            elif current is not None and indent == 4:
+                key, _, value = stripped.partition(":")
+                in_dependencies = stripped.startswith("- ") and in_dependencies
+                if stripped.startswith("- ") and in_dependencies:
+                    current["upstream_dependencies"].append(stripped[2:])
+                elif key == "path":
+                    current["path"] = value.strip()
+                elif key == "publish":
+                    current["publish"] = value.strip() == "true"
+                elif key == "upstream_dependencies":
+                    in_dependencies = True
+    return components
+
+
+def component_for_path(path, components_by_path):
+    """Return the name of the component containing path, or GLOBAL_HASH_KEY."""
+    # Longest path first, so that nested projects win over their parent
+    for component_path, name in components_by_path:
+        if path == component_path or path.startswith(component_path + "/"):
+            return name
+    return GLOBAL_HASH_KEY
+
+
+def list_files():
+    """List the files that can affect the build: tracked and untracked files, sans standard exclusions."""
+    # -c is for cached (i.e. tracked) files and -o for other (i.e. untracked) files
+    # --exclude-standard is to handle standard Git exclusions: .git/info/exclude, .gitignore in each directory,
+    # and the user's global exclusion file.
+    listed = run_cmd_checked(
+        ["git", "ls-files", "-c", "-o", "--exclude-standard", "-z"], capture_output=True
+    ).stdout
+    files = {nm.decode() for nm in listed.split(b"\x00") if nm}
+
+    # Then, account for some excluded files that we care about.
+    files.update(GITIGNORED_FILES_THAT_AFFECT_THE_BUILD)
+
+    # Skip files that don't exist, e.g. missing GITIGNORED_FILES_THAT_AFFECT_THE_BUILD or deleted tracked files.
+    return sorted(nm for nm in files - STATE_FILES if os.path.isfile(nm))
+
+
+def list_directories(files):
+    directories = {"."}
+    for nm in files:
+        directory = os.path.dirname(nm)
+        while directory and directory not in directories:
+            directories.add(directory)
+            directory = os.path.dirname(directory)
+    return directories
+
 
-root_dir = find_project_root()
-if str(root_dir) != os.path.abspath(os.curdir):
-    fatal_err(
-        f"This only works if run from the repo root ({root_dir!r} != {os.path.abspath(os.curdir)!r})"
+def load_index():
+    try:
+        with open(INDEX_FILE) as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return index if index.get("version") == INDEX_VERSION else None
+
+
+def is_file_list_unchanged(index):
+    """Adding, removing or renaming a file updates the mtime of its directory, so the file list
+    only needs to be asked to git again when the mtime of one of the directories changed."""
+    for directory, mtime_ns in index["directories"].items():
+        try:
+            if os.stat(directory).st_mtime_ns != mtime_ns:
+                return False
+        except FileNotFoundError:
+            return False
+    # Changed ignore rules can change the file list without touching any directory.
+    return not any(
+        os.path.basename(nm) == ".gitignore"
+        and file_stat_key(nm) != index["files"][nm][:3]
+        for nm in index["files"]
     )
 
-# Calculate a hash reflecting the current state of the repo.
-
-contents_hash = hashlib.sha256()
-
-contents_hash.update(
-    run_cmd_checked(["git", "rev-parse", "HEAD"], capture_output=True).stdout
-)
-contents_hash.update(b"\x00")
-
-# Get a diff of all tracked (staged and unstaged) files.
-
-changes = run_cmd_checked(["git", "diff", "HEAD", "."], capture_output=True).stdout
-contents_hash.update(changes)
-contents_hash.update(b"\x00")
-
-# But unfortunately it can only tell us the names of untracked
-# files, and it won't tell us anything about files that are in
-# .gitignore but can still affect the build.
-
-untracked_files = []
-
-# Get a list of all untracked files sans standard exclusions.
-
-# -o is for getting other (i.e. untracked) files
-# --exclude-standard is to handle standard Git exclusions: .git/info/exclude, .gitignore in each directory,
-# and the user's global exclusion file.
-changes_others = run_cmd_checked(
-    ["git", "ls-files", "-o", "--exclude-standard"], capture_output=True
-).stdout
-changes_lines = iter(ln.strip() for ln in changes_others.split(b"\n"))
-
-try:
-    ln = next(changes_lines)
-    while ln:
-        untracked_files.append(ln)
-        ln = next(changes_lines)
-except StopIteration:
-    pass
-
-# Then, account for some excluded files that we care about.
-untracked_files.extend(GITIGNORED_FILES_THAT_AFFECT_THE_BUILD)
-
-# Finally, get hashes of everything.
-# Skip files that don't exist, e.g. missing GITIGNORED_FILES_THAT_AFFECT_THE_BUILD. `hash-object` errors out if it gets
-# a non-existent file, so we hope that disk won't change between this filter and the cmd run just below.
-filtered_untracked = [nm for nm in untracked_files if os.path.isfile(nm)]
-# Reading contents of the files is quite slow when there are lots of them, so delegate to `git hash-object`.
-git_hash_object_cmd = ["git", "hash-object"]
-git_hash_object_cmd.extend(filtered_untracked)
-changes_untracked = run_cmd_checked(git_hash_object_cmd, capture_output=True).stdout
-contents_hash.update(changes_untracked)
-contents_hash.update(b"\x00")
-
-contents_hash = contents_hash.hexdigest()
-
-# If the contents hash has changed since last publish, re-publish.
-last_contents_hash = ""
-try:
-    with open(LAST_CONTENTS_HASH_FILE) as f:
-        last_contents_hash = f.read().strip()
-except FileNotFoundError:
-    pass
-
-if contents_hash == last_contents_hash:
-    print("Contents have not changed, no need to publish")
-else:
-    print("Contents have changed, publishing")
-    if sys.platform.startswith("win"):
-        run_cmd_checked(
-            ["gradlew.bat", "publishToMavenLocal", f"-Plocal={time.time_ns()}"],
-            shell=True,
-        )
+
+def file_stat_key(nm):
+    try:
+        st = os.stat(nm)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def hash_file(nm):
+    file_hash = hashlib.sha256()
+    with open(nm, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def update_index(index):
+    """Return an index of the current files, only hashing the files whose stat() changed."""
+    if index is not None and is_file_list_unchanged(index):
+        files = list(index["files"])
+        directories = index["directories"]
     else:
-        run_cmd_checked(
-            ["./gradlew", "publishToMavenLocal", f"-Plocal={time.time_ns()}"]
+        files = list_files()
+        directories = {
+            directory: os.stat(directory).st_mtime_ns
+            for directory in list_directories(files)
+        }
+
+    previous_files = index["files"] if index is not None else {}
+    # Files modified within the same timestamp granularity as the previous index was written
+    # may have changed without their stat() changing, so never trust those entries.
+    racy_after_ns = index["written_at_ns"] if index is not None else 0
+
+    indexed_files = {}
+    for nm in files:
+        stat_key = file_stat_key(nm)
+        if stat_key is None:
+            # Deleted since the directories were checked, the next run will pick it up.
+            continue
+        previous = previous_files.get(nm)
+        if previous is not None and previous[:3] == stat_key and stat_key[0] < racy_after_ns:
+            indexed_files[nm] = previous
+        else:
+            indexed_files[nm] = stat_key + [hash_file(nm)]
+
+    return {
+        "version": INDEX_VERSION,
+        "written_at_ns": time.time_ns(),
+        "directories": directories,
+        "files": indexed_files,
+    }
+
+
+def save_index(index):
+    with open(INDEX_FILE, "w") as f:
+        json.dump(index, f)
+
+
+def compute_contents_hashes(components, index):
+    """Calculate one hash per component, plus GLOBAL_HASH_KEY, reflecting the current state of the repo."""
+    components_by_path = sorted(
+        ((component["path"], name) for name, component in components.items()),
+        key=lambda entry: -len(entry[0]),
+    )
+    hashes = {
+        name: hashlib.sha256() for name in list(components) + [GLOBAL_HASH_KEY]
+    }
+
+    for nm, entry in sorted(index["files"].items()):
+        hashes[component_for_path(nm, components_by_path)].update(
+            nm.encode() + b"\x00" + entry[3].encode() + b"\x00"
         )
+
+    return {name: contents_hash.hexdigest() for name, contents_hash in hashes.items()}
+
+
+def load_last_contents_hashes():
+    try:
+        with open(LAST_CONTENTS_HASH_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        # Nothing was published yet, or by a version of this script storing a single hash.
+        return {}
+
+
+def components_to_publish(components, contents_hashes, last_contents_hashes):
+    """Return the publishable components that changed or depend on one that changed, or None for all of them."""
+    if contents_hashes.get(GLOBAL_HASH_KEY) != last_contents_hashes.get(GLOBAL_HASH_KEY):
+        return None
+
+    changed = {
+        name
+        for name in components
+        if contents_hashes[name] != last_contents_hashes.get(name)
+    }
+
+    # Add reverse dependencies, transitively.
+    reverse_dependencies = {name: set() for name in components}
+    for name, component in components.items():
+        for dependency in component["upstream_dependencies"]:
+            reverse_dependencies.setdefault(dependency, set()).add(name)
+    affected = set()
+    pending = list(changed)
+    while pending:
+        name = pending.pop()
+        if name in affected:
+            continue
+        affected.add(name)
+        pending.extend(reverse_dependencies.get(name, ()))
+
+    return sorted(name for name in affected if components[name]["publish"])
+
+
+def publish(tasks):
+    gradle_cmd = ["./gradlew"]
+    kwargs = {}
+    if sys.platform.startswith("win"):
+        gradle_cmd = ["gradlew.bat"]
+        kwargs["shell"] = True
+    run_cmd_checked(gradle_cmd + tasks + [f"-Plocal={time.time_ns()}"], **kwargs)
+
+
+def save_last_contents_hashes(contents_hashes):
     with open(LAST_CONTENTS_HASH_FILE, "w") as f:
-        f.write(contents_hash)
+        json.dump(contents_hashes, f, indent=2, sort_keys=True)
         f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Publish android packages to local maven repo, but only if changed since last publish"
+    )
+    parser.parse_args()
+
+    root_dir = find_project_root()
+    if str(root_dir) != os.path.abspath(os.curdir):
+        fatal_err(
+            f"This only works if run from the repo root ({root_dir!r} != {os.path.abspath(os.curdir)!r})"
+        )
+
+    components = load_components()
+    index = update_index(load_index())
+    save_index(index)
+    contents_hashes = compute_contents_hashes(components, index)
+    last_contents_hashes = load_last_contents_hashes()
+
+    # If the contents hash of a component has changed since last publish, re-publish it.
+    to_publish = components_to_publish(components, contents_hashes, last_contents_hashes)
+    if to_publish is None:
+        print("Contents have changed, publishing")
+        publish(["publishToMavenLocal"])
+    elif not to_publish:
+        print("Contents have not changed, no need to publish")
+    else:
+        print(f"Contents of {len(to_publish)} component(s) have changed, publishing: {', '.join(to_publish)}")
+        publish([f":{name}:publishToMavenLocal" for name in to_publish])
+
+    # Also when nothing was published: components that changed without affecting a published
+    # one must not be considered changed again on the next run.
+    save_last_contents_hashes(contents_hashes)
+
+
+if __name__ == "__main__":
+    main()
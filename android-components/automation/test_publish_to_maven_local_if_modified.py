@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from automation import publish_to_maven_local_if_modified as module
+
+BUILD_CONFIG = """projects:
+  concept-base:
+    path: components/concept/base
+    publish: true
+    upstream_dependencies: []
+  support-base:
+    path: components/support/base
+    publish: true
+    upstream_dependencies:
+    - concept-base
+  feature-logins:
+    path: components/feature/logins
+    publish: true
+    upstream_dependencies:
+    - concept-base
+    - support-base
+  samples-browser:
+    path: samples/browser
+    publish: false
+    upstream_dependencies:
+    - feature-logins
+"""
+
+
+def component(publish, *upstream_dependencies):
+    return {
+        "path": None,
+        "publish": publish,
+        "upstream_dependencies": list(upstream_dependencies),
+    }
+
+
+class ComponentsToPublishTestCase(unittest.TestCase):
+    def setUp(self):
+        self.components = {
+            "concept-base": component(True),
+            "support-base": component(True, "concept-base"),
+            "feature-logins": component(True, "concept-base", "support-base"),
+            "feature-tabs": component(True),
+            "samples-browser": component(False, "feature-logins"),
+        }
+        self.hashes = {name: "a" for name in list(self.components) + [module.GLOBAL_HASH_KEY]}
+
+    def changed(self, *names):
+        return dict(self.hashes, **{name: "b" for name in names})
+
+    def test_unchanged(self):
+        self.assertEqual(
+            module.components_to_publish(self.components, self.hashes, self.hashes), []
+        )
+
+    def test_reverse_dependencies_are_published_transitively(self):
+        self.assertEqual(
+            module.components_to_publish(
+                self.components, self.changed("concept-base"), self.hashes
+            ),
+            ["concept-base", "feature-logins", "support-base"],
+        )
+        self.assertEqual(
+            module.components_to_publish(
+                self.components, self.changed("support-base"), self.hashes
+            ),
+            ["feature-logins", "support-base"],
+        )
+
+    def test_unpublished_components_are_skipped(self):
+        self.assertEqual(
+            module.components_to_publish(
+                self.components, self.changed("samples-browser"), self.hashes
+            ),
+            [],
+        )
+
+    def test_global_hash_change_publishes_everything(self):
+        self.assertIsNone(
+            module.components_to_publish(
+                self.components, self.changed(module.GLOBAL_HASH_KEY), self.hashes
+            )
+        )
+        # Nothing published yet
+        self.assertIsNone(module.components_to_publish(self.components, self.hashes, {}))
+
+
+class RepositoryTestCase(unittest.TestCase):
+    """Runs the script in a throwaway git repository."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        previous_dir = os.getcwd()
+        os.chdir(directory.name)
+        self.addCleanup(os.chdir, previous_dir)
+
+        self.write(module.BUILD_CONFIG_FILE, BUILD_CONFIG)
+        self.write("build.gradle", "// root project")
+        for path in (
+            "components/concept/base",
+            "components/support/base",
+            "components/feature/logins",
+            "samples/browser",
+        ):
+            self.write(f"{path}/build.gradle", f"// {path}")
+        subprocess.run(["git", "init", "-q"], check=True)
+        subprocess.run(["git", "add", "."], check=True)
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def run_script(self):
+        """Runs main() and returns the gradle tasks it published, if any."""
+        with mock.patch.object(
+            module, "find_project_root", return_value=Path(os.getcwd())
+        ), mock.patch.object(module, "publish") as publish, mock.patch(
+            "sys.argv", ["publish_to_maven_local_if_modified.py"]
+        ):
+            module.main()
+        return publish.call_args[0][0] if publish.called else None
+
+    def test_publications(self):
+        self.assertEqual(self.run_script(), ["publishToMavenLocal"])
+        self.assertIsNone(self.run_script())
+
+        self.write("components/support/base/src/Base.kt", "class Base")
+        self.assertEqual(
+            self.run_script(),
+            [":feature-logins:publishToMavenLocal", ":support-base:publishToMavenLocal"],
+        )
+        self.assertIsNone(self.run_script())
+
+        self.write("build.gradle", "// changed root project")
+        self.assertEqual(self.run_script(), ["publishToMavenLocal"])
+
+    def test_hashes_are_saved_when_nothing_is_published(self):
+        self.run_script()
+        self.write("samples/browser/build.gradle", "// changed sample")
+        self.assertIsNone(self.run_script())
+
+        with open(module.LAST_CONTENTS_HASH_FILE) as f:
+            last_contents_hashes = json.load(f)
+        index = module.load_index()
+        self.assertEqual(
+            last_contents_hashes,
+            module.compute_contents_hashes(module.load_components(), index),
+        )
+        self.assertEqual(
+            index["files"]["samples/browser/build.gradle"][3],
+            module.hash_file("samples/browser/build.gradle"),
+        )
+
+    def test_racy_files_are_hashed_again(self):
+        index = module.update_index(None)
+        stat_key = index["files"]["build.gradle"][:3]
+
+        # Same stat() as when the index was written: the previous hash is trusted...
+        index["files"]["build.gradle"][3] = "previous hash"
+        index["written_at_ns"] = stat_key[0] + 1
+        self.assertEqual(
+            module.update_index(index)["files"]["build.gradle"][3], "previous hash"
+        )
+
+        # ...unless the file was modified in the same tick the index was written, as
+        # another modification within that tick would not change its stat()
+        index["written_at_ns"] = stat_key[0]
+        self.assertEqual(
+            module.update_index(index)["files"]["build.gradle"][3],
+            module.hash_file("build.gradle"),
+        )
+
+    def test_state_files_are_not_hashed(self):
+        self.run_script()
+        self.assertNotIn(module.INDEX_FILE, module.load_index()["files"])
+        self.assertNotIn(module.LAST_CONTENTS_HASH_FILE, module.load_index()["files"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,9 +14,13 @@ Potential script improvements:
 - (later) Would this be more usable as a website?
 """
 
+import json
 import os
+import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from urllib.error import HTTPError
+from urllib.parse import urlparse
 from urllib.request import urlopen
 
 SCRIPT_NAME = os.path.basename(__file__)
@@ -28,22 +32,60 @@ For secondary use cases:
   --no-fenix: pass instead of path-to-fenix-repository to disable fenix functionality
   --help, -h: prints this information and exits.
 
+To bisect across repositories without network round trips, build a local index
+of every ac nightly (ac commit, GV version and mozilla-central commit) and query it:
+  --index-update: adds the ac nightlies published since the last update to the index
+  --index-gv <major>: lists the indexed ac nightlies built on the given GV major version
+  --index-nearest <ac-commit>: prints the newest indexed ac nightly built from the
+      given commit or one of its ancestors (uses the ac git checkout)
+
+Published POMs are cached in {cache_dir}
+(override with ${cache_dir_env}). The maven repositories can be overridden
+with ${ac_maven_url_env} and ${gv_maven_url_env}.
+
 When building across repositories, e.g. fenix with a local a-c, sometimes the
 build will fail with errors unrelated to your changes because of a version
 mismatch: e.g. there were breaking changes in ac that are not represented in
 fenix. This script will print changeset information to help fix these build errors.
 
 Does the script work correctly? Is it intuitive?
-Please send feedback to @mcomella.""".format(
-    script_name=SCRIPT_NAME
-)
+Please send feedback to @mcomella."""
 
 INDENT = "  "
 INDENT2 = INDENT * 2
 
+# Maven repositories, they can be replaced e.g. by a local server in tests.
+ENV_MAVEN_URL_AC_NIGHTLY = "AC_NIGHTLY_MAVEN_URL"
+ENV_MAVEN_URL_GV_NIGHTLY = "GV_NIGHTLY_MAVEN_URL"
+MAVEN_URL_AC_NIGHTLY = os.environ.get(
+    ENV_MAVEN_URL_AC_NIGHTLY, "https://nightly.maven.mozilla.org/maven2"
+)
+MAVEN_URL_GV_NIGHTLY = os.environ.get(
+    ENV_MAVEN_URL_GV_NIGHTLY, "https://maven.mozilla.org/maven2"
+)
+
 # For a-c, we deliberately choose a component that's unlikely to be renamed or go away.
-TEMPLATE_POM_URL_AC_NIGHTLY = "https://nightly.maven.mozilla.org/maven2/org/mozilla/components/support-base/{version}/support-base-{version}.pom"
-TEMPLATE_POM_URL_GV_NIGHTLY = "https://maven.mozilla.org/maven2/org/mozilla/geckoview/geckoview-nightly-arm64-v8a/{version}/geckoview-nightly-arm64-v8a-{version}.pom"
+TEMPLATE_POM_PATH_AC_NIGHTLY = (
+    "org/mozilla/components/support-base/{version}/support-base-{version}.pom"
+)
+TEMPLATE_POM_PATH_GV_NIGHTLY = "org/mozilla/geckoview/geckoview-nightly-arm64-v8a/{version}/geckoview-nightly-arm64-v8a-{version}.pom"
+# The GV version an ac nightly is built on is a dependency of this component.
+TEMPLATE_POM_PATH_AC_ENGINE_GECKO = "org/mozilla/components/browser-engine-gecko/{version}/browser-engine-gecko-{version}.pom"
+PATH_METADATA_AC_NIGHTLY = "org/mozilla/components/support-base/maven-metadata.xml"
+
+# Published POMs never change, so each of them only needs to be downloaded once.
+ENV_POM_CACHE_DIR = "LIST_COMPATIBLE_VERSIONS_CACHE_DIR"
+PATH_POM_CACHE = os.environ.get(
+    ENV_POM_CACHE_DIR,
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+        "list_compatible_dependency_versions",
+    ),
+)
+
+FILENAME_INDEX = "ac-nightly-index.json"
+INDEX_FORMAT_VERSION = 1
+INDEX_MAX_WORKERS = 8
 
 # We get the ac version from a published POM.xml; the ac hash wasn't (roughly) available before this version.
 VERSION_MIN_AC_NIGHTLY = "59.0.20200914093656"
@@ -63,7 +105,16 @@ PATH_GV_VERSION = os.path.join(
 
 ### SECTION: USAGE AND ARGS ###
 def print_usage(exit=False):
-    print(USAGE, file=sys.stderr)
+    print(
+        USAGE.format(
+            script_name=SCRIPT_NAME,
+            cache_dir=PATH_POM_CACHE,
+            cache_dir_env=ENV_POM_CACHE_DIR,
+            ac_maven_url_env=ENV_MAVEN_URL_AC_NIGHTLY,
+            gv_maven_url_env=ENV_MAVEN_URL_GV_NIGHTLY,
+        ),
+        file=sys.stderr,
+    )
     if exit:
         sys.exit(1)
 
@@ -73,6 +124,18 @@ def maybe_display_usage():
         print_usage(exit=True)
 
 
+def maybe_get_index_command():
+    if len(sys.argv) < 2 or not sys.argv[1].startswith("--index-"):
+        return None
+
+    command = sys.argv[1]
+    if command == "--index-update" and len(sys.argv) == 2:
+        return command, None
+    if command in ("--index-gv", "--index-nearest") and len(sys.argv) == 3:
+        return command, sys.argv[2]
+    raise Exception("unexpected arguments for {}. See usage above.".format(command))
+
+
 def validate_args():
     if len(sys.argv) != 2:  # argv[0] == script invocation.
         # We intentionally require one or the other to ensure folks are opting in to the chosen behavior.
@@ -93,12 +156,56 @@ def extract_str_inside_quotes(str_with_quotes):
     return s[s.find('"') + 1 : s.rfind('"')]
 
 
-def fetch_pom(url):
+def fetch_pom(maven_url, pom_path, cache_dir=PATH_POM_CACHE):
+    """Fetches a POM from a maven repository, or from cache_dir if it was fetched before.
+
+    Published POMs are immutable so cached POMs never need to be refreshed. Pass
+    cache_dir=None to disable the cache.
+    """
+    url = maven_url.rstrip("/") + "/" + pom_path
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, urlparse(maven_url).netloc, pom_path)
+        if os.path.isfile(cache_path):
+            with open(cache_path, "rb") as f:
+                return f.read(), url
+
     try:
         res = urlopen(url)  # throws if not success.
     except HTTPError as e:
         raise Exception("unable to fetch POM from...\n" + INDENT + url) from e
-    return res.read(), url
+    pom = res.read()
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write then rename so that an interrupted run never leaves a truncated POM behind.
+        tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(pom)
+        os.replace(tmp_path, cache_path)
+    return pom, url
+
+
+def get_gv_version_from_pom(pom_str, debug_pom_url=None):
+    # Expected format (one element per line):
+    #   <groupId>org.mozilla.geckoview</groupId>
+    #   <artifactId>geckoview-nightly-omni</artifactId>
+    #   <version>118.0.20230801094503</version>
+    is_in_gv_dependency = False
+    for line in pom_str.split(b"\n"):
+        stripped = line.strip()
+        if stripped == b"<groupId>org.mozilla.geckoview</groupId>":
+            is_in_gv_dependency = True
+        elif stripped.startswith(b"</dependency>"):
+            is_in_gv_dependency = False
+        elif is_in_gv_dependency and stripped.startswith(b"<version>"):
+            return stripped[9 : stripped.find(b"</version>")].decode("utf-8")
+
+    raise Exception(
+        "GV version could not be found in pom.xml from...\n"
+        + INDENT
+        + str(debug_pom_url)
+    )
 
 
 def get_hash_from_pom(pom_str, debug_pom_url=None):
@@ -159,12 +266,14 @@ def fenix_checkout_to_ac_version(fenix_path):
     )
 
 
-def fenix_checkout_to_ac_hash(fenix_path):
+def fenix_checkout_to_ac_hash(
+    fenix_path, maven_url=MAVEN_URL_AC_NIGHTLY, cache_dir=PATH_POM_CACHE
+):
     ac_version = fenix_checkout_to_ac_version(fenix_path)
     validate_ac_version(ac_version)
 
-    pom_url = TEMPLATE_POM_URL_AC_NIGHTLY.format(version=ac_version)
-    pom, debug_pom_url = fetch_pom(pom_url)
+    pom_path = TEMPLATE_POM_PATH_AC_NIGHTLY.format(version=ac_version)
+    pom, debug_pom_url = fetch_pom(maven_url, pom_path, cache_dir)
     ac_hash = get_hash_from_pom(pom, debug_pom_url)
     return ac_hash, ac_version
 
@@ -180,9 +289,11 @@ def validate_gv_nightly_version(version):
         )
 
 
-def gv_nightly_version_to_mc_hash(gv_nightly_version):
-    pom_url = TEMPLATE_POM_URL_GV_NIGHTLY.format(version=gv_nightly_version)
-    pom, debug_pom_url = fetch_pom(pom_url)
+def gv_nightly_version_to_mc_hash(
+    gv_nightly_version, maven_url=MAVEN_URL_GV_NIGHTLY, cache_dir=PATH_POM_CACHE
+):
+    pom_path = TEMPLATE_POM_PATH_GV_NIGHTLY.format(version=gv_nightly_version)
+    pom, debug_pom_url = fetch_pom(maven_url, pom_path, cache_dir)
     return get_hash_from_pom(pom, debug_pom_url)
 
 
@@ -207,21 +318,233 @@ def ac_checkout_to_gv_version(ac_root):
     return version
 
 
-def ac_checkout_to_mc_hash(ac_root):
+def ac_checkout_to_mc_hash(
+    ac_root, maven_url=MAVEN_URL_GV_NIGHTLY, cache_dir=PATH_POM_CACHE
+):
     version = ac_checkout_to_gv_version(ac_root)
 
     validate_gv_nightly_version(version)
-    mc_hash = gv_nightly_version_to_mc_hash(version)
+    mc_hash = gv_nightly_version_to_mc_hash(version, maven_url, cache_dir)
     return mc_hash, version
 
 
+### SECTION: COMPATIBILITY INDEX ###
+# The index maps every ac nightly version to the ac commit it was built from, the GV
+# version it was built on and the mozilla-central commit of that GV. Published nightlies
+# never change so the index only grows: updates fetch the POMs of new nightlies only.
+def ac_version_sort_key(ac_version):
+    return tuple(int(part) for part in ac_version.split("."))
+
+
+def is_indexable_ac_version(ac_version):
+    parts = ac_version.split(".")
+    return (
+        len(parts) == 3
+        and all(part.isdigit() for part in parts)
+        and len(parts[2]) > 4  # nightly, see validate_ac_version.
+        and int(parts[2]) >= int(VERSION_MIN_AC_NIGHTLY_BUGFIX)
+    )
+
+
+def fetch_ac_nightly_versions(maven_url=MAVEN_URL_AC_NIGHTLY):
+    """Returns the published ac nightly versions. The metadata changes with every
+    nightly so, unlike POMs, it is never cached."""
+    url = maven_url.rstrip("/") + "/" + PATH_METADATA_AC_NIGHTLY
+    try:
+        res = urlopen(url)  # throws if not success.
+    except HTTPError as e:
+        raise Exception("unable to fetch maven metadata from...\n" + INDENT + url) from e
+
+    # Expected format (one per line): <version>118.0.20230801094503</version>
+    versions = []
+    for line in res.read().split(b"\n"):
+        stripped = line.strip()
+        if stripped.startswith(b"<version>"):
+            version = stripped[9 : stripped.find(b"</version>")].decode("utf-8")
+            if is_indexable_ac_version(version):
+                versions.append(version)
+    return versions
+
+
+def load_index(cache_dir=PATH_POM_CACHE):
+    index_path = os.path.join(cache_dir, FILENAME_INDEX)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if index.get("version") != INDEX_FORMAT_VERSION:
+        return {}  # the entries are rebuilt from the cached POMs.
+    return index["ac_nightlies"]
+
+
+def save_index(index, cache_dir=PATH_POM_CACHE):
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, FILENAME_INDEX)
+    tmp_path = "{}.{}.tmp".format(index_path, os.getpid())
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {"version": INDEX_FORMAT_VERSION, "ac_nightlies": index},
+            f,
+            indent=1,
+            sort_keys=True,
+        )
+    os.replace(tmp_path, index_path)
+
+
+def ac_nightly_to_index_entry(
+    ac_version,
+    ac_maven_url=MAVEN_URL_AC_NIGHTLY,
+    gv_maven_url=MAVEN_URL_GV_NIGHTLY,
+    cache_dir=PATH_POM_CACHE,
+):
+    pom, debug_pom_url = fetch_pom(
+        ac_maven_url, TEMPLATE_POM_PATH_AC_NIGHTLY.format(version=ac_version), cache_dir
+    )
+    ac_hash = get_hash_from_pom(pom, debug_pom_url)
+
+    pom, debug_pom_url = fetch_pom(
+        ac_maven_url,
+        TEMPLATE_POM_PATH_AC_ENGINE_GECKO.format(version=ac_version),
+        cache_dir,
+    )
+    gv_version = get_gv_version_from_pom(pom, debug_pom_url)
+
+    mc_hash = gv_nightly_version_to_mc_hash(gv_version, gv_maven_url, cache_dir)
+    return {
+        "ac_hash": ac_hash.decode("utf-8"),
+        "gv_version": gv_version,
+        "mc_hash": mc_hash.decode("utf-8"),
+    }
+
+
+def update_index(
+    index,
+    ac_versions,
+    ac_maven_url=MAVEN_URL_AC_NIGHTLY,
+    gv_maven_url=MAVEN_URL_GV_NIGHTLY,
+    cache_dir=PATH_POM_CACHE,
+):
+    """Adds the given ac nightlies that are not indexed yet to index, in place.
+
+    Returns the versions that were added and the versions that could not be indexed,
+    e.g. because one of their POMs was never published: they are retried next time.
+    """
+    missing_versions = sorted(
+        (version for version in set(ac_versions) if version not in index),
+        key=ac_version_sort_key,
+    )
+    added, failed = [], []
+    with ThreadPoolExecutor(max_workers=INDEX_MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(
+                ac_nightly_to_index_entry,
+                version,
+                ac_maven_url,
+                gv_maven_url,
+                cache_dir,
+            )
+            for version in missing_versions
+        ]
+        for version, future in zip(missing_versions, futures):
+            try:
+                index[version] = future.result()
+                added.append(version)
+            except Exception:
+                failed.append(version)
+    return added, failed
+
+
+def query_index_by_gv_major(index, gv_major):
+    """Returns the (ac version, entry) pairs built on GV gv_major, oldest first."""
+    prefix = "{}.".format(gv_major)
+    return [
+        (version, index[version])
+        for version in sorted(index, key=ac_version_sort_key)
+        if index[version]["gv_version"].startswith(prefix)
+    ]
+
+
+def query_index_nearest(index, ancestor_hashes):
+    """Returns the newest (ac version, entry) pair built from one of ancestor_hashes,
+    the commits reachable from the commit of interest, or None if there is none."""
+    for version in sorted(index, key=ac_version_sort_key, reverse=True):
+        if index[version]["ac_hash"] in ancestor_hashes:
+            return version, index[version]
+    return None
+
+
+def git_ancestor_hashes(repo_path, commit):
+    output = subprocess.run(
+        ["git", "rev-list", commit],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return set(output.split())
+
+
+def print_index_entry(version, entry):
+    print(INDENT + version)
+    print(INDENT2 + "ac commit: " + entry["ac_hash"])
+    print(INDENT2 + "GV version: " + entry["gv_version"])
+    print(INDENT2 + "mozilla-central commit: " + entry["mc_hash"])
+
+
+def main_index(command, argument):
+    index = load_index()
+    if command == "--index-update":
+        added, failed = update_index(index, fetch_ac_nightly_versions())
+        save_index(index)
+        print("Indexed {} new ac nightlies ({} total).".format(len(added), len(index)))
+        if failed:
+            print(
+                "Unable to index {} ac nightlies, they will be retried next time:".format(
+                    len(failed)
+                )
+            )
+            for version in failed:
+                print(INDENT + version)
+        return
+
+    if not index:
+        raise Exception("the index is empty: run with --index-update first.")
+
+    if command == "--index-gv":
+        entries = query_index_by_gv_major(index, argument)
+        print("Indexed ac nightlies built on GV {}:".format(argument))
+        for version, entry in entries:
+            print_index_entry(version, entry)
+        if not entries:
+            print(INDENT + "none")
+    else:
+        nearest = query_index_nearest(
+            index, git_ancestor_hashes(PATH_AC_ROOT, argument)
+        )
+        print("Newest indexed ac nightly built from {} or its ancestors:".format(argument))
+        if nearest:
+            print_index_entry(*nearest)
+        else:
+            print(INDENT + "none: try --index-update")
+
+
 ### SECTION: MAIN ###
 def main_repo_to_hash(fenix_path, is_no_fenix_passed):
+    # The two lookups are independent: fetch both POMs at the same time.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        ac_future = (
+            None
+            if is_no_fenix_passed
+            else executor.submit(fenix_checkout_to_ac_hash, fenix_path)
+        )
+        mc_future = executor.submit(ac_checkout_to_mc_hash, PATH_AC_ROOT)
+
     header = "Building fenix with a local ac?"
     if is_no_fenix_passed:
         print('Skipping "{}"'.format(header))
     else:
-        ac_hash, ac_version = fenix_checkout_to_ac_hash(fenix_path)
+        ac_hash, ac_version = ac_future.result()
         print(header)
         print(
             INDENT
@@ -235,7 +558,7 @@ def main_repo_to_hash(fenix_path, is_no_fenix_passed):
     (
         mc_hash,
         nightlyv,
-    ) = ac_checkout_to_mc_hash(PATH_AC_ROOT)
+    ) = mc_future.result()
     print("Building ac with a local GeckoView?")
     print(
         INDENT
@@ -258,6 +581,10 @@ def main_repo_to_hash(fenix_path, is_no_fenix_passed):
 
 def main():
     maybe_display_usage()
+    index_command = maybe_get_index_command()
+    if index_command:
+        main_index(*index_command)
+        return
     fenix_path, is_no_fenix_passed = validate_args()
     main_repo_to_hash(fenix_path, is_no_fenix_passed)
 
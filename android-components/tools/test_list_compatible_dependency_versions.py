@@ -3,8 +3,12 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import functools
 import os
+import tempfile
+import threading
 import unittest
+from http.server import HTTPServer, SimpleHTTPRequestHandler
 
 import list_compatible_dependency_versions as module
 
@@ -32,5 +36,193 @@ class AssumptionsTestCase(unittest.TestCase):
         pass
 
 
+class QuietRequestHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalMavenTestCase(unittest.TestCase):
+    """Serves a temporary directory laid out like a maven repository."""
+
+    def setUp(self):
+        self.maven_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.maven_dir.cleanup)
+        self.addCleanup(self.cache_dir.cleanup)
+
+        handler = functools.partial(QuietRequestHandler, directory=self.maven_dir.name)
+        self.server = HTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.maven_url = "http://127.0.0.1:{}/".format(self.server.server_port)
+
+    def stopServer(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def publish(self, path, content):
+        published_file = os.path.join(self.maven_dir.name, path)
+        os.makedirs(os.path.dirname(published_file), exist_ok=True)
+        with open(published_file, "wb") as f:
+            f.write(content)
+
+    def publishGv(self, gv_version, mc_hash):
+        self.publish(
+            module.TEMPLATE_POM_PATH_GV_NIGHTLY.format(version=gv_version),
+            b"<project>\n  <scm>\n    <tag>" + mc_hash + b"</tag>\n  </scm>\n</project>\n",
+        )
+
+
+class FetchPomTestCase(LocalMavenTestCase):
+    """Tests fetching POMs from a local maven repository."""
+
+    GV_VERSION = "110.0.20230101093215"
+    MC_HASH = b"d4e11195e39888686d843a146a893eb0ebf38224"
+
+    def setUp(self):
+        super().setUp()
+        self.pom_path = module.TEMPLATE_POM_PATH_GV_NIGHTLY.format(
+            version=self.GV_VERSION
+        )
+        self.publishGv(self.GV_VERSION, self.MC_HASH)
+
+    def testGvNightlyVersionToMcHash(self):
+        mc_hash = module.gv_nightly_version_to_mc_hash(
+            self.GV_VERSION, self.maven_url, self.cache_dir.name
+        )
+        self.assertEqual(mc_hash, self.MC_HASH)
+
+    def testFetchPomIsCached(self):
+        pom, url = module.fetch_pom(self.maven_url, self.pom_path, self.cache_dir.name)
+        self.assertEqual(url, self.maven_url + self.pom_path)
+
+        # Once cached, the server is not needed anymore.
+        self.stopServer()
+        cached_pom, _ = module.fetch_pom(
+            self.maven_url, self.pom_path, self.cache_dir.name
+        )
+        self.assertEqual(cached_pom, pom)
+
+    def testFetchPomMissingVersionRaises(self):
+        missing_path = module.TEMPLATE_POM_PATH_GV_NIGHTLY.format(
+            version="110.0.20230101000000"
+        )
+        with self.assertRaises(Exception):
+            module.fetch_pom(self.maven_url, missing_path, self.cache_dir.name)
+        self.assertEqual(
+            os.listdir(self.cache_dir.name), [], "failed fetches are not cached"
+        )
+
+
+class CompatibilityIndexTestCase(LocalMavenTestCase):
+    """Tests building and querying the index of ac nightlies."""
+
+    AC_VERSIONS = {
+        "117.0.20230710090116": ("a" * 40, "117.0.20230709213012", "1" * 40),
+        "118.0.20230718090116": ("b" * 40, "118.0.20230717213012", "2" * 40),
+        "118.0.20230725090116": ("c" * 40, "118.0.20230724213012", "3" * 40),
+    }
+
+    ENGINE_GECKO_POM = """<project>
+  <dependencies>
+    <dependency>
+      <groupId>org.mozilla.components</groupId>
+      <artifactId>concept-engine</artifactId>
+      <version>{ac_version}</version>
+    </dependency>
+    <dependency>
+      <groupId>org.mozilla.geckoview</groupId>
+      <artifactId>geckoview-nightly-omni</artifactId>
+      <version>{gv_version}</version>
+    </dependency>
+  </dependencies>
+</project>
+"""
+
+    def setUp(self):
+        super().setUp()
+        for ac_version, (ac_hash, gv_version, mc_hash) in self.AC_VERSIONS.items():
+            self.publish(
+                module.TEMPLATE_POM_PATH_AC_NIGHTLY.format(version=ac_version),
+                "<project>\n  <scm>\n    <tag>{}</tag>\n  </scm>\n</project>\n".format(
+                    ac_hash
+                ).encode("utf-8"),
+            )
+            self.publish(
+                module.TEMPLATE_POM_PATH_AC_ENGINE_GECKO.format(version=ac_version),
+                self.ENGINE_GECKO_POM.format(
+                    ac_version=ac_version, gv_version=gv_version
+                ).encode("utf-8"),
+            )
+            self.publishGv(gv_version, mc_hash.encode("utf-8"))
+        self.publish(
+            module.PATH_METADATA_AC_NIGHTLY,
+            b"<metadata>\n  <versioning>\n    <versions>\n"
+            + b"".join(
+                b"      <version>" + version.encode("utf-8") + b"</version>\n"
+                for version in ["58.0.20200901093656", *self.AC_VERSIONS]
+            )
+            + b"    </versions>\n  </versioning>\n</metadata>\n",
+        )
+
+    def updateIndex(self, index, ac_versions):
+        return module.update_index(
+            index, ac_versions, self.maven_url, self.maven_url, self.cache_dir.name
+        )
+
+    def testFetchAcNightlyVersionsSkipsUnindexableVersions(self):
+        versions = module.fetch_ac_nightly_versions(self.maven_url)
+        self.assertEqual(sorted(versions), sorted(self.AC_VERSIONS))
+
+    def testUpdateIndexIsIncremental(self):
+        index = {}
+        added, failed = self.updateIndex(index, ["117.0.20230710090116"])
+        self.assertEqual((added, failed), (["117.0.20230710090116"], []))
+        self.assertEqual(
+            index["117.0.20230710090116"],
+            {
+                "ac_hash": "a" * 40,
+                "gv_version": "117.0.20230709213012",
+                "mc_hash": "1" * 40,
+            },
+        )
+
+        added, failed = self.updateIndex(index, list(self.AC_VERSIONS))
+        self.assertEqual(
+            (added, failed), (["118.0.20230718090116", "118.0.20230725090116"], [])
+        )
+
+        # Indexed versions are not fetched again.
+        self.stopServer()
+        self.assertEqual(self.updateIndex(index, list(self.AC_VERSIONS)), ([], []))
+
+    def testUpdateIndexRetriesUnpublishedVersions(self):
+        index = {}
+        added, failed = self.updateIndex(index, ["119.0.20230801090116"])
+        self.assertEqual((added, failed), ([], ["119.0.20230801090116"]))
+        self.assertEqual(index, {})
+
+    def testIndexRoundTrip(self):
+        index = {}
+        self.updateIndex(index, list(self.AC_VERSIONS))
+        module.save_index(index, self.cache_dir.name)
+        self.assertEqual(module.load_index(self.cache_dir.name), index)
+
+    def testQueries(self):
+        index = {}
+        self.updateIndex(index, list(self.AC_VERSIONS))
+
+        self.assertEqual(
+            [version for version, _ in module.query_index_by_gv_major(index, "118")],
+            ["118.0.20230718090116", "118.0.20230725090116"],
+        )
+        self.assertEqual(module.query_index_by_gv_major(index, "11"), [])
+
+        nearest = module.query_index_nearest(index, {"a" * 40, "b" * 40, "f" * 40})
+        self.assertEqual(nearest[0], "118.0.20230718090116")
+        self.assertIsNone(module.query_index_nearest(index, {"f" * 40}))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,87 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+import re
+import subprocess
+import threading
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+# Package of the developer channel that nimbus-cli installs and launches
+FENIX_PACKAGE = "org.mozilla.fenix.debug"
+READY_TIMEOUT = 30
+
+
+class ADBLogcat(object):
+    """Tails `adb logcat` to tell when the app has started.
+
+    The activity manager logs "Displayed <package>/<activity>: +1s234ms" once the first
+    frame of a launched activity is drawn. That is all the marker proves: Nimbus may not
+    have applied the experiment yet. Start tailing before running the command that
+    launches the app, so that the marker cannot be missed:
+
+        with ADBLogcat() as logcat:
+            subprocess.check_output("nimbus-cli ... open", shell=True)
+            logcat.wait_until_ready()
+    """
+
+    binary = "adb"
+    logger = logging.getLogger()
+
+    def __init__(self, package=FENIX_PACKAGE, ready_patterns=None):
+        self.ready_patterns = [
+            re.compile(pattern)
+            for pattern in ready_patterns
+            or [rf"Displayed {re.escape(package)}/"]
+        ]
+        self.ready = threading.Event()
+        self.process = None
+        self.reader = None
+
+    def start(self):
+        # Drop the markers of earlier launches
+        subprocess.run([self.binary, "logcat", "-c"], check=False)
+        self.ready.clear()
+        self.process = subprocess.Popen(
+            [self.binary, "logcat", "-v", "brief"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding="utf8",
+            errors="replace",
+        )
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        # Reads until adb exits: logcat blocks once the pipe is full
+        for line in self.process.stdout:
+            if self.ready.is_set():
+                continue
+            if any(pattern.search(line) for pattern in self.ready_patterns):
+                self.logger.info("App is ready: {}".format(line.strip()))
+                self.ready.set()
+
+    def wait_until_ready(self, timeout=READY_TIMEOUT):
+        """Blocks until the app is ready, or timeout seconds. Returns whether it is ready."""
+        if not self.ready.wait(timeout):
+            self.logger.warning(
+                "App not ready after {} seconds, continuing anyway".format(timeout)
+            )
+            return False
+        return True
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+            self.reader.join()
+            self.process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
@@ -7,13 +7,14 @@ import logging
 import os
 from pathlib import Path
 import subprocess
-import time
 
 import pytest
 import requests
 
+from experimentintegration.adblogcat import ADBLogcat
 from experimentintegration.gradlewbuild import GradlewBuild
 from experimentintegration.models.models import TelemetryModel
+from experimentintegration.pingcollector import PingCollector
 
 KLAATU_SERVER_URL = "http://localhost:1378"
 KLAATU_LOCAL_SERVER_URL = "http://localhost:1378"
@@ -128,25 +129,31 @@ def fixture_experiment_slug(experiment_data):
 
 @pytest.fixture(name="start_app")
 def fixture_start_app():
+    """Returns a function opening the app, and returning once its first frame is drawn.
+
+    That only proves the app started, not that the Nimbus experiment was applied: check
+    for the enrollment ping for that. If the first frame is not seen in time, a warning
+    is logged and the test carries on.
+    """
+
     def _():
         command = f"nimbus-cli --app fenix --channel developer open"
-        try:
-            out = subprocess.check_output(
-                command,
-                cwd=os.path.join(here, os.pardir),
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                shell=True,
-            )
-        except subprocess.CalledProcessError as e:
-            out = e.output
-            raise
-        finally:
-            with open(gradlewbuild_log, "w") as f:
-                f.write(out)
-        time.sleep(
-            15
-        )  # Wait a while as there's no real way to know when the app has started
+        with ADBLogcat() as logcat:
+            try:
+                out = subprocess.check_output(
+                    command,
+                    cwd=os.path.join(here, os.pardir),
+                    stderr=subprocess.STDOUT,
+                    universal_newlines=True,
+                    shell=True,
+                )
+            except subprocess.CalledProcessError as e:
+                out = e.output
+                raise
+            finally:
+                with open(gradlewbuild_log, "w") as f:
+                    f.write(out)
+            logcat.wait_until_ready()
 
     return _
 
@@ -164,63 +171,56 @@ def fixture_send_test_results():
             pass
 
 
+@pytest.fixture(name="ping_collector")
+def fixture_ping_collector(variables):
+    return PingCollector(variables["urls"]["telemetry_server"])
+
+
 @pytest.fixture(name="check_ping_for_experiment")
-def fixture_check_ping_for_experiment(experiment_slug, variables):
+def fixture_check_ping_for_experiment(experiment_slug, ping_collector):
     def _check_ping_for_experiment(
         branch=None, experiment=experiment_slug, reason=None
     ):
         model = TelemetryModel(branch=branch, experiment=experiment)
 
-        timeout = time.time() + 60 * 5
-        while time.time() < timeout:
-            data = requests.get(f"{variables['urls']['telemetry_server']}/pings").json()
-            events = []
-            for item in data:
-                event_items = item.get("events")
-                if event_items:
-                    for event in event_items:
-                        if (
-                            "category" in event
-                            and "nimbus_events" in event["category"]
-                            and "extra" in event
-                            and "branch" in event["extra"]
-                        ):
-                            events.append(event)
-            for event in events:
-                event_name = event.get("name")
-                if (reason == "enrollment" and event_name == "enrollment") or (
-                    reason == "unenrollment"
-                    and event_name in ["unenrollment", "disqualification"]
-                ):
-                    telemetry_model = TelemetryModel(
-                        branch=event["extra"]["branch"],
-                        experiment=event["extra"]["experiment"],
-                    )
-                    if model == telemetry_model:
-                        return True
-            time.sleep(5)
-        return False
+        if reason == "enrollment":
+            names = ["enrollment"]
+        elif reason == "unenrollment":
+            names = ["unenrollment", "disqualification"]
+        else:
+            return False
+        events = ping_collector.wait_for_event(
+            names, model.experiment, model.branch, timeout=60 * 5
+        )
+        return bool(events)
 
     return _check_ping_for_experiment
 
 
 @pytest.fixture(name="setup_experiment")
-def fixture_setup_experiment(experiment_slug, json_data, gradlewbuild_log, variables):
+def fixture_setup_experiment(experiment_slug, json_data, gradlewbuild_log, ping_collector):
+    """Returns a function enrolling in a branch, and returning once the app's first frame
+    is drawn.
+
+    Like start_app, that does not prove the Nimbus experiment was applied.
+    """
+
     def _(branch):
-        requests.delete(f"{variables['urls']['telemetry_server']}/pings")
+        ping_collector.reset()
         logging.info(f"Testing experiment {experiment_slug}, BRANCH: {branch[0]}")
         command = f"nimbus-cli --app fenix --channel developer enroll {experiment_slug} --branch {branch[0]} --file {json_data} --reset-app"
         logging.info(f"Running command {command}")
-        try:
-            out = subprocess.check_output(command, shell=True, stderr=subprocess.STDOUT)
-        except subprocess.CalledProcessError as e:
-            out = e.output
-            raise
-        finally:
-            with open(gradlewbuild_log, "w") as f:
-                f.write(f"{out}")
-        time.sleep(
-            15
-        )  # Wait a while as there's no real way to know when the app has started
+        with ADBLogcat() as logcat:
+            try:
+                out = subprocess.check_output(
+                    command, shell=True, stderr=subprocess.STDOUT
+                )
+            except subprocess.CalledProcessError as e:
+                out = e.output
+                raise
+            finally:
+                with open(gradlewbuild_log, "w") as f:
+                    f.write(f"{out}")
+            logcat.wait_until_ready()
 
     return _
@@ -1,59 +1,157 @@
-import subprocess
+import json
+import os
 from pathlib import Path
 
 import yaml
 
-
-def search_for_smoke_tests(tests_name):
-    """Searches for smoke tests within the requested test module."""
-    path = Path("../ui")
-    files = sorted([x for x in path.iterdir() if x.is_file()])
-    locations = []
-    file_name = None
-    test_names = []
-
-    for name in files:
-        if tests_name in name.name:
-            file_name = name
-            break
-
-    with open(file_name, "r") as file:
-        code = file.read().split(" ")
-        code = [item for item in code if item != ""]
-
-        for count, item in enumerate(code):
-            if "class" in item or "@SmokeTest" in item:
-                locations.append(count)
-
-        for location in locations:
-            if len(test_names) == 0:
-                class_name = code[location + 1]
-                test_names.append(class_name)
-            else:
-                test_names.append(f"{class_name}#{code[location+3].strip('()')}")
-    return test_names
-
-
-def create_test_file():
-    """Create the python file to hold the tests."""
-
-    path = Path("tests/")
-    filename = "test_smoke_scenarios.py"
-    final_path = path / filename
-
-    if final_path.exists():
-        print("File Exists, you need to delete it to create a new one.")
-        return
-    # file exists
-    subprocess.run([f"touch {final_path}"], encoding="utf8", shell=True)
-    assert final_path.exists()
-    with open(final_path, "w") as file:
-        file.write("import pytest\n\n")
+UI_TESTS_PATH = Path("../ui")
+PYTEST_FILE = Path("tests/test_smoke_scenarios.py")
+# @SmokeTest methods per UI test file, reused for the files whose mtime did not change
+INDEX_CACHE_PATH = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    / "fenix-experimentintegration"
+    / "smoke-tests.json"
+)
+INDEX_CACHE_VERSION = 1
+
+
+def tokenize_kotlin(code):
+    """Yields the identifiers and symbols of Kotlin code.
+
+    Comments (nested block comments included), strings and character literals are
+    skipped, so that a `@SmokeTest` or a `class` in them is not mistaken for code.
+    """
+    i = 0
+    length = len(code)
+    while i < length:
+        char = code[i]
+        if char.isspace():
+            i += 1
+        elif code.startswith("//", i):
+            end = code.find("\n", i)
+            i = length if end == -1 else end + 1
+        elif code.startswith("/*", i):
+            depth = 0
+            while i < length:
+                if code.startswith("/*", i):
+                    depth += 1
+                    i += 2
+                elif code.startswith("*/", i):
+                    depth -= 1
+                    i += 2
+                    if depth == 0:
+                        break
+                else:
+                    i += 1
+        elif code.startswith('"""', i):
+            end = code.find('"""', i + 3)
+            i = length if end == -1 else end + 3
+            # A raw string may end with more quotes than the delimiter
+            while i < length and code[i] == '"':
+                i += 1
+        elif char in "\"'":
+            i += 1
+            while i < length and code[i] != char:
+                i += 2 if code[i] == "\\" else 1
+            i += 1
+        elif char.isalnum() or char == "_":
+            start = i
+            while i < length and (code[i].isalnum() or code[i] == "_"):
+                i += 1
+            yield code[start:i]
+        elif char == "`":
+            # Backquoted identifiers, e.g. fun `test name`()
+            end = code.find("`", i + 1)
+            end = length if end == -1 else end
+            yield code[i + 1 : end]
+            i = end + 1
+        else:
+            yield char
+            i += 1
+
+
+def parse_smoke_tests(code):
+    """Returns the name of the first class of a Kotlin file and its @SmokeTest methods."""
+    class_name = None
+    smoke_tests = []
+    annotations = set()
+    tokens = tokenize_kotlin(code)
+    previous = None
+    for token in tokens:
+        if token == "@":
+            annotations.add(next(tokens, None))
+        elif token == "class" and previous not in (":", "."):
+            name = next(tokens, None)
+            if class_name is None:
+                class_name = name
+            annotations.clear()
+        elif token == "fun":
+            name = next(tokens, None)
+            if "SmokeTest" in annotations:
+                smoke_tests.append(name)
+            annotations.clear()
+        elif token in ("val", "var", "object", "interface"):
+            annotations.clear()
+        previous = token
+    return class_name, smoke_tests
+
+
+def build_index(ui_tests_path=UI_TESTS_PATH, cache_path=INDEX_CACHE_PATH):
+    """Returns {file stem: (class name, @SmokeTest methods)} for every UI test file.
+
+    Only the files added or modified since the last call are parsed again.
+    """
+    try:
+        cache = json.loads(cache_path.read_text())
+        if cache.get("version") != INDEX_CACHE_VERSION:
+            cache = {}
+    except (FileNotFoundError, ValueError):
+        cache = {}
+    cached_files = cache.get("files", {})
+
+    files = {}
+    for path in sorted(ui_tests_path.glob("*.kt")):
+        stat = path.stat()
+        key = str(path.resolve())
+        entry = cached_files.get(key)
+        if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            class_name, smoke_tests = parse_smoke_tests(path.read_text(encoding="utf8"))
+            entry = {
+                "stem": path.stem,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "class": class_name,
+                "smoke_tests": smoke_tests,
+            }
+        files[key] = entry
+
+    if files != cached_files:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps({"version": INDEX_CACHE_VERSION, "files": files}))
+    return {entry["stem"]: (entry["class"], entry["smoke_tests"]) for entry in files.values()}
+
+
+def search_for_smoke_tests(tests_name, index=None):
+    """Searches for smoke tests within the requested test module.
+
+    Returns the class name followed by a "Class#method" entry per smoke test.
+    Raises ValueError if no UI test file matches the module.
+    """
+    if index is None:
+        index = build_index()
+    stem = tests_name
+    if stem not in index:
+        stem = next((name for name in sorted(index) if tests_name in name), None)
+    if stem is None:
+        raise ValueError(
+            f"No UI test file in {UI_TESTS_PATH} matches the smoke test module {tests_name!r}"
+        )
+    class_name, smoke_tests = index[stem]
+    return [class_name] + [f"{class_name}#{test}" for test in smoke_tests]
 
 
-def generate_smoke_tests(tests_names=None):
-    """Generate pytest code for the requested tests."""
-    pytest_file = "tests/test_smoke_scenarios.py"
+def render_smoke_tests(tests_names):
+    """Returns pytest code for the requested tests, as returned by search_for_smoke_tests."""
     tests = []
 
     for test in tests_names[1:]:
@@ -67,16 +165,27 @@ def test_smoke_{test_name}(setup_experiment, gradlewbuild, load_branches, check_
     assert check_ping_for_experiment
 """
         )
-    with open(pytest_file, "a") as file:
-        for item in tests:
-            file.writelines(f"{item}")
+    return "".join(tests)
+
+
+def generate_smoke_tests(test_modules, pytest_file=PYTEST_FILE):
+    """Generate the pytest file for the smoke tests of all requested modules.
+
+    The file is only written when its content changes.
+    """
+    index = build_index()
+    code = "import pytest\n\n" + "".join(
+        render_smoke_tests(search_for_smoke_tests(module, index))
+        for module in test_modules
+    )
+    if pytest_file.exists() and pytest_file.read_text() == code:
+        print(f"{pytest_file} is up to date.")
+        return
+    pytest_file.write_text(code)
+    print(f"Generated {pytest_file}.")
 
 
 if __name__ == "__main__":
-    test_modules = None
-    create_test_file()
     with open("variables.yaml", "r") as file:
         test_modules = yaml.safe_load(file)
-    for item in test_modules.get("smoke_tests"):
-        tests = search_for_smoke_tests(item)
-        generate_smoke_tests(tests)
+    generate_smoke_tests(test_modules.get("smoke_tests"))
@@ -0,0 +1,97 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from collections import defaultdict
+import logging
+import time
+
+import requests
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+# Header set by servers that only return the pings after the `after` query parameter
+TOTAL_HEADER = "X-Pings-Total"
+# How long the server may hold a request until a new ping arrives
+LONG_POLL_SECONDS = 20
+# Between requests to servers that answer right away
+POLL_INTERVAL = 5
+
+
+class PingCollector(object):
+    """Fetches the pings received by the telemetry server, each of them only once.
+
+    The collector keeps a cursor: the number of pings already seen. Servers supporting it
+    (see telemetryserver.py) only send the pings after the cursor, and hold the request
+    until one arrives. With other servers every ping is downloaded each time, but the
+    ones before the cursor are skipped without being looked at again.
+
+    Nimbus events are indexed by (category, name, experiment, branch) as they arrive.
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, server_url):
+        self.pings_url = f"{server_url}/pings"
+        self.cursor = 0
+        self.events = defaultdict(list)
+
+    def reset(self):
+        """Deletes the pings received so far, on the server and here."""
+        requests.delete(self.pings_url)
+        self.cursor = 0
+        self.events.clear()
+
+    def fetch(self, wait=0):
+        """Indexes the pings received since the last call, waiting up to `wait` seconds
+        for the first one. Returns whether the server supports cursors."""
+        response = requests.get(
+            self.pings_url,
+            params={"after": self.cursor, "wait": wait},
+            timeout=wait + 30,
+        )
+        pings = response.json()
+        total = response.headers.get(TOTAL_HEADER)
+        if total is None:
+            pings = pings[self.cursor :]
+            self.cursor += len(pings)
+        else:
+            self.cursor = int(total)
+
+        for ping in pings:
+            for event in ping.get("events") or []:
+                self._index(event)
+        return total is not None
+
+    def _index(self, event):
+        extra = event.get("extra") or {}
+        if "branch" not in extra:
+            return
+        key = (
+            event.get("category"),
+            event.get("name"),
+            extra.get("experiment"),
+            extra["branch"],
+        )
+        self.events[key].append(event)
+
+    def find(self, names, experiment, branch, category="nimbus_events"):
+        """Returns the indexed events of one of `names` for an experiment branch."""
+        return [
+            event
+            for name in names
+            for event in self.events.get((category, name, experiment, branch), [])
+        ]
+
+    def wait_for_event(self, names, experiment, branch, timeout=60 * 5):
+        """Fetches pings until an event of one of `names` for the experiment branch is
+        received, or timeout seconds. Returns the events found."""
+        deadline = time.time() + timeout
+        while True:
+            events = self.find(names, experiment, branch)
+            remaining = deadline - time.time()
+            if events or remaining <= 0:
+                return events
+            supports_cursor = self.fetch(wait=min(LONG_POLL_SECONDS, remaining))
+            if not supports_cursor and not self.find(names, experiment, branch):
+                time.sleep(min(POLL_INTERVAL, max(0, deadline - time.time())))
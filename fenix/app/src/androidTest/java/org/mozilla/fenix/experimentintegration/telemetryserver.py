@@ -0,0 +1,123 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""A stand-in for the telemetry server the experiment integration tests read pings from.
+
+Point the app's Glean uploads at it (`/submit/...`) and `urls.telemetry_server` in
+variables.yaml at it, then:
+
+    python -m experimentintegration.telemetryserver --port 5000
+
+GET /pings?after=N&wait=S returns the pings received after the first N, holding the
+request up to S seconds until there is one. The total number of pings is returned in the
+X-Pings-Total header, for PingCollector to use as its next cursor. DELETE /pings forgets
+every ping.
+"""
+
+import argparse
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import threading
+from urllib.parse import parse_qs, urlparse
+
+from experimentintegration.pingcollector import TOTAL_HEADER
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+MAX_WAIT_SECONDS = 60
+
+
+class PingStore(object):
+    def __init__(self):
+        self.pings = []
+        self.changed = threading.Condition()
+
+    def add(self, ping):
+        with self.changed:
+            self.pings.append(ping)
+            self.changed.notify_all()
+
+    def clear(self):
+        with self.changed:
+            self.pings = []
+            self.changed.notify_all()
+
+    def after(self, cursor, wait):
+        """Returns the pings after cursor and the total number of pings, waiting up to
+        `wait` seconds for a new one."""
+        with self.changed:
+            self.changed.wait_for(lambda: len(self.pings) > cursor, timeout=wait)
+            return self.pings[cursor:], len(self.pings)
+
+
+class TelemetryRequestHandler(BaseHTTPRequestHandler):
+    logger = logging.getLogger()
+
+    def log_message(self, format, *args):
+        self.logger.debug(format % args)
+
+    @property
+    def store(self):
+        return self.server.store
+
+    def do_POST(self):
+        if not self.path.startswith("/submit/"):
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        try:
+            self.store.add(json.loads(body))
+        except ValueError:
+            self.send_error(400, "Ping is not JSON")
+            return
+        self.send_response(200)
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/pings":
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        cursor = int(query.get("after", ["0"])[0])
+        wait = min(float(query.get("wait", ["0"])[0]), MAX_WAIT_SECONDS)
+        pings, total = self.store.after(cursor, wait)
+
+        body = json.dumps(pings).encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header(TOTAL_HEADER, str(total))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_DELETE(self):
+        if urlparse(self.path).path != "/pings":
+            self.send_error(404)
+            return
+        self.store.clear()
+        self.send_response(200)
+        self.end_headers()
+
+
+def create_server(host="0.0.0.0", port=5000):
+    server = ThreadingHTTPServer((host, port), TelemetryRequestHandler)
+    server.daemon_threads = True
+    server.store = PingStore()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in telemetry server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = create_server(args.host, args.port)
+    logging.info(f"Receiving pings on port {server.server_port}")
+    server.serve_forever()
@@ -0,0 +1,78 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+from experimentintegration.adblogcat import ADBLogcat
+
+FAKE_ADB = """\
+#!{python}
+import sys
+import time
+
+if "-c" in sys.argv:
+    sys.exit(0)
+for line in {lines!r}:
+    print(line, flush=True)
+# Enough output to fill the pipe if nobody reads it
+for number in range({chatter_lines}):
+    print("I/chatty  ( 1234): line %d" % number)
+sys.stdout.flush()
+time.sleep({sleep})
+"""
+
+
+class ADBLogcatTestCase(unittest.TestCase):
+    def logcat(self, lines, chatter_lines=0, sleep=60):
+        """Returns an ADBLogcat tailing a fake adb printing lines."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        adb = os.path.join(directory.name, "adb")
+        with open(adb, "w") as f:
+            f.write(
+                FAKE_ADB.format(
+                    python=sys.executable,
+                    lines=lines,
+                    chatter_lines=chatter_lines,
+                    sleep=sleep,
+                )
+            )
+        os.chmod(adb, os.stat(adb).st_mode | stat.S_IEXEC)
+
+        logcat = ADBLogcat()
+        logcat.binary = adb
+        return logcat
+
+    def test_ready(self):
+        with self.logcat(
+            ["I/ActivityManager(  500): Displayed org.mozilla.fenix.debug/.App: +1s2ms"]
+        ) as logcat:
+            with self.assertLogs(level="INFO"):
+                self.assertTrue(logcat.wait_until_ready(timeout=10))
+
+    def test_timeout_warns_and_continues(self):
+        with self.logcat(
+            ["I/ActivityManager(  500): Displayed org.mozilla.firefox/.App: +1s2ms"]
+        ) as logcat:
+            with self.assertLogs(level="WARNING") as logs:
+                self.assertFalse(logcat.wait_until_ready(timeout=0.2))
+        self.assertIn("App not ready after 0.2 seconds, continuing anyway", logs.output[0])
+
+    def test_output_is_drained_after_ready(self):
+        with self.logcat(
+            ["I/ActivityManager(  500): Displayed org.mozilla.fenix.debug/.App: +1s2ms"],
+            chatter_lines=100000,
+            sleep=0,
+        ) as logcat:
+            self.assertTrue(logcat.wait_until_ready(timeout=10))
+            # adb would block on a full pipe and never exit
+            self.assertEqual(logcat.process.wait(timeout=10), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import threading
+import time
+import unittest
+
+import requests
+
+from experimentintegration import telemetryserver
+from experimentintegration.pingcollector import TOTAL_HEADER, PingCollector
+
+EXPERIMENT = "homescreen-copy"
+
+
+class NoCursorRequestHandler(telemetryserver.TelemetryRequestHandler):
+    """Answers like a server without cursors: every ping, right away."""
+
+    def do_GET(self):
+        body = json.dumps(self.store.pings).encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def event(name, experiment=EXPERIMENT, branch="control", category="nimbus_events"):
+    return {
+        "category": category,
+        "name": name,
+        "extra": {"experiment": experiment, "branch": branch},
+    }
+
+
+class PingCollectorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.start_server()
+
+    def start_server(self, handler=None):
+        self.server = telemetryserver.create_server("127.0.0.1", 0)
+        if handler is not None:
+            self.server.RequestHandlerClass = handler
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.server_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.collector = PingCollector(self.server_url)
+
+    def send_ping(self, *events):
+        response = requests.post(
+            f"{self.server_url}/submit/org-mozilla-fenix-debug/events/1/ping-id",
+            json={"events": list(events)},
+        )
+        response.raise_for_status()
+
+    def send_ping_later(self, delay, *events):
+        timer = threading.Timer(delay, self.send_ping, events)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def test_cursor_paging(self):
+        self.send_ping(event("enrollment"))
+        self.send_ping(event("exposure"))
+        self.assertTrue(self.collector.fetch())
+        self.assertEqual(self.collector.cursor, 2)
+
+        self.send_ping(event("enrollment"))
+        response = requests.get(f"{self.server_url}/pings", params={"after": 2})
+        self.assertEqual(response.json(), [{"events": [event("enrollment")]}])
+        self.assertEqual(response.headers[TOTAL_HEADER], "3")
+
+        self.collector.fetch()
+        self.assertEqual(self.collector.cursor, 3)
+        # Pings before the cursor are not indexed again
+        self.assertEqual(len(self.collector.find(["enrollment"], EXPERIMENT, "control")), 2)
+        self.assertEqual(len(self.collector.find(["exposure"], EXPERIMENT, "control")), 1)
+
+    def test_server_without_cursor(self):
+        self.start_server(NoCursorRequestHandler)
+        self.send_ping(event("enrollment"))
+        self.assertFalse(self.collector.fetch())
+
+        self.send_ping(event("unenrollment"))
+        self.collector.fetch()
+        self.assertEqual(self.collector.cursor, 2)
+        self.assertEqual(len(self.collector.find(["enrollment"], EXPERIMENT, "control")), 1)
+        self.assertEqual(
+            len(self.collector.find(["unenrollment"], EXPERIMENT, "control")), 1
+        )
+
+    def test_long_poll_returns_when_a_ping_arrives(self):
+        self.send_ping_later(0.2, event("enrollment"))
+        started = time.monotonic()
+        self.collector.fetch(wait=10)
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.collector.cursor, 1)
+
+    def test_long_poll_gives_up_after_wait(self):
+        started = time.monotonic()
+        self.collector.fetch(wait=0.2)
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(self.collector.cursor, 0)
+
+    def test_wait_for_event(self):
+        self.send_ping(event("enrollment", branch="treatment"))
+        self.send_ping_later(0.2, event("disqualification"))
+        started = time.monotonic()
+        events = self.collector.wait_for_event(
+            ["unenrollment", "disqualification"], EXPERIMENT, "control", timeout=10
+        )
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(events, [event("disqualification")])
+
+    def test_find_matches_every_key_exactly(self):
+        expected = event("enrollment")
+        self.send_ping(
+            expected,
+            event("enrollment", experiment=EXPERIMENT + "-rollout"),
+            event("enrollment", experiment="copy"),
+            event("enrollment", branch="control-2"),
+            event("enrollment", category="nimbus_health"),
+            event("enrollment_failed"),
+            # Events without a branch are not about an experiment branch
+            {"category": "nimbus_events", "name": "enrollment", "extra": {}},
+            {"category": "nimbus_events", "name": "enrollment"},
+        )
+        self.collector.fetch()
+
+        self.assertEqual(
+            self.collector.find(["enrollment"], EXPERIMENT, "control"), [expected]
+        )
+        self.assertEqual(self.collector.find(["enrollment"], "copy", "treatment"), [])
+        self.assertEqual(
+            self.collector.find(
+                ["enrollment"], EXPERIMENT, "control", category="nimbus_health"
+            ),
+            [event("enrollment", category="nimbus_health")],
+        )
+
+    def test_reset(self):
+        self.send_ping(event("enrollment"))
+        self.collector.fetch()
+        self.collector.reset()
+
+        self.assertEqual(self.collector.cursor, 0)
+        self.assertEqual(self.collector.find(["enrollment"], EXPERIMENT, "control"), [])
+        self.assertEqual(requests.get(f"{self.server_url}/pings").json(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,11 +2,17 @@
 
 import argparse
 import sys
-import xml
+import xml.etree.ElementTree
 from pathlib import Path
 
 from beautifultable import BeautifulTable
-from junitparser import Attr, Failure, JUnitXml, TestSuite
+
+# The JUnit report parser is shared with the other products and lives in taskcluster/scripts/lib
+lib_directory = str(Path(__file__).resolve().parents[4].joinpath('taskcluster', 'scripts', 'lib'))
+if lib_directory not in sys.path:
+    sys.path.append(lib_directory)
+
+from junit_report import iter_failure_results
 
 
 def parse_args(cmdln_args):
@@ -18,57 +24,29 @@ def parse_args(cmdln_args):
     return parser.parse_args(args=cmdln_args)
 
 
-class test_suite(TestSuite):
-    flakes = Attr()
-
-
-def parse_print_failure_results(results):
+def parse_print_failure_results(filename):
     table = BeautifulTable(maxwidth=256)
     table.columns.header = (['UI Test', 'Outcome', 'Details'])
     table.columns.alignment = BeautifulTable.ALIGN_LEFT
     table.set_style(BeautifulTable.STYLE_GRID)
 
-    for suite in results:
-        cur_suite = test_suite.fromelem(suite)
-        if cur_suite.flakes != '0':
-            for case in suite:
-                for entry in case.result:
-                    if case.result:
-                        table.rows.append(
-                            ["%s#%s" % (case.classname, case.name), "Flaky", entry.text.replace('\t', ' ')])
-                        break
-        else:
-            for case in suite:
-                for entry in case.result:
-                    if isinstance(entry, Failure):
-                        table.rows.append(
-                            ["%s#%s" % (case.classname, case.name), "Failure", entry.text.replace('\t', ' ')])
-                        break
-    print(table)
-
-
-def load_results_file(filename):
-    ret = None
     try:
-        f = open(filename, 'r')
-        try:
-            ret = JUnitXml.fromfile(f)
-        except xml.etree.ElementTree.ParseError as e:
-            print(f'Error parsing {filename} file: {e}')
-        finally:
-            f.close()
+        for test, outcome, details in iter_failure_results(str(filename)):
+            table.rows.append([test, outcome, details])
+    except xml.etree.ElementTree.ParseError as e:
+        print(f'Error parsing {filename} file: {e}')
+        return
     except IOError as e:
         print(e)
+        return
 
-    return ret
+    print(table)
 
 
 def main():
     args = parse_args(sys.argv[1:])
 
-    junitxml = load_results_file(args.results.joinpath('FullJUnitReport.xml'))
-    if junitxml:
-        parse_print_failure_results(junitxml)
+    parse_print_failure_results(args.results.joinpath('FullJUnitReport.xml'))
 
 
 if __name__ == '__main__':
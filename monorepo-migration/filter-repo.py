@@ -1,10 +1,17 @@
 #!/usr/bin/python
 
+from collections import OrderedDict, defaultdict
 import re
+import subprocess
 import sys
+import time
 
 import git_filter_repo
 
+# Translated hashes kept in memory; a message typically references recent commits
+TRANSLATION_CACHE_SIZE = 65536
+SHORT_HASH_LENGTH = 7
+
 
 class RepoFilter(git_filter_repo.RepoFilter):
     """Replace commit hashes in commit messages with a github URL
@@ -15,12 +22,66 @@ class RepoFilter(git_filter_repo.RepoFilter):
 	# the move to firefox-android, but the repo name wasn't, so we're also
 	# fixing that up here.
         self._hash_re = re.compile(br'\b(https://github.com/mozilla-mobile/[a-z-]*/commit/)?([0-9a-f]{7,40})\b')
+        # Tokens that turned out to be commits of the source repo, with their translation.
+        # Only positive results are cached: a commit that is not rewritten yet may still
+        # get a new hash later in the run.
+        self._translation_cache = OrderedDict()
+        self._source_hashes_by_prefix = None
+        self._hash_stats = defaultdict(int)
+        self._hash_time = 0.0
+
+    def _load_source_hashes(self):
+        """Maps the short hash of every commit of the source repo to the full hashes."""
+        source = self._args.source or b"."
+        output = subprocess.check_output(
+            [b"git", b"-C", source, b"rev-list", b"--all"]
+        )
+        hashes_by_prefix = defaultdict(list)
+        for full_hash in output.split():
+            hashes_by_prefix[full_hash[:SHORT_HASH_LENGTH]].append(full_hash)
+        return hashes_by_prefix
+
+    def _is_source_commit(self, old_hash):
+        """Whether old_hash abbreviates a commit of the source repo; most hex-looking
+        tokens (colors, version numbers, other repos' hashes) are rejected by one lookup."""
+        if self._source_hashes_by_prefix is None:
+            self._source_hashes_by_prefix = self._load_source_hashes()
+        candidates = self._source_hashes_by_prefix.get(old_hash[:SHORT_HASH_LENGTH])
+        return candidates is not None and any(
+            full_hash.startswith(old_hash) for full_hash in candidates
+        )
+
+    def _translate_old_hash(self, old_hash):
+        self._hash_stats["tokens"] += 1
+        new_hash = self._translation_cache.get(old_hash)
+        if new_hash is not None:
+            self._hash_stats["cache hits"] += 1
+            self._translation_cache.move_to_end(old_hash)
+            return new_hash
+        if not self._is_source_commit(old_hash):
+            self._hash_stats["rejected"] += 1
+            return old_hash
+
+        self._hash_stats["translated"] += 1
+        new_hash = super()._translate_commit_hash(old_hash)
+        if new_hash != old_hash:
+            self._translation_cache[old_hash] = new_hash
+            if len(self._translation_cache) > TRANSLATION_CACHE_SIZE:
+                self._translation_cache.popitem(last=False)
+        return new_hash
 
     def _translate_commit_hash(self, matchobj_or_oldhash):
+        start = time.perf_counter()
+        try:
+            return self._rewrite_commit_hash(matchobj_or_oldhash)
+        finally:
+            self._hash_time += time.perf_counter() - start
+
+    def _rewrite_commit_hash(self, matchobj_or_oldhash):
         old_hash = matchobj_or_oldhash
         if not isinstance(matchobj_or_oldhash, bytes):
             old_hash = matchobj_or_oldhash.group(2)
-        new_hash = super()._translate_commit_hash(old_hash)
+        new_hash = self._translate_old_hash(old_hash)
         if new_hash == old_hash:
             # not a firefox-android commit, don't touch it
             if isinstance(matchobj_or_oldhash, bytes):
@@ -30,6 +91,16 @@ class RepoFilter(git_filter_repo.RepoFilter):
         # turn the hash into a URL to avoid a dangling reference
         return b"https://github.com/mozilla-mobile/firefox-android/commit/" + old_hash
 
+    def run(self):
+        try:
+            super().run()
+        finally:
+            stats = ", ".join(f"{count} {name}" for name, count in self._hash_stats.items())
+            print(
+                f"Commit hash translation: {stats or 'no tokens'} in {self._hash_time:.2f}s",
+                file=sys.stderr,
+            )
+
 
 def main():
     args = git_filter_repo.FilteringOptions.parse_args(sys.argv[1:])
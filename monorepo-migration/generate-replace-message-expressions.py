@@ -2,6 +2,7 @@
 
 import json
 import logging
+import re
 from pathlib import Path
 
 
@@ -17,9 +18,67 @@ REPO_OWNER = "mozilla-mobile"
 REPO_NAME_TO_IMPORT = "firefox-android"
 
 
-def divide_chunks(sequence, n):
-    for i in range(0, len(sequence), n):
-        yield sequence[i : i + n]
+def numbers_regex(numbers):
+    """Returns a regex matching exactly the given numbers, as a trie of their digits.
+
+    One alternation per number makes the regex engine try every number in turn. As a
+    trie, each digit is only looked at once: 123, 124 and 167 become 1(?:2[34]|67).
+    Groups are non-capturing so that the groups of the surrounding expression keep
+    their numbers.
+    """
+    trie = {}
+    for number in numbers:
+        node = trie
+        for digit in str(number):
+            node = node.setdefault(digit, {})
+        node[""] = {}
+    return _trie_regex(trie)
+
+
+def _trie_regex(node):
+    leaves = []
+    branches = []
+    for digit in sorted(key for key in node if key):
+        child = node[digit]
+        if list(child) == [""]:
+            leaves.append(digit)
+        else:
+            branches.append(digit + _trie_regex(child))
+    alternatives = branches + ([_digit_class(leaves)] if leaves else [])
+    if not alternatives:
+        return ""
+
+    if len(alternatives) > 1:
+        regex = "(?:{})".format("|".join(alternatives))
+        is_atom = True
+    else:
+        regex = alternatives[0]
+        is_atom = len(regex) == 1 or regex == r"\d" or re.fullmatch(r"\[[0-9-]+\]", regex)
+
+    if "" in node:
+        # The number may also end here
+        return (regex if is_atom else f"(?:{regex})") + "?"
+    return regex
+
+
+def _digit_class(digits):
+    """Returns a character class matching the given sorted digits, e.g. [0-35]."""
+    if len(digits) == 1:
+        return digits[0]
+    if len(digits) == 10:
+        return r"\d"
+    ranges = []
+    for digit in digits:
+        if ranges and int(ranges[-1][-1]) + 1 == int(digit):
+            ranges[-1].append(digit)
+        else:
+            ranges.append([digit])
+    return "[{}]".format(
+        "".join(
+            f"{digits[0]}-{digits[-1]}" if len(digits) > 2 else "".join(digits)
+            for digits in ranges
+        )
+    )
 
 
 def order_repo_names(repo_names):
@@ -43,19 +102,22 @@ def main():
             continue
 
         for number_type in ("issues", "pulls"):
-            for chunk in divide_chunks(numbers[number_type], 100):
-                regex = (r"regex:(\W)(({repo_owner}/)?{repo_name}){repo_suffix}#({current_numbers})(\D|$)==>\1{url}/\4\5" "\n").format(
+            if not numbers[number_type]:
+                continue
+            # A single expression per repo and number type: git filter-repo runs every
+            # expression on every commit message.
+            regex = (r"regex:(\W)(({repo_owner}/)?{repo_name}){repo_suffix}#({current_numbers})(\D|$)==>\1{url}/\4\5" "\n").format(
+                repo_owner=REPO_OWNER,
+                repo_name=f"[{repo_name[0].upper()}{repo_name[0].lower()}]{repo_name[1:]}",
+                repo_suffix=r"?" if repo_name == REPO_NAME_TO_IMPORT else r"\s*",
+                current_numbers=numbers_regex(numbers[number_type]),
+                url=GITHUB_URL_TEMPLATE.format(
                     repo_owner=REPO_OWNER,
-                    repo_name=f"[{repo_name[0].upper()}{repo_name[0].lower()}]{repo_name[1:]}",
-                    repo_suffix=r"?" if repo_name == REPO_NAME_TO_IMPORT else r"\s*",
-                    current_numbers="|".join(str(number) for number in chunk),
-                    url=GITHUB_URL_TEMPLATE.format(
-                        repo_owner=REPO_OWNER,
-                        repo_name=repo_name,
-                        number_type="pull" if number_type == "pulls" else number_type,
-                    ),
-                )
-                regexes.append(regex)
+                    repo_name=repo_name,
+                    number_type="pull" if number_type == "pulls" else number_type,
+                ),
+            )
+            regexes.append(regex)
 
     # fix up wrong replacements from previous migrations
     regexes += [
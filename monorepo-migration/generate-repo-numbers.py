@@ -4,10 +4,13 @@ import asyncio
 import json
 import logging
 import os
+import re
+import time
 from datetime import datetime, timezone
-from functools import wraps, partial
 from pathlib import Path
 from urllib import request
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlparse
 
 
 log = logging.getLogger(__name__)
@@ -27,19 +30,57 @@ REPO_NAMES = ("android-components", "fenix", "focus-android", "firefox-android")
 NUMBER_TYPES = ("pulls", "issues")
 DATA_DIR = (Path(__file__).parent / "data").absolute()
 
-
-def async_wrap(func):
-    @wraps(func)
-    async def run(*args, loop=None, executor=None, **kwargs):
-        if loop is None:
-            loop = asyncio.get_event_loop()
-        pfunc = partial(func, *args, **kwargs)
-        return await loop.run_in_executor(executor, pfunc)
-
-    return run
-
-
-async def query_github(page, repo_owner, repo_name, last_updated):
+# Requests in flight at once, over all repositories. GitHub asks not to go much higher.
+MAX_CONCURRENT_REQUESTS = 8
+MAX_RETRIES = 5
+LINK_LAST_PAGE_RE = re.compile(r'<([^>]+)>;\s*rel="last"')
+
+
+class GitHubRateLimiter:
+    """Pauses requests while the GitHub rate limit is exhausted, as reported by the
+    X-RateLimit-* and Retry-After headers of earlier responses."""
+
+    def __init__(self, max_concurrent_requests=MAX_CONCURRENT_REQUESTS):
+        self.semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self.resume_at = 0
+
+    async def wait(self):
+        delay = self.resume_at - time.time()
+        if delay > 0:
+            log.warning(f"GitHub rate limit reached, waiting {delay:.0f}s...")
+            await asyncio.sleep(delay)
+
+    def update(self, headers, status=None):
+        """Records the rate limit state of a response. Returns whether to retry it."""
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None:
+            self.resume_at = max(self.resume_at, time.time() + int(retry_after))
+            return True
+        if headers.get("X-RateLimit-Remaining") == "0":
+            reset = int(headers.get("X-RateLimit-Reset", time.time() + 60))
+            self.resume_at = max(self.resume_at, reset + 1)
+            # The request that used the last unit went through, later ones get a 403 or 429
+            return status in (403, 429)
+        return False
+
+
+def _fetch(url, headers):
+    """Blocking part of a request, run in a worker thread: connecting, reading and decoding."""
+    req = request.Request(url, headers=headers)
+    try:
+        with request.urlopen(req) as opened_url:
+            data = opened_url.read()
+            encoding = opened_url.info().get_content_charset("utf-8")
+            return 200, opened_url.headers, json.loads(data.decode(encoding))
+    except HTTPError as e:
+        if e.code in (403, 429):
+            return e.code, e.headers, None
+        raise
+
+
+async def query_github(page, repo_owner, repo_name, last_updated, rate_limiter):
+    """Returns the items of a page, and the number of the last page according to the Link
+    header (or None when there is only one page)."""
     url = ISSUES_AND_PULL_REQUESTS_URL.format(
         page=page,
         repo_owner=repo_owner,
@@ -48,44 +89,63 @@ async def query_github(page, repo_owner, repo_name, last_updated):
     if last_updated is not None:
         since = last_updated.isoformat(timespec="seconds").replace("+00:00", "Z")
         url = f"{url}&since={since}"
-    log.debug(url)
     headers = {
         "Accept": "application/vnd.github+json",
     }
     if GITHUB_TOKEN:
         headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
 
-    req = request.Request(
-        url,
-        headers=headers,
-    )
-    opened_url = request.urlopen(req)
-    async_read = async_wrap(opened_url.read)
-    data = await async_read()
-    encoding = opened_url.info().get_content_charset("utf-8")
-    return json.loads(data.decode(encoding))
+    for _ in range(MAX_RETRIES):
+        async with rate_limiter.semaphore:
+            await rate_limiter.wait()
+            log.debug(url)
+            status, response_headers, items = await asyncio.to_thread(
+                _fetch, url, headers
+            )
+        is_rate_limited = rate_limiter.update(response_headers, status)
+        if status == 200:
+            return items, _last_page(response_headers)
+        if not is_rate_limited:
+            raise Exception(f"GitHub refused the request with a {status}: {url}")
+    raise Exception(f"Still rate limited after {MAX_RETRIES} attempts: {url}")
 
 
-async def get_all_new_numbers(repo_owner, repo_name, last_updated):
+def _last_page(headers):
+    match = LINK_LAST_PAGE_RE.search(headers.get("Link") or "")
+    if match is None:
+        return None
+    return int(parse_qs(urlparse(match.group(1)).query)["page"][0])
+
+
+async def get_all_new_numbers(repo_owner, repo_name, last_updated, rate_limiter):
     log.info(f"Getting all issues and PRs for {repo_name}...")
-    page = 1
     all_new_numbers = {
-        "issues": [],
-        "pulls": [],
+        "issues": set(),
+        "pulls": set(),
     }
 
-    while True:
-        new_items = await query_github(page, repo_owner, repo_name, last_updated)
-        if not new_items:
-            break
-        for item in new_items:
-            numbers_list = (
+    def add_numbers(items):
+        for item in items:
+            numbers = (
                 all_new_numbers["pulls"]
                 if "pull_request" in item.keys()
                 else all_new_numbers["issues"]
             )
-            numbers_list.append(item["number"])
-        page += 1
+            numbers.add(item["number"])
+
+    first_items, last_page = await query_github(
+        1, repo_owner, repo_name, last_updated, rate_limiter
+    )
+    add_numbers(first_items)
+
+    # Pages are consumed as they arrive, so that only the pages in flight are held in memory
+    pages = [
+        query_github(page, repo_owner, repo_name, last_updated, rate_limiter)
+        for page in range(2, (last_page or 1) + 1)
+    ]
+    for next_page in asyncio.as_completed(pages):
+        items, _ = await next_page
+        add_numbers(items)
 
     log.info(
         f"Got {len(all_new_numbers['pulls'])} new pulls and {len(all_new_numbers['issues'])} new issues for {repo_name}!"
@@ -103,13 +163,17 @@ async def build_dict_async(keys, async_func, *async_func_args, **async_func_kwar
     return dict(zip(keys, results))
 
 
-async def get_all_new_numbers_for_repo(repo_name, last_updated):
-    return await get_all_new_numbers("mozilla-mobile", repo_name, last_updated)
+async def get_all_new_numbers_for_repo(repo_name, last_updated, rate_limiter):
+    return await get_all_new_numbers(
+        "mozilla-mobile", repo_name, last_updated, rate_limiter
+    )
 
 
 async def async_main(last_updated):
+    # One limiter for all repositories: they share the same rate limit
+    rate_limiter = GitHubRateLimiter()
     return await build_dict_async(
-        REPO_NAMES, get_all_new_numbers_for_repo, last_updated
+        REPO_NAMES, get_all_new_numbers_for_repo, last_updated, rate_limiter
     )
 
 
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+This module keeps the history of Flank UI test runs in a local, append-only SQLite
+database, so that flaky and slow tests can be identified across runs instead of from a
+single FullJUnitReport.xml.
+
+Every run is ingested from a Flank results directory (FullJUnitReport.xml and
+matrix_ids.json). Runs are keyed by their matrix ids, so ingesting the same results
+twice is a no-op. Rows are never updated or deleted. Runs are ordered by the time their
+report says they started, as artifacts are not necessarily ingested in that order.
+
+Key Components:
+- FlakyTestDatabase Class: Ingests runs and answers per-test queries.
+  - ingest_results_dir: Record the results of one Flank run.
+  - test_stats: Flake rate, failure rate and mean duration per `classname#name`.
+  - mean_durations: Mean duration of every test, for ordering and sharding runs.
+  - failure_streak: Number of consecutive most recent runs a test did not pass in.
+  - quarantine_candidates: Tests whose flake rate exceeds a threshold.
+
+Rates are computed over runs: a test is flaky (or failing) in a run when any of its
+results in that run is, however many devices or attempts that run had.
+
+UI test tasks do not keep caches between runs, so the database is built locally from the
+`public/results` artifacts (FullJUnitReport.xml and matrix_ids.json) of UI test tasks.
+
+Usage:
+    flaky_test_db.py --db flaky-tests.sqlite ingest --results path/to/downloaded/results
+    flaky_test_db.py --db flaky-tests.sqlite report --min-runs 10 --threshold 0.05
+"""
+
+import argparse
+from collections import namedtuple
+from datetime import datetime, timezone
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Ensure the directory containing this script is in Python's search path
+script_directory = os.path.dirname(os.path.abspath(__file__))
+if script_directory not in sys.path:
+    sys.path.append(script_directory)
+
+from junit_report import iter_test_results, report_timestamp
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_key TEXT NOT NULL UNIQUE,
+    ingested_at REAL NOT NULL,
+    started_at REAL
+);
+CREATE TABLE IF NOT EXISTS matrices (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    matrix_id TEXT NOT NULL,
+    outcome TEXT,
+    web_link TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    test TEXT NOT NULL,
+    device TEXT,
+    outcome TEXT NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_test_run ON results (test, run_id);
+"""
+
+# Outcomes counted as "did not pass" for failure rates and streaks
+NOT_PASSED = ("failure", "error", "flaky")
+
+TestStats = namedtuple(
+    "TestStats", ["test", "runs", "flake_rate", "failure_rate", "mean_duration"]
+)
+
+
+class FlakyTestDatabase:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(runs)")}
+        if "started_at" not in columns:
+            # Databases created before the start of runs was recorded
+            self.connection.execute("ALTER TABLE runs ADD COLUMN started_at REAL")
+
+    def close(self):
+        self.connection.close()
+
+    # Ingestion
+
+    def ingest_results_dir(self, results_dir):
+        """
+        Records the results of one Flank run.
+
+        :param results_dir: Flank's local results directory.
+        :return: The id of the new run, or None if this run was ingested before.
+        """
+        with open(os.path.join(results_dir, "matrix_ids.json")) as f:
+            matrix_ids = json.load(f)
+        junit_report = os.path.join(results_dir, "FullJUnitReport.xml")
+        return self.ingest(
+            junit_report, matrix_ids, _parse_timestamp(report_timestamp(junit_report))
+        )
+
+    def ingest(self, junit_report, matrix_ids, started_at=None):
+        """
+        Records a JUnit report together with the matrices it was produced by.
+
+        :param junit_report: Path of the FullJUnitReport.xml file.
+        :param matrix_ids: The parsed content of matrix_ids.json.
+        :param started_at: When the run started, in seconds since the epoch. Runs without
+            it are ordered by the time they were ingested instead.
+        :return: The id of the new run, or None if this run was ingested before.
+        """
+        run_key = ",".join(
+            sorted(matrix["matrixId"] for matrix in matrix_ids.values())
+        )
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO runs (run_key, ingested_at, started_at)"
+                " VALUES (?, ?, ?)",
+                (run_key, time.time(), started_at),
+            )
+            if cursor.rowcount == 0:
+                return None
+            run_id = cursor.lastrowid
+
+            self.connection.executemany(
+                "INSERT INTO matrices VALUES (?, ?, ?, ?)",
+                (
+                    (run_id, matrix["matrixId"], matrix.get("outcome"), matrix.get("webLink"))
+                    for matrix in matrix_ids.values()
+                ),
+            )
+            self.connection.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?)",
+                (
+                    (run_id, result.test, result.device, result.outcome, result.duration)
+                    for result in iter_test_results(junit_report)
+                ),
+            )
+        return run_id
+
+    # Queries
+
+    def test_stats(self, test=None, min_runs=1):
+        """
+        Returns TestStats for one test, or for every test seen in at least `min_runs` runs.
+        """
+        # Aggregate per run first, so that retries and devices do not weigh on the rates
+        query = """
+            WITH per_run AS (
+                SELECT test,
+                       MAX(outcome = 'flaky') AS flaky,
+                       MAX(outcome IN ('failure', 'error')) AS failed,
+                       AVG(duration) AS duration
+                FROM results
+                {where}
+                GROUP BY test, run_id
+            )
+            SELECT test, COUNT(*), AVG(flaky), AVG(failed), AVG(duration)
+            FROM per_run
+            GROUP BY test
+            HAVING COUNT(*) >= ?
+            ORDER BY test
+        """
+        if test is None:
+            rows = self.connection.execute(query.format(where=""), (min_runs,))
+        else:
+            rows = self.connection.execute(
+                query.format(where="WHERE test = ?"), (test, min_runs)
+            )
+        return [TestStats(*row) for row in rows]
+
+    def mean_durations(self):
+        """Returns a dict mapping every known test to its mean duration in seconds."""
+        return dict(
+            self.connection.execute(
+                "SELECT test, AVG(duration) FROM results GROUP BY test"
+            )
+        )
+
+    def failure_streak(self, test):
+        """Returns the number of consecutive most recent runs in which `test` did not pass."""
+        rows = self.connection.execute(
+            f"""
+            SELECT run_id, MAX(outcome IN ({", ".join("?" * len(NOT_PASSED))}))
+            FROM results JOIN runs ON runs.id = results.run_id
+            WHERE test = ?
+            GROUP BY run_id
+            ORDER BY COALESCE(started_at, ingested_at) DESC, run_id DESC
+            """,
+            (*NOT_PASSED, test),
+        )
+        streak = 0
+        for _, not_passed in rows:
+            if not not_passed:
+                break
+            streak += 1
+        return streak
+
+    def quarantine_candidates(self, threshold, min_runs):
+        """Returns the TestStats of tests flaking in more than `threshold` of their runs."""
+        return [
+            stats
+            for stats in self.test_stats(min_runs=min_runs)
+            if stats.flake_rate > threshold
+        ]
+
+
+def _parse_timestamp(timestamp):
+    """Returns a JUnit `timestamp` (UTC, without a time zone) in seconds since the epoch."""
+    try:
+        started_at = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if started_at.tzinfo is None:
+        started_at = started_at.replace(tzinfo=timezone.utc)
+    return started_at.timestamp()
+
+
+def parse_args(cmdln_args):
+    parser = argparse.ArgumentParser(
+        description="Record Flank UI test results and query their history"
+    )
+    parser.add_argument("--db", help="Path of the SQLite database", required=True)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="Record the results of a Flank run")
+    ingest.add_argument(
+        "--results", help="Directory containing flank results", required=True
+    )
+
+    report = subparsers.add_parser("report", help="Print tests worth quarantining")
+    report.add_argument("--min-runs", type=int, default=10)
+    report.add_argument("--threshold", type=float, default=0.05)
+    return parser.parse_args(args=cmdln_args)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    database = FlakyTestDatabase(args.db)
+    try:
+        if args.command == "ingest":
+            run_id = database.ingest_results_dir(args.results)
+            if run_id is None:
+                print(f"Results in {args.results} were already recorded")
+            else:
+                print(f"Recorded results in {args.results} as run {run_id}")
+        else:
+            for stats in database.quarantine_candidates(args.threshold, args.min_runs):
+                print(
+                    f"{stats.test}: flaky in {stats.flake_rate:.0%} of {stats.runs} runs, "
+                    f"failure streak {database.failure_streak(stats.test)}, "
+                    f"mean duration {stats.mean_duration:.1f}s"
+                )
+    finally:
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
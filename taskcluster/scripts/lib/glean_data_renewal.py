@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+This module generates the data renewal artifacts for the Glean metrics and pings of an
+app that expire at or before a given version: the expiry list CSV to be filled out by
+product, the renewal request template, and metrics.yaml/pings.yaml with a TODO marker on
+every `expires` line to update. It is shared by the data_renewal_generate.py scripts of
+Fenix and Focus.
+
+Every file is walked once, as a stream of parser events (LibYAML's when available). The
+events carry the fields of every definition together with the line of its `expires` key,
+so the annotated files are written from the same pass, without parsing them again.
+Aliases are replaced with the events of their anchored node, as if it had been written
+out again; merge keys (`<<`) are not supported.
+
+Key Components:
+- ExpiryIndex Class: Definitions sorted by expiry version, built once per run.
+  - from_files: Index metrics.yaml and pings.yaml files.
+  - expiring: Definitions expiring at or before a version, or within a range of versions.
+  - versions: The expiry versions in use.
+  - annotated_files: The indexed files with the definitions expiring by a version marked.
+- load_metrics(source), load_pings(source): Every definition of a document, in order.
+- write_expiry_list(metrics, csv_file, glean_dictionary_url): Write the expiry list CSV.
+- write_renewal_request(metrics, renewal_file): Write the renewal request template.
+- main(args, metrics_filename, pings_filename, glean_dictionary_url): Command line entry
+  point, generating the artifacts of one or more future versions.
+"""
+
+import bisect
+from collections import namedtuple
+import csv
+import os
+
+import yaml
+
+# LibYAML is much faster on big metrics.yaml files, but is an optional part of PyYAML
+_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Fields of a metric that end up in the expiry list, in this order
+_KEY_FILTER = [
+    "type",
+    "description",
+    "bugs",
+    "data_reviews",
+    "expires",
+]
+
+# Columns for product to fill out, these should always be added at the end
+_PRODUCT_COLUMNS = ["keep(Y/N)", "new expiry version", "reason to extend"]
+
+# A metric or a ping (whose `type` is None). `bugs` and `data_reviews` hold the first item
+# of their list, `expires_line` is 0-based (the line of the anchor for an aliased value).
+Metric = namedtuple(
+    "Metric",
+    ["name", "type", "description", "bugs", "data_reviews", "expires", "expires_line"],
+)
+
+# (Number in the expiry list, file the definition comes from, definition)
+IndexEntry = namedtuple("IndexEntry", ["order", "filename", "metric"])
+
+
+class _Collection:
+    """A mapping or sequence being walked, with what has been read of it so far."""
+
+    def __init__(self, path, is_mapping):
+        self.path = path
+        self.is_mapping = is_mapping
+        self.key = None
+        self.fields = {}
+        self.first_scalar = None
+        # Metrics found in this collection, kept until it is known not to be a metric itself
+        self.metrics = []
+
+    def child_path(self):
+        if self.is_mapping and self.path is not None:
+            return self.path + (self.key,)
+        return None
+
+
+def load_metrics(source):
+    """
+    Returns every metric of a metrics.yaml document, in document order.
+
+    A metric is a mapping with a `type` key, named after the keys leading to it. Mappings
+    nested in a metric, such as its `extra_keys`, are not metrics themselves.
+
+    :param source: The content of metrics.yaml, as a string or a file object.
+    :return: A list of Metric tuples.
+    :raises yaml.YAMLError: If the document is not valid YAML, or uses merge keys.
+    """
+    # `type` is a scalar in a metric, and a metric named "type" in a category
+    return _load(
+        source,
+        lambda collection: collection.path
+        and collection.fields.get("type", (None, None))[1],
+    )
+
+
+def load_pings(source):
+    """
+    Returns every ping of a pings.yaml document, in document order.
+
+    Pings are the top level mappings, other than `$schema` and `no_lint`.
+
+    :param source: The content of pings.yaml, as a string or a file object.
+    :return: A list of Metric tuples, with `type` set to None.
+    :raises yaml.YAMLError: If the document is not valid YAML, or uses merge keys.
+    """
+    return _load(
+        source,
+        lambda collection: collection.is_mapping
+        and collection.path
+        and len(collection.path) == 1
+        and not collection.path[0].startswith("$"),
+    )
+
+
+def _load(source, is_definition):
+    stack = []
+    metrics = []
+
+    for event in _resolve_aliases(yaml.parse(source, Loader=_LOADER)):
+        if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            path = stack[-1].child_path() if stack else ()
+            is_mapping = isinstance(event, yaml.MappingStartEvent)
+            stack.append(_Collection(path, is_mapping))
+        elif isinstance(event, yaml.ScalarEvent):
+            _on_scalar(stack[-1], event)
+        elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            collection = stack.pop()
+            if is_definition(collection):
+                found = [_to_metric(collection)]
+            else:
+                found = collection.metrics
+
+            if not stack:
+                metrics.extend(found)
+                continue
+            parent = stack[-1]
+            parent.metrics.extend(found)
+            if parent.is_mapping:
+                # A sequence stands for its first item, as in `bugs` and `data_reviews`
+                parent.fields[parent.key] = (collection.first_scalar, None)
+                parent.key = None
+    return metrics
+
+
+def _resolve_aliases(events):
+    """Yields the parser events, with the events of the anchored node in place of each alias."""
+    anchored_events = {}
+    # [anchor, events of the node so far, depth in the node], innermost last
+    recordings = []
+
+    for event in events:
+        if isinstance(event, yaml.AliasEvent):
+            if event.anchor not in anchored_events:
+                problem = (
+                    "found recursive anchor %r"
+                    if any(anchor == event.anchor for anchor, _, _ in recordings)
+                    else "found undefined alias %r"
+                )
+                raise yaml.composer.ComposerError(
+                    None, None, problem % event.anchor, event.start_mark
+                )
+            replayed = anchored_events[event.anchor]
+        else:
+            if isinstance(event, yaml.ScalarEvent) and event.value == "<<" and (
+                event.tag is None and event.implicit[0]
+            ):
+                raise yaml.composer.ComposerError(
+                    None, None, "merge keys are not supported", event.start_mark
+                )
+            if isinstance(event, yaml.NodeEvent) and event.anchor is not None:
+                recordings.append([event.anchor, [], 0])
+            replayed = [event]
+
+        for replayed_event in replayed:
+            for recording in recordings:
+                recording[1].append(replayed_event)
+                if isinstance(
+                    replayed_event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)
+                ):
+                    recording[2] += 1
+                elif isinstance(
+                    replayed_event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)
+                ):
+                    recording[2] -= 1
+            yield replayed_event
+
+        # A node ends once its depth is back to 0: a scalar at once, a collection on its end
+        while recordings and recordings[-1][2] == 0:
+            anchor, recorded_events, _ = recordings.pop()
+            anchored_events[anchor] = recorded_events
+
+
+def _on_scalar(collection, event):
+    if not collection.is_mapping:
+        if collection.first_scalar is None:
+            collection.first_scalar = event.value
+    elif collection.key is None:
+        collection.key = event.value
+    else:
+        collection.fields[collection.key] = (event.value, event)
+        collection.key = None
+
+
+def _to_metric(collection):
+    def value(key):
+        return collection.fields.get(key, (None, None))[0]
+
+    expires, expires_event = collection.fields.get("expires", (None, None))
+    if expires is not None and expires.isdigit():
+        expires = int(expires)
+    return Metric(
+        name=".".join(collection.path),
+        type=value("type"),
+        description=value("description"),
+        bugs=value("bugs"),
+        data_reviews=value("data_reviews"),
+        expires=expires,
+        expires_line=expires_event.start_mark.line if expires_event else None,
+    )
+
+
+class ExpiryIndex:
+    """
+    The definitions of an app sorted by expiry version, to answer "what expires at or
+    before version N" for any number of versions without walking the files again.
+
+    Definitions that never expire, or expire on a date, are left out.
+    """
+
+    def __init__(self, definitions, texts=None):
+        """
+        :param definitions: (filename, Metric) pairs, in the order of the expiry list.
+        :param texts: Content of the files the definitions come from, by filename; needed
+            by annotated_files only.
+        """
+        entries = [
+            IndexEntry(order, filename, metric)
+            for order, (filename, metric) in enumerate(definitions)
+            if isinstance(metric.expires, int)
+        ]
+        entries.sort(key=lambda entry: (entry.metric.expires, entry.order))
+        self._entries = entries
+        self._expires = [entry.metric.expires for entry in entries]
+        self._texts = texts or {}
+
+    @classmethod
+    def from_files(cls, metrics_filenames=(), pings_filenames=()):
+        """Indexes metrics.yaml and pings.yaml files, metrics first, reading each once."""
+        definitions = []
+        texts = {}
+        for filenames, load in ((metrics_filenames, load_metrics), (pings_filenames, load_pings)):
+            for filename in filenames:
+                with open(filename, "r") as f:
+                    texts[filename] = f.read()
+                definitions.extend((filename, metric) for metric in load(texts[filename]))
+        return cls(definitions, texts)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def versions(self):
+        """Returns the distinct expiry versions, in ascending order."""
+        return sorted(set(self._expires))
+
+    def expiring(self, version, after=None):
+        """
+        Returns the definitions expiring at or before `version`, in the order of the
+        expiry list.
+
+        :param version: Last expiry version included.
+        :param after: If set, definitions expiring at or before this version are left
+            out, so that consecutive versions can be queried as ranges.
+        :return: A list of IndexEntry tuples.
+        """
+        first = 0 if after is None else bisect.bisect_right(self._expires, after)
+        last = bisect.bisect_right(self._expires, version)
+        return sorted(self._entries[first:last], key=lambda entry: entry.order)
+
+    def annotated_files(self, version):
+        """
+        Returns the indexed files with a TODO marker at the end of the `expires` line of
+        every definition expiring at or before `version`, numbered like the rows of the
+        expiry list.
+
+        :return: A dict mapping the filename of each annotated file to its new content.
+        """
+        lines_per_file = {}
+        for count, entry in enumerate(self.expiring(version), start=1):
+            if entry.filename not in lines_per_file:
+                lines_per_file[entry.filename] = self._texts[entry.filename].splitlines(
+                    keepends=True
+                )
+            lines = lines_per_file[entry.filename]
+            line = lines[entry.metric.expires_line]
+            lines[entry.metric.expires_line] = (
+                line.rstrip("\n") + " /* TODO <" + str(count) + "> require renewal */\n"
+            )
+        return {filename: "".join(lines) for filename, lines in lines_per_file.items()}
+
+
+def write_expiry_list(metrics, csv_file, glean_dictionary_url):
+    """
+    Writes the expiry list CSV, to be filled out by product, for the given definitions.
+
+    :param glean_dictionary_url: Glean Dictionary URL of the app, ending with a slash.
+    """
+    if not metrics:
+        return
+    writer = csv.writer(csv_file)
+    writer.writerow(["#", "name", "glean dictionary"] + _KEY_FILTER + _PRODUCT_COLUMNS)
+    for count, metric in enumerate(metrics, start=1):
+        if metric.type is None:
+            dictionary_url = glean_dictionary_url + "pings/" + metric.name
+        else:
+            dictionary_url = (
+                glean_dictionary_url + "metrics/" + metric.name.replace(".", "_")
+            )
+        writer.writerow(
+            [count, metric.name, dictionary_url]
+            + [getattr(metric, key) for key in _KEY_FILTER]
+            + [""] * len(_PRODUCT_COLUMNS)
+        )
+
+
+def write_renewal_request(metrics, renewal_file):
+    """Writes the data renewal request template for the given definitions."""
+    if not metrics:
+        return
+    renewal_file.write("# Request for Data Collection Renewal\n")
+    renewal_file.write("### Renew for 1 year\n")
+    renewal_file.write("Total: TBD\n")
+    renewal_file.write("———\n")
+    for metric in metrics:
+        renewal_file.write("`" + metric.name + "`:\n")
+        renewal_file.write(
+            "1) Provide a link to the initial Data Collection Review Request for this collection.\n"
+        )
+        renewal_file.write("    - " + str(metric.data_reviews) + "\n")
+        renewal_file.write("\n")
+        renewal_file.write("2) When will this collection now expire?\n")
+        renewal_file.write("    - TBD\n")
+        renewal_file.write("\n")
+        renewal_file.write("3) Why was the initial period of collection insufficient?\n")
+        renewal_file.write("    - TBD\n")
+        renewal_file.write("\n")
+        renewal_file.write("———\n")
+
+
+def main(args, metrics_filename, pings_filename, glean_dictionary_url):
+    """
+    Writes `<version>_expiry_list.csv` and `<version>_renewal_request.txt` to the current
+    directory for every given version. The metrics and pings to renew for the first
+    version are marked in metrics_filename and pings_filename.
+
+    :param args: Command line arguments, one or more future app version numbers.
+    :param metrics_filename: Path of the app's metrics.yaml.
+    :param pings_filename: Path of the app's pings.yaml.
+    :param glean_dictionary_url: Glean Dictionary URL of the app, ending with a slash.
+    """
+    if not args or not all(arg.isdigit() for arg in args):
+        print("usage is to include arguments of the form `100` [`101` ...]")
+        return
+
+    versions = sorted(set(args), key=int)
+    index = ExpiryIndex.from_files([metrics_filename], [pings_filename])
+
+    previous_version = None
+    for version in versions:
+        metrics = [entry.metric for entry in index.expiring(int(version))]
+        with open(version + "_expiry_list.csv", "w") as csv_file:
+            write_expiry_list(metrics, csv_file, glean_dictionary_url)
+        with open(version + "_renewal_request.txt", "w") as renewal_file:
+            write_renewal_request(metrics, renewal_file)
+
+        summary = "Total count for " + version + ": " + str(len(metrics))
+        if previous_version is not None:
+            newly_expiring = index.expiring(int(version), after=int(previous_version))
+            summary += " (" + str(len(newly_expiring)) + " after " + previous_version + ")"
+        print(summary)
+        previous_version = version
+    print("Completed")
+
+    for filename, text in index.annotated_files(int(versions[0])).items():
+        new_filename = filename + ".new"
+        with open(new_filename, "w") as f:
+            f.write(text)
+        os.replace(new_filename, filename)
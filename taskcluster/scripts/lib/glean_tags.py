@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+This module scrapes the GitHub labels of a repository and generates the glean tags of its
+`Feature:` labels. It is shared by the update-glean-tags.py scripts of Fenix and Focus.
+
+See https://mozilla.github.io/glean/book/reference/yaml/tags.html
+
+Label pages are requested with the ETag GitHub returned for them last time: unchanged
+pages come back as "304 Not Modified" (which does not count against the rate limit) and
+are read from a local cache instead. Once the first page tells, through its `Link` header,
+how many pages there are, the other pages are fetched in parallel. tags.yaml is only
+rewritten when its content changes.
+
+Key Components:
+- LabelsFetcher Class: Fetches every label of a repository.
+- render_tags(labels, repository): The content of tags.yaml for a list of labels.
+- write_if_changed(filename, content): Write a file unless it already has this content.
+- main(repository, tags_filename): Command line entry point.
+
+Environment variables:
+- GITHUB_TOKEN: Authenticates requests, for a higher rate limit.
+- GITHUB_API_URL: Base URL of the API, e.g. a local fake GitHub API in tests.
+- GLEAN_TAGS_CACHE_DIR: Where ETags and label pages are kept between runs.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+from pathlib import Path
+import urllib.parse
+
+import requests
+import yaml
+
+LICENSE_HEADER = """# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+GENERATED_HEADER = """
+### This file was AUTOMATICALLY GENERATED by `./tools/update-glean-tags.py`
+### DO NOT edit it by hand.
+
+# Disable line-length rule because the links in the descriptions can be long
+# yamllint disable rule:line-length
+"""
+
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+CACHE_DIR = Path(
+    os.environ.get(
+        "GLEAN_TAGS_CACHE_DIR",
+        Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "update-glean-tags",
+    )
+)
+PER_PAGE = 100
+MAX_WORKERS = 8
+REQUEST_TIMEOUT = 30
+
+
+class LabelsFetcher:
+    """
+    Fetches every label of a GitHub repository, reusing the pages cached by earlier runs
+    when GitHub reports them unchanged.
+    """
+
+    def __init__(self, repository, api_url=GITHUB_API_URL, token=None, cache_dir=CACHE_DIR):
+        """
+        :param repository: The repository, as "owner/name".
+        :param api_url: Base URL of the GitHub API.
+        :param token: GitHub token, defaults to the GITHUB_TOKEN environment variable.
+        :param cache_dir: Where ETags and pages are cached, or None to disable the cache.
+        """
+        self.url = f"{api_url.rstrip('/')}/repos/{repository}/labels"
+        self.headers = {"Accept": "application/vnd.github+json"}
+        token = token or os.environ.get("GITHUB_TOKEN")
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+
+        self.cache_path = None
+        self.cache = {}
+        if cache_dir is not None:
+            self.cache_path = Path(cache_dir) / (repository.replace("/", "_") + ".json")
+            try:
+                self.cache = json.loads(self.cache_path.read_text())
+            except (FileNotFoundError, ValueError):
+                pass
+        self.not_modified_count = 0
+
+    def fetch(self):
+        """Returns the labels of the repository, in the order of the API."""
+        first_page, last_page = self._get_page(1, with_last_page=True)
+        if last_page is None:
+            # Without a `Link` header to tell the page count, walk until an empty page
+            labels = list(first_page)
+            page = 2
+            while first_page:
+                first_page, _ = self._get_page(page)
+                labels += first_page
+                page += 1
+        else:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                pages = executor.map(
+                    lambda page: self._get_page(page)[0], range(2, last_page + 1)
+                )
+                labels = list(first_page)
+                for page_labels in pages:
+                    labels += page_labels
+
+        self._save_cache()
+        return labels
+
+    def _get_page(self, page, with_last_page=False):
+        """
+        Returns the labels of a page, and the number of the last page if known.
+
+        :param with_last_page: Whether the caller relies on the number of the last page.
+            An unchanged page with several pages after it is then requested again if its
+            304 response comes without a `Link` header.
+        """
+        params = {"per_page": PER_PAGE, "page": page}
+        cache_key = str(page)
+        cached = self.cache.get(cache_key)
+        headers = dict(self.headers)
+        if cached:
+            headers["If-None-Match"] = cached["etag"]
+
+        response = requests.get(
+            self.url, params=params, headers=headers, timeout=REQUEST_TIMEOUT
+        )
+        if response.status_code == 304:
+            last_page = _last_page(response)
+            # The ETag only covers the labels of the page, the page count may have changed
+            # since it was cached. Without a last page, fetch() walks until an empty page.
+            if last_page is not None or not (with_last_page and cached["last_page"]):
+                self.not_modified_count += 1
+                return cached["labels"], last_page
+            del headers["If-None-Match"]
+            response = requests.get(
+                self.url, params=params, headers=headers, timeout=REQUEST_TIMEOUT
+            )
+        response.raise_for_status()
+
+        labels = response.json()
+        last_page = _last_page(response)
+        etag = response.headers.get("ETag")
+        if etag:
+            self.cache[cache_key] = {"etag": etag, "labels": labels, "last_page": last_page}
+        else:
+            self.cache.pop(cache_key, None)
+        return labels, last_page
+
+    def _save_cache(self):
+        if self.cache_path is None:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.cache))
+        os.replace(tmp_path, self.cache_path)
+
+
+def _last_page(response):
+    last = response.links.get("last")
+    if last is None:
+        # The last page links back to the first one only
+        return 1 if "prev" in response.links else None
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(last["url"]).query)
+    return int(query["page"][0])
+
+
+def render_tags(labels, repository):
+    """Returns the content of tags.yaml for the `Feature:` labels of a repository."""
+    tags = {"$schema": "moz://mozilla.org/schemas/glean/tags/1-0-0"}
+    for label in labels:
+        if label["name"].startswith("Feature:"):
+            abbreviated_label = label["name"].replace("Feature:", "")
+            url = f"https://github.com/{repository}/issues?q=" + urllib.parse.quote_plus(
+                f"label:{label['name']}"
+            )
+            description = label["description"] or ""
+            label_description = (description.strip() + ". ") if len(description) else ""
+            tags[abbreviated_label] = {
+                "description": f"{label_description}Corresponds to the [{label['name']}]({url}) label on GitHub."
+            }
+
+    return "{}\n{}\n\n".format(LICENSE_HEADER, GENERATED_HEADER) + yaml.dump(
+        tags, width=78, explicit_start=True
+    )
+
+
+def write_if_changed(filename, content):
+    """Writes content to filename unless the file already has it. Returns whether it wrote."""
+    try:
+        with open(filename, "r") as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(filename, "w") as f:
+        f.write(content)
+    return True
+
+
+def main(repository, tags_filename):
+    """
+    Updates tags_filename from the labels of repository.
+
+    :param repository: The GitHub repository, as "owner/name".
+    :param tags_filename: Path of the app's tags.yaml.
+    """
+    fetcher = LabelsFetcher(repository)
+    labels = fetcher.fetch()
+    if write_if_changed(tags_filename, render_tags(labels, repository)):
+        print(f"Updated {tags_filename} from {len(labels)} labels")
+    else:
+        print(f"{tags_filename} is up to date ({len(labels)} labels)")
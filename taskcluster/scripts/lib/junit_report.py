@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+This module streams the JUnit XML reports written by Flank (FullJUnitReport.xml), either
+yielding only the test cases worth reporting (failures, and every case carrying a result
+in suites that reported flakes) or a summary of every test case.
+
+The report is read with `xml.etree.ElementTree.iterparse`. Each `<testcase>` element is
+dropped as soon as it has been inspected, so memory use does not grow with the size of
+the report.
+
+Functions:
+- iter_failure_results(source): Yields a (test name, outcome, details) tuple for every
+  failing or flaky test case in a JUnit XML report.
+- iter_test_results(source): Yields a TestResult for every test case in a JUnit XML report.
+- report_timestamp(source): Returns the `timestamp` of the first test suite of a report.
+"""
+
+from collections import namedtuple
+import xml.etree.ElementTree as ET
+
+# Child elements of a <testcase> that junitparser treats as results
+RESULT_TAGS = ("failure", "error", "skipped")
+
+TestResult = namedtuple("TestResult", ["test", "device", "outcome", "duration"])
+
+
+def iter_failure_results(source):
+    """
+    Yields the failing and flaky test cases of a JUnit XML report.
+
+    In a suite whose `flakes` attribute is not "0" (or is missing), every test case with
+    a result is reported as "Flaky"; in other suites only test cases with a `<failure>`
+    are reported, as "Failure".
+
+    :param source: Path or binary file object of the JUnit XML report.
+    :return: Iterator of ("classname#name", outcome, details) tuples.
+    :raises xml.etree.ElementTree.ParseError: If the report is not well-formed.
+    """
+    for suite, testcase in _iter_testcases(source):
+        # Like junitparser, a suite without a `flakes` attribute counts as flaky
+        suite_is_flaky = suite.get("flakes") != "0"
+        result = _first_result(testcase, suite_is_flaky)
+        if result is not None:
+            outcome = "Flaky" if suite_is_flaky else "Failure"
+            details = (result.text or "").replace("\t", " ")
+            yield (_test_name(testcase), outcome, details)
+
+
+def iter_test_results(source):
+    """
+    Yields a summary of every test case of a JUnit XML report.
+
+    The outcome is "flaky" for test cases Flank marked with `flaky="true"`, the tag of the
+    first result element ("failure", "error" or "skipped") otherwise, and "passed" for
+    test cases without a result.
+
+    :param source: Path or binary file object of the JUnit XML report.
+    :return: Iterator of TestResult tuples; `device` is the name of the test suite.
+    :raises xml.etree.ElementTree.ParseError: If the report is not well-formed.
+    """
+    for suite, testcase in _iter_testcases(source):
+        if testcase.get("flaky") == "true":
+            outcome = "flaky"
+        else:
+            result = next(
+                (child for child in testcase if child.tag in RESULT_TAGS), None
+            )
+            outcome = result.tag if result is not None else "passed"
+        try:
+            duration = float(testcase.get("time", 0))
+        except ValueError:
+            duration = 0.0
+        yield TestResult(_test_name(testcase), suite.get("name"), outcome, duration)
+
+
+def report_timestamp(source):
+    """
+    Returns when the first test suite of a JUnit XML report started.
+
+    Only the report up to the first `<testsuite>` element is read.
+
+    :param source: Path or binary file object of the JUnit XML report.
+    :return: The suite's `timestamp` attribute, e.g. "2024-06-17T10:15:02", or None.
+    :raises xml.etree.ElementTree.ParseError: If the report is not well-formed.
+    """
+    for _, elem in ET.iterparse(source, events=("start",)):
+        if elem.tag == "testsuite":
+            return elem.get("timestamp")
+    return None
+
+
+def _iter_testcases(source):
+    """Yields (testsuite attributes, testcase element) pairs, discarding each case afterwards."""
+    stack = []
+    suite = {}
+
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if elem.tag == "testsuite":
+                suite = dict(elem.attrib)
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        if elem.tag == "testcase":
+            yield suite, elem
+            _discard(elem, stack)
+        elif elem.tag == "testsuite":
+            _discard(elem, stack)
+
+
+def _test_name(testcase):
+    return "%s#%s" % (testcase.get("classname"), testcase.get("name"))
+
+
+def _first_result(testcase, suite_is_flaky):
+    for child in testcase:
+        if child.tag == "failure" or (suite_is_flaky and child.tag in RESULT_TAGS):
+            return child
+    return None
+
+
+def _discard(elem, stack):
+    elem.clear()
+    # Processed children are always the first remaining ones, so removal is cheap
+    if stack:
+        stack[-1].remove(elem)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+This module plans Flank UI test shards from the durations recorded in earlier JUnit
+reports, so that the slowest shard (and with it the wall-clock time of the whole run) is
+as short as possible.
+
+Tests are grouped by class. Classes are assigned to shards with the longest processing
+time first heuristic: heaviest class first, always onto the currently lightest shard.
+A class that alone takes longer than an evenly balanced shard is split into its methods.
+
+Only the tests selected by the `test-targets` of the Flank configuration are planned:
+its `class` and `package` targets select tests, `notClass` and `notPackage` targets
+exclude them. Tests selected by method (`class a.b.C#method`) stay method targets, so
+that a plan never runs more of a class than the configuration does.
+
+The plan is written as a copy of a Flank configuration with `test-targets-for-shard` set.
+One extra shard runs every selected test not covered by the plan (new tests, or tests
+missing from the reports), so a stale history does not drop tests from a run. It is left
+out when the configuration selects classes or methods that are all planned.
+
+Functions:
+- load_durations(report_paths): Mean duration of every test method over JUnit reports.
+- read_test_targets(config_path): The `test-targets` of a Flank configuration.
+- select_tests(durations, test_targets): The tests of durations selected by test targets.
+- plan_shards(durations, shard_count, method_tests): Balance test targets over
+  shard_count shards.
+- shard_count_for_config(config_path): Number of shards to plan for a Flank configuration.
+- write_flank_config(base_config_path, shards, output_path): Write a Flank config running
+  the planned shards.
+"""
+
+from collections import defaultdict
+import heapq
+import os
+import sys
+
+import yaml
+
+# Ensure the directory containing this script is in Python's search path
+script_directory = os.path.dirname(os.path.abspath(__file__))
+if script_directory not in sys.path:
+    sys.path.append(script_directory)
+
+from junit_report import iter_test_results
+
+# Firebase Test Lab accepts at most 50 shards when physical devices are used
+MAX_SHARDS = 50
+# Kinds of test targets selecting tests, and excluding them
+SELECTING_TARGETS = ("class", "package")
+EXCLUDING_TARGETS = ("notClass", "notPackage")
+
+
+def load_durations(report_paths):
+    """
+    Returns the mean duration of every test method over the given JUnit reports.
+
+    :param report_paths: Paths of FullJUnitReport.xml files from earlier runs.
+    :return: A dict mapping "classname#name" to its mean duration in seconds.
+    """
+    totals = defaultdict(float)
+    counts = defaultdict(int)
+    for report_path in report_paths:
+        for result in iter_test_results(report_path):
+            if result.outcome == "skipped":
+                continue
+            totals[result.test] += result.duration
+            counts[result.test] += 1
+    return {test: totals[test] / counts[test] for test in totals}
+
+
+def read_test_targets(config_path):
+    """Returns the `test-targets` of a Flank configuration."""
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    return list(config["gcloud"].get("test-targets") or [])
+
+
+def select_tests(durations, test_targets):
+    """
+    Returns the tests of durations that Flank would run with test_targets.
+
+    Targets other than `class`, `package`, `notClass` and `notPackage` (e.g.
+    `annotation`) cannot be evaluated without the test APK; they are ignored here and
+    carried over to every shard by write_flank_config.
+
+    :param durations: A dict mapping "classname#name" to its duration in seconds.
+    :param test_targets: The `test-targets` of a Flank configuration.
+    :return: The selected items of durations as a dict, and the set of selected tests
+        that are only selected by method.
+    """
+    selecting = []
+    excluding = []
+    for kind, values in map(_parse_target, test_targets):
+        if kind in SELECTING_TARGETS:
+            selecting.extend((kind, value) for value in values)
+        elif kind in EXCLUDING_TARGETS:
+            excluding.extend((kind, value) for value in values)
+
+    selected = {}
+    method_tests = set()
+    for test, duration in durations.items():
+        if any(_matches(kind, value, test) for kind, value in excluding):
+            continue
+        if selecting:
+            matching = [value for kind, value in selecting if _matches(kind, value, test)]
+            if not matching:
+                continue
+            if all("#" in value for value in matching):
+                method_tests.add(test)
+        selected[test] = duration
+    return selected, method_tests
+
+
+def _parse_target(target):
+    """Returns the kind of a test target and its comma separated values."""
+    kind, _, values = target.strip().partition(" ")
+    return kind, [value.strip() for value in values.split(",") if value.strip()]
+
+
+def _matches(kind, value, test):
+    classname = test.split("#", 1)[0]
+    if kind in ("class", "notClass"):
+        return test == value if "#" in value else classname == value
+    # Packages include their subpackages
+    return classname.startswith(value + ".")
+
+
+def plan_shards(durations, shard_count, method_tests=()):
+    """
+    Balances test targets over shard_count shards.
+
+    :param durations: A dict mapping "classname#name" to its expected duration in seconds.
+    :param shard_count: Number of shards to plan.
+    :param method_tests: Tests that must be planned as method targets, never as part of
+        their class, e.g. those select_tests found to be selected by method.
+    :return: A list of (expected duration, sorted list of test targets) tuples, longest
+        first. Targets are class names, or "classname#name" for methods of split classes
+        and method_tests.
+    """
+    class_durations = defaultdict(float)
+    methods_per_class = defaultdict(dict)
+    targets = []
+    for test, duration in durations.items():
+        if test in method_tests:
+            targets.append((test, duration))
+            continue
+        classname = test.split("#", 1)[0]
+        class_durations[classname] += duration
+        methods_per_class[classname][test] = duration
+
+    shard_count = max(1, min(shard_count, len(durations)))
+    balanced_duration = sum(durations.values()) / shard_count
+
+    for classname, duration in class_durations.items():
+        if duration > balanced_duration and len(methods_per_class[classname]) > 1:
+            targets.extend(methods_per_class[classname].items())
+        else:
+            targets.append((classname, duration))
+    # Ties are broken by name so that the same history always produces the same plan
+    targets.sort(key=lambda target: (-target[1], target[0]))
+
+    shards = [(0.0, index, []) for index in range(shard_count)]
+    heapq.heapify(shards)
+    for target, duration in targets:
+        shard_duration, index, shard_targets = heapq.heappop(shards)
+        shard_targets.append(target)
+        heapq.heappush(shards, (shard_duration + duration, index, shard_targets))
+
+    return sorted(
+        ((duration, sorted(shard_targets)) for duration, _, shard_targets in shards),
+        key=lambda shard: (-shard[0], shard[1]),
+    )
+
+
+def shard_count_for_config(config_path):
+    """Returns the number of shards to plan for a Flank configuration, keeping one for unplanned tests."""
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    max_test_shards = (config.get("flank") or {}).get("max-test-shards", MAX_SHARDS)
+    return max(1, min(max_test_shards, MAX_SHARDS) - 1)
+
+
+def write_flank_config(base_config_path, shards, output_path):
+    """
+    Writes a copy of a Flank configuration running the planned shards.
+
+    `test-targets` is ignored by Flank once `test-targets-for-shard` is set. Its targets
+    other than `class` and `package` are carried over to every shard, and an extra shard
+    runs the tests it selects that are, or may be, left out of the plan.
+
+    :param base_config_path: The Flank configuration to start from.
+    :param shards: Shards as returned by plan_shards for the tests selected by the
+        configuration.
+    :param output_path: Where to write the generated configuration.
+    """
+    with open(base_config_path) as f:
+        config = yaml.safe_load(f)
+
+    gcloud = config["gcloud"]
+    test_targets = list(gcloud.pop("test-targets", None) or [])
+    filters = [
+        target
+        for target in test_targets
+        if _parse_target(target)[0] not in SELECTING_TARGETS
+    ]
+    planned_targets = sorted(target for _, targets in shards for target in targets)
+
+    gcloud["test-targets-for-shard"] = [
+        ";".join(["class " + ",".join(targets)] + filters)
+        for _, targets in shards
+        if targets
+    ]
+    remaining = _remaining_targets(test_targets, filters, planned_targets)
+    if remaining:
+        gcloud["test-targets-for-shard"].append(remaining)
+    config.setdefault("flank", {})["max-test-shards"] = len(
+        gcloud["test-targets-for-shard"]
+    )
+
+    with open(output_path, "w") as f:
+        yaml.safe_dump(config, f, sort_keys=False, width=float("inf"))
+
+
+def _remaining_targets(test_targets, filters, planned_targets):
+    """
+    Returns the targets of the shard running the selected tests left out of the plan, or
+    None when the plan is known to cover them all.
+
+    That is only known when tests are selected by class or method: a package, or a
+    configuration without selecting targets, may hold tests missing from the history.
+    """
+    selected = [
+        (kind, value)
+        for kind, values in map(_parse_target, test_targets)
+        if kind in SELECTING_TARGETS
+        for value in values
+    ]
+    if not selected or any(kind != "class" for kind, _ in selected):
+        return ";".join(test_targets + ["notClass " + ",".join(planned_targets)])
+
+    planned = set(planned_targets)
+    missing = [
+        value
+        for value in dict.fromkeys(value for _, value in selected)
+        if value not in planned and value.split("#", 1)[0] not in planned
+    ]
+    if not missing:
+        return None
+    # Methods of missing classes may be planned on their own, when a class was split
+    missing_classes = {value for value in missing if "#" not in value}
+    planned_methods = [
+        target
+        for target in planned_targets
+        if target.split("#", 1)[0] in missing_classes and "#" in target
+    ]
+    excluded = ["notClass " + ",".join(planned_methods)] if planned_methods else []
+    return ";".join(["class " + ",".join(missing)] + filters + excluded)
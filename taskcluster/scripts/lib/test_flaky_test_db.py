@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from flaky_test_db import FlakyTestDatabase
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+
+HISTORY_TEST = "org.mozilla.fenix.ui.HistoryTest#deleteAllHistoryTest"
+SEARCH_TEST = "org.mozilla.fenix.ui.SettingsSearchTest#verifySearchEngineCanBeDeletedTest"
+
+
+class FlakyTestDatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.database = FlakyTestDatabase(os.path.join(self.directory.name, "db.sqlite"))
+        self.addCleanup(self.database.close)
+        self.run_count = 0
+
+    def results_dir(self, testcases=None, timestamp=None):
+        """Writes a Flank results directory, with the fixture report by default."""
+        self.run_count += 1
+        results_dir = os.path.join(self.directory.name, f"results-{self.run_count}")
+        os.mkdir(results_dir)
+        report_path = os.path.join(results_dir, "FullJUnitReport.xml")
+        if testcases is None:
+            shutil.copy(os.path.join(FIXTURES_DIR, "FullJUnitReport.xml"), report_path)
+        else:
+            with open(report_path, "w") as f:
+                f.write(
+                    '<testsuites><testsuite name="Pixel2.arm-30-en_US-portrait"'
+                    + (f' timestamp="{timestamp}">' if timestamp else ">")
+                    + "".join(testcases)
+                    + "</testsuite></testsuites>"
+                )
+        matrix_id = f"matrix-{self.run_count:013d}"
+        with open(os.path.join(results_dir, "matrix_ids.json"), "w") as f:
+            json.dump(
+                {
+                    matrix_id: {
+                        "matrixId": matrix_id,
+                        "outcome": "success",
+                        "webLink": f"https://example.com/{matrix_id}",
+                        "axes": [],
+                    }
+                },
+                f,
+            )
+        return results_dir
+
+    def ingest(self, *outcomes, test=HISTORY_TEST, duration=10.0, timestamp=None):
+        """Records a run of `test`, with one result per outcome (e.g. one per attempt)."""
+        classname, name = test.split("#")
+        results = {
+            "passed": "",
+            "flaky": "<failure>flaky</failure>",
+            "failure": "<failure>failed</failure>",
+        }
+        testcases = [
+            f'<testcase name="{name}" classname="{classname}" time="{duration}"'
+            + (' flaky="true">' if outcome == "flaky" else ">")
+            + results[outcome]
+            + "</testcase>"
+            for outcome in outcomes
+        ]
+        return self.database.ingest_results_dir(self.results_dir(testcases, timestamp))
+
+    def test_ingest(self):
+        results_dir = self.results_dir()
+        run_id = self.database.ingest_results_dir(results_dir)
+
+        self.assertIsNotNone(run_id)
+        stats = {stats.test: stats for stats in self.database.test_stats()}
+        self.assertEqual(len(stats), 17)
+        self.assertEqual(stats[HISTORY_TEST].runs, 1)
+        self.assertEqual(stats[HISTORY_TEST].mean_duration, 58.007)
+        flaky = stats[
+            "org.mozilla.fenix.ui.SettingsSearchTest#verifyShowSearchSuggestionsToggleTest"
+        ]
+        self.assertEqual((flaky.flake_rate, flaky.failure_rate), (1, 0))
+        failed = stats["org.mozilla.fenix.ui.BookmarksTest#deleteBookmarkFoldersTest"]
+        self.assertEqual((failed.flake_rate, failed.failure_rate), (0, 1))
+
+    def test_ingest_same_run_twice(self):
+        results_dir = self.results_dir()
+        self.assertIsNotNone(self.database.ingest_results_dir(results_dir))
+        self.assertIsNone(self.database.ingest_results_dir(results_dir))
+        self.assertEqual(self.database.test_stats(HISTORY_TEST)[0].runs, 1)
+
+    def test_rates_are_per_run(self):
+        # Three attempts in the first run must not outweigh the two clean runs
+        self.ingest("failure", "failure", "flaky")
+        self.ingest("passed")
+        self.ingest("passed")
+
+        (stats,) = self.database.test_stats(HISTORY_TEST)
+        self.assertEqual(stats.runs, 3)
+        self.assertAlmostEqual(stats.flake_rate, 1 / 3)
+        self.assertAlmostEqual(stats.failure_rate, 1 / 3)
+
+    def test_test_stats_min_runs(self):
+        self.ingest("passed")
+        self.ingest("passed")
+        self.ingest("passed", test=SEARCH_TEST)
+
+        self.assertEqual(
+            [stats.test for stats in self.database.test_stats(min_runs=2)], [HISTORY_TEST]
+        )
+
+    def test_failure_streak(self):
+        self.assertEqual(self.database.failure_streak(HISTORY_TEST), 0)
+        self.ingest("failure")
+        self.ingest("passed")
+        self.ingest("failure")
+        self.ingest("passed", "flaky")
+        self.assertEqual(self.database.failure_streak(HISTORY_TEST), 2)
+        self.ingest("passed")
+        self.assertEqual(self.database.failure_streak(HISTORY_TEST), 0)
+
+    def test_failure_streak_follows_run_start_times(self):
+        # Artifacts downloaded out of order
+        self.ingest("failure", timestamp="2024-06-17T10:00:00")
+        self.ingest("failure", timestamp="2024-06-17T12:00:00")
+        self.ingest("passed", timestamp="2024-06-17T11:00:00")
+        self.assertEqual(self.database.failure_streak(HISTORY_TEST), 1)
+        self.ingest("failure", timestamp="2024-06-17T09:00:00")
+        self.assertEqual(self.database.failure_streak(HISTORY_TEST), 1)
+
+    def test_failure_streak_ignores_runs_without_the_test(self):
+        self.ingest("failure")
+        self.ingest("passed", test=SEARCH_TEST)
+        self.assertEqual(self.database.failure_streak(HISTORY_TEST), 1)
+
+    def test_database_without_start_times(self):
+        path = os.path.join(self.directory.name, "old.sqlite")
+        connection = sqlite3.connect(path)
+        connection.execute(
+            "CREATE TABLE runs (id INTEGER PRIMARY KEY,"
+            " run_key TEXT NOT NULL UNIQUE, ingested_at REAL NOT NULL)"
+        )
+        connection.execute(
+            "INSERT INTO runs (run_key, ingested_at) VALUES ('matrix-old', 0)"
+        )
+        connection.commit()
+        connection.close()
+
+        self.database = FlakyTestDatabase(path)
+        self.addCleanup(self.database.close)
+        self.database.connection.execute(
+            "INSERT INTO results VALUES (1, ?, NULL, 'failure', 1.0)", (HISTORY_TEST,)
+        )
+        self.ingest("passed", timestamp="2024-06-17T10:00:00")
+        # The older run is ordered by the time it was ingested
+        self.assertEqual(self.database.failure_streak(HISTORY_TEST), 0)
+
+    def test_quarantine_candidates(self):
+        for outcome in ("flaky", "passed", "passed", "passed"):
+            self.ingest(outcome)
+            self.ingest("flaky" if outcome == "passed" else "passed", test=SEARCH_TEST)
+        self.ingest("flaky", test="org.mozilla.fenix.ui.HistoryTest#rarelyRunTest")
+
+        candidates = self.database.quarantine_candidates(threshold=0.5, min_runs=2)
+        self.assertEqual([stats.test for stats in candidates], [SEARCH_TEST])
+        self.assertEqual(candidates[0].flake_rate, 0.75)
+        candidates = self.database.quarantine_candidates(threshold=0.2, min_runs=2)
+        self.assertEqual(
+            [stats.test for stats in candidates], [HISTORY_TEST, SEARCH_TEST]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import unittest
+
+import yaml
+
+from glean_data_renewal import ExpiryIndex, load_metrics, load_pings
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "..")
+FENIX_METRICS = os.path.join(PROJECT_DIR, "fenix", "app", "metrics.yaml")
+FENIX_PINGS = os.path.join(PROJECT_DIR, "fenix", "app", "pings.yaml")
+
+ALIASED_METRICS = """\
+search:
+  sponsored_suggestion_clicked:
+    type: event
+    description: A sponsored suggestion was clicked.
+    bugs: &bugs
+      - https://bugzilla.mozilla.org/show_bug.cgi?id=1871156
+    expires: &expires 125
+    extra_keys:
+      provider: &provider
+        description: The provider of the suggestion.
+        type: string
+  sponsored_suggestion_impressed:
+    type: event
+    description: A sponsored suggestion was visible.
+    bugs: *bugs
+    expires: *expires
+    extra_keys:
+      provider: *provider
+    data_reviews:
+      - https://github.com/mozilla-mobile/firefox-android/pull/4914
+"""
+
+
+def first(value):
+    return value[0] if isinstance(value, list) else value
+
+
+class LoadMetricsTestCase(unittest.TestCase):
+    def test_aliases_are_resolved(self):
+        clicked, impressed = load_metrics(ALIASED_METRICS)
+
+        self.assertEqual(impressed.name, "search.sponsored_suggestion_impressed")
+        self.assertEqual(impressed.bugs, clicked.bugs)
+        self.assertEqual(impressed.expires, 125)
+        # The keys following aliased values still belong to the metric
+        self.assertEqual(
+            impressed.data_reviews,
+            "https://github.com/mozilla-mobile/firefox-android/pull/4914",
+        )
+        # The value to renew is where the anchor is
+        self.assertEqual(impressed.expires_line, clicked.expires_line)
+        self.assertEqual(impressed.expires_line, 6)
+
+    def test_undefined_alias(self):
+        with self.assertRaisesRegex(yaml.YAMLError, "undefined alias 'expires'"):
+            load_metrics("search:\n  clicked:\n    type: event\n    expires: *expires\n")
+
+    def test_recursive_alias(self):
+        with self.assertRaisesRegex(yaml.YAMLError, "recursive anchor 'bugs'"):
+            load_metrics("search:\n  clicked:\n    bugs: &bugs [*bugs]\n")
+
+    def test_merge_keys_are_rejected(self):
+        with self.assertRaisesRegex(yaml.YAMLError, "merge keys are not supported"):
+            load_metrics(
+                "search:\n  clicked: &clicked\n    type: event\n"
+                "  impressed:\n    <<: *clicked\n"
+            )
+
+    def test_fenix_metrics_match_yaml_loader(self):
+        with open(FENIX_METRICS) as f:
+            text = f.read()
+        expected = [
+            (
+                f"{category}.{name}",
+                metric["type"],
+                first(metric.get("bugs")),
+                metric.get("expires"),
+            )
+            for category, metrics in yaml.safe_load(text).items()
+            if not category.startswith("$") and category != "no_lint"
+            for name, metric in metrics.items()
+        ]
+        self.assertEqual(
+            [
+                (metric.name, metric.type, metric.bugs, metric.expires)
+                for metric in load_metrics(text)
+            ],
+            expected,
+        )
+
+    def test_fenix_pings(self):
+        with open(FENIX_PINGS) as f:
+            text = f.read()
+        expected = [
+            name
+            for name in yaml.safe_load(text)
+            if not name.startswith("$") and name != "no_lint"
+        ]
+        self.assertEqual([ping.name for ping in load_pings(text)], expected)
+
+
+class ExpiryIndexTestCase(unittest.TestCase):
+    def test_annotated_files(self):
+        index = ExpiryIndex(
+            [("metrics.yaml", metric) for metric in load_metrics(ALIASED_METRICS)],
+            {"metrics.yaml": ALIASED_METRICS},
+        )
+        self.assertEqual(len(index.expiring(125)), 2)
+        self.assertEqual(index.expiring(124), [])
+
+        lines = index.annotated_files(125)["metrics.yaml"].splitlines()
+        self.assertEqual(
+            lines[6],
+            "    expires: &expires 125"
+            " /* TODO <1> require renewal */ /* TODO <2> require renewal */",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
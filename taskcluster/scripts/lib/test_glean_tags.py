@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import tempfile
+import threading
+import unittest
+import urllib.parse
+
+import glean_tags
+
+REPOSITORY = "mozilla-mobile/firefox-android"
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    """Serves `/repos/<repository>/labels` pages, with ETags and `Link` headers."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        per_page = int(query["per_page"][0])
+        page = int(query["page"][0])
+
+        labels = self.server.labels
+        last_page = max(1, -(-len(labels) // per_page))
+        payload = json.dumps(labels[(page - 1) * per_page : page * per_page]).encode()
+        etag = '"%s"' % hashlib.sha256(payload).hexdigest()
+        self.server.requests.append((page, self.headers.get("If-None-Match")))
+
+        not_modified = self.headers.get("If-None-Match") == etag
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", etag)
+        if not (not_modified and self.server.omit_link_on_304):
+            links = []
+            if page < last_page:
+                links.append(("next", page + 1))
+                links.append(("last", last_page))
+            if page > 1:
+                links.append(("prev", page - 1))
+                links.append(("first", 1))
+            if links:
+                base_url = f"http://{self.headers['Host']}{url.path}?per_page={per_page}"
+                self.send_header(
+                    "Link",
+                    ", ".join(f'<{base_url}&page={n}>; rel="{rel}"' for rel, n in links),
+                )
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def label(number):
+    return {"name": f"Feature:Label{number:03d}", "description": f"Label {number}"}
+
+
+class LabelsFetcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGitHubHandler)
+        self.server.labels = [label(number) for number in range(250)]
+        self.server.requests = []
+        self.server.omit_link_on_304 = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+
+    def fetch(self):
+        """Fetches the labels like a new run would, returning them and the fetcher."""
+        self.server.requests = []
+        fetcher = glean_tags.LabelsFetcher(
+            REPOSITORY,
+            api_url=f"http://127.0.0.1:{self.server.server_port}",
+            token="token",
+            cache_dir=self.cache_dir,
+        )
+        return fetcher.fetch(), fetcher
+
+    def test_fetch(self):
+        labels, fetcher = self.fetch()
+        self.assertEqual(labels, self.server.labels)
+        self.assertEqual(fetcher.not_modified_count, 0)
+        self.assertEqual(sorted(page for page, _ in self.server.requests), [1, 2, 3])
+
+    def test_unchanged_pages_come_from_the_cache(self):
+        self.fetch()
+        labels, fetcher = self.fetch()
+        self.assertEqual(labels, self.server.labels)
+        self.assertEqual(fetcher.not_modified_count, 3)
+
+    def test_new_page_without_link_on_304(self):
+        self.server.omit_link_on_304 = True
+        self.fetch()
+        # The first page does not change, but a new page shows up
+        self.server.labels += [label(number) for number in range(250, 320)]
+
+        labels, fetcher = self.fetch()
+        self.assertEqual(labels, self.server.labels)
+        # The first page was asked again without its ETag, to learn the page count
+        (first_page, etag), second_request = self.server.requests[:2]
+        self.assertEqual((first_page, second_request), (1, (1, None)))
+        self.assertIsNotNone(etag)
+        # Only the second page is unchanged
+        self.assertEqual(fetcher.not_modified_count, 1)
+
+    def test_single_page_without_link_on_304(self):
+        self.server.omit_link_on_304 = True
+        self.server.labels = self.server.labels[:10]
+        self.fetch()
+
+        labels, fetcher = self.fetch()
+        self.assertEqual(labels, self.server.labels)
+        # Walked until the empty second page, without asking for the first one again
+        self.assertEqual([page for page, _ in self.server.requests], [1, 2])
+        self.assertEqual(fetcher.not_modified_count, 2)
+
+
+class RenderTagsTestCase(unittest.TestCase):
+    def test_render_tags(self):
+        content = glean_tags.render_tags(
+            [
+                {"name": "Feature:Autofill", "description": "Address and card autofill"},
+                {"name": "Feature:Search", "description": None},
+                {"name": "P1", "description": "Priority"},
+            ],
+            REPOSITORY,
+        )
+        self.assertIn(
+            "Autofill:\n  description: Address and card autofill. Corresponds to the"
+            " [Feature:Autofill]",
+            content,
+        )
+        self.assertIn("Search:\n  description: Corresponds to the [Feature:Search]", content)
+        self.assertNotIn("P1", content)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import io
+import os
+import unittest
+
+from junit_report import iter_failure_results, iter_test_results, report_timestamp
+
+FULL_JUNIT_REPORT = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "fixtures", "FullJUnitReport.xml"
+)
+
+
+def report(suite_attributes):
+    return io.BytesIO(
+        f"""<?xml version='1.0' encoding='UTF-8' ?>
+<testsuites>
+  <testsuite name="Pixel2.arm-30-en_US-portrait" {suite_attributes}>
+    <testcase name="passingTest" classname="org.mozilla.fenix.ui.HistoryTest" time="1.0"/>
+    <testcase name="failingTest" classname="org.mozilla.fenix.ui.HistoryTest" time="1.0">
+      <failure>AssertionError</failure>
+    </testcase>
+    <testcase name="erroringTest" classname="org.mozilla.fenix.ui.HistoryTest" time="1.0">
+      <error>RuntimeException</error>
+    </testcase>
+  </testsuite>
+</testsuites>
+""".encode()
+    )
+
+
+class IterFailureResultsTestCase(unittest.TestCase):
+    def test_full_junit_report(self):
+        results = [
+            (test, outcome, details.splitlines()[0])
+            for test, outcome, details in iter_failure_results(FULL_JUNIT_REPORT)
+        ]
+        self.assertEqual(
+            results,
+            [
+                (
+                    "org.mozilla.fenix.ui.SettingsSearchTest#verifyShowSearchSuggestionsToggleTest",
+                    "Flaky",
+                    "androidx.test.uiautomator.UiObjectNotFoundException: UiSelector[RESOURCE_ID=org.mozilla.fenix.debug:id/awesome_bar]",
+                ),
+                (
+                    "org.mozilla.fenix.ui.BookmarksTest#deleteBookmarkFoldersTest",
+                    "Failure",
+                    'java.lang.AssertionError: Assertion failed: bookmark folder "My Folder" still displayed',
+                ),
+            ],
+        )
+
+    def test_details_tabs_are_replaced(self):
+        details = [details for _, _, details in iter_failure_results(FULL_JUNIT_REPORT)]
+        self.assertTrue(all("\t" not in detail for detail in details))
+
+    def test_suite_without_flakes(self):
+        self.assertEqual(
+            [(test, outcome) for test, outcome, _ in iter_failure_results(report('flakes="0"'))],
+            [("org.mozilla.fenix.ui.HistoryTest#failingTest", "Failure")],
+        )
+
+    def test_suite_with_flakes(self):
+        self.assertEqual(
+            [(test, outcome) for test, outcome, _ in iter_failure_results(report('flakes="1"'))],
+            [
+                ("org.mozilla.fenix.ui.HistoryTest#failingTest", "Flaky"),
+                ("org.mozilla.fenix.ui.HistoryTest#erroringTest", "Flaky"),
+            ],
+        )
+
+    def test_suite_missing_flakes_attribute_is_flaky(self):
+        # junitparser reads a missing attribute as None, which is not "0"
+        self.assertEqual(
+            [outcome for _, outcome, _ in iter_failure_results(report('tests="3"'))],
+            ["Flaky", "Flaky"],
+        )
+
+
+class IterTestResultsTestCase(unittest.TestCase):
+    def test_full_junit_report(self):
+        results = {result.test: result for result in iter_test_results(FULL_JUNIT_REPORT)}
+        self.assertEqual(len(results), 17)
+
+        flaky = results[
+            "org.mozilla.fenix.ui.SettingsSearchTest#verifyShowSearchSuggestionsToggleTest"
+        ]
+        self.assertEqual(flaky.outcome, "flaky")
+        self.assertEqual(flaky.device, "Pixel2.arm-30-en_US-portrait")
+        self.assertEqual(flaky.duration, 35.921)
+        self.assertEqual(
+            results["org.mozilla.fenix.ui.BookmarksTest#deleteBookmarkFoldersTest"].outcome,
+            "failure",
+        )
+        self.assertEqual(
+            results["org.mozilla.fenix.ui.BookmarksTest#openAllInTabsTest"].outcome,
+            "skipped",
+        )
+        self.assertEqual(
+            results["org.mozilla.fenix.ui.HistoryTest#deleteAllHistoryTest"].outcome,
+            "passed",
+        )
+
+
+class ReportTimestampTestCase(unittest.TestCase):
+    def test_report_timestamp(self):
+        self.assertEqual(report_timestamp(FULL_JUNIT_REPORT), "2024-06-17T10:15:02")
+        self.assertIsNone(report_timestamp(report('flakes="0"')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import tempfile
+import unittest
+
+import yaml
+
+import shard_planner
+
+LIB_DIR = os.path.dirname(os.path.realpath(__file__))
+FULL_JUNIT_REPORT = os.path.join(LIB_DIR, "fixtures", "FullJUnitReport.xml")
+FENIX_ANDROID_TEST = os.path.join(
+    LIB_DIR, "..", "..", "..", "fenix", "automation", "taskcluster", "androidTest"
+)
+
+
+def shard_tests(shard, tests):
+    """Returns the tests a `test-targets-for-shard` entry runs, out of `tests`.
+
+    Every `;` separated target must accept a test. Within a target, any of the comma
+    separated values may.
+    """
+
+    def matches(value, test):
+        classname = test.split("#")[0]
+        return test == value or classname == value or classname.startswith(value + ".")
+
+    def accepts(target, test):
+        kind, values = target.split(" ", 1)
+        matching = any(matches(value, test) for value in values.split(","))
+        return not matching if kind.startswith("not") else matching
+
+    return {
+        test
+        for test in tests
+        if all(accepts(target, test) for target in shard.split(";"))
+    }
+
+
+class ShardPlannerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.durations = shard_planner.load_durations([FULL_JUNIT_REPORT])
+
+    def plan(self, config_name):
+        """Plans shards like test-lab.py does, returning the generated configuration."""
+        return self.plan_config(
+            os.path.join(FENIX_ANDROID_TEST, f"flank-{config_name}.yml")
+        )
+
+    def plan_targets(self, test_targets, shard_count):
+        """Plans shards for a copy of a Fenix configuration running test_targets."""
+        with open(os.path.join(FENIX_ANDROID_TEST, "flank-arm-start-test.yml")) as f:
+            config = yaml.safe_load(f)
+        config["gcloud"]["test-targets"] = test_targets
+        config["flank"]["max-test-shards"] = shard_count
+        base_config_path = os.path.join(self.directory.name, "flank-base.yml")
+        with open(base_config_path, "w") as f:
+            yaml.safe_dump(config, f)
+        return self.plan_config(base_config_path)
+
+    def plan_config(self, base_config_path):
+        durations, method_tests = shard_planner.select_tests(
+            self.durations, shard_planner.read_test_targets(base_config_path)
+        )
+        shards = shard_planner.plan_shards(
+            durations,
+            shard_planner.shard_count_for_config(base_config_path),
+            method_tests,
+        )
+        output_path = os.path.join(self.directory.name, "flank.yml")
+        shard_planner.write_flank_config(base_config_path, shards, output_path)
+        with open(output_path) as f:
+            return yaml.safe_load(f)
+
+    def test_load_durations(self):
+        # 16 tests, the skipped one has no duration worth keeping
+        self.assertEqual(len(self.durations), 16)
+        self.assertEqual(
+            self.durations["org.mozilla.fenix.ui.HistoryTest#deleteAllHistoryTest"],
+            58.007,
+        )
+
+    def test_method_targets_keep_method_granularity(self):
+        config = self.plan("arm-start-test")
+        base_targets = {
+            target.split(" ", 1)[1]
+            for target in shard_planner.read_test_targets(
+                os.path.join(FENIX_ANDROID_TEST, "flank-arm-start-test.yml")
+            )
+        }
+
+        shard_targets = set()
+        for shard in config["gcloud"]["test-targets-for-shard"]:
+            for target in shard.split(";"):
+                kind, values = target.split(" ", 1)
+                self.assertEqual(kind, "class")
+                shard_targets.update(values.split(","))
+
+        self.assertNotIn("test-targets", config["gcloud"])
+        self.assertEqual(shard_targets, base_targets)
+        # NoNetworkAccessStartupTests is not in the report, it runs in the extra shard
+        self.assertEqual(
+            config["gcloud"]["test-targets-for-shard"][-1],
+            "class org.mozilla.fenix.ui.NoNetworkAccessStartupTests#noNetworkConnectionStartupTest",
+        )
+        self.assertEqual(
+            config["flank"]["max-test-shards"],
+            len(config["gcloud"]["test-targets-for-shard"]),
+        )
+
+    def test_excluding_targets(self):
+        config = self.plan("arm64-v8a")
+        new_test = "org.mozilla.fenix.ui.NewTest#newTest"
+        excluded_test = "org.mozilla.fenix.screenshots.ThreeDotMenuTest#threeDotMenuTest"
+        tests = set(self.durations) | {new_test}
+
+        runs = [
+            shard_tests(shard, tests)
+            for shard in config["gcloud"]["test-targets-for-shard"]
+        ]
+        # Every test runs exactly once, except the excluded one
+        self.assertEqual(sum(len(shard) for shard in runs), len(tests) - 1)
+        self.assertEqual(set().union(*runs), tests - {excluded_test})
+        self.assertEqual(runs[-1], {new_test})
+
+    def test_planned_classes_need_no_extra_shard(self):
+        classes = [
+            "org.mozilla.fenix.ui.BookmarksTest",
+            "org.mozilla.fenix.ui.CollectionTest",
+            "org.mozilla.fenix.ui.MainMenuTest",
+        ]
+        config = self.plan_targets(["class " + ",".join(classes)], 2)
+        shards = config["gcloud"]["test-targets-for-shard"]
+        tests = {test for test in self.durations if test.split("#")[0] in classes}
+
+        # The shard kept for unplanned tests is not used
+        self.assertEqual(shards, ["class " + ",".join(classes)])
+        self.assertEqual(config["flank"]["max-test-shards"], 1)
+        runs = [shard_tests(shard, tests) for shard in shards]
+        self.assertEqual(sum(len(shard) for shard in runs), len(tests))
+        self.assertEqual(set().union(*runs), tests)
+
+    def test_classes_missing_from_history(self):
+        new_class = "org.mozilla.fenix.ui.NewTest"
+        config = self.plan_targets(
+            ["class org.mozilla.fenix.ui.BookmarksTest," + new_class], 2
+        )
+        self.assertEqual(
+            config["gcloud"]["test-targets-for-shard"][-1], "class " + new_class
+        )
+
+    def test_split_class_keeps_new_methods(self):
+        # Shards shorter than the class split it into methods
+        config = self.plan_targets(["class org.mozilla.fenix.ui.HistoryTest"], 4)
+        new_test = "org.mozilla.fenix.ui.HistoryTest#newTest"
+        tests = {
+            test
+            for test in self.durations
+            if test.startswith("org.mozilla.fenix.ui.HistoryTest#")
+        } | {new_test}
+
+        runs = [
+            shard_tests(shard, tests)
+            for shard in config["gcloud"]["test-targets-for-shard"]
+        ]
+        self.assertEqual(sum(len(shard) for shard in runs), len(tests))
+        self.assertEqual(runs[-1], {new_test})
+
+    def test_select_tests(self):
+        durations, method_tests = shard_planner.select_tests(
+            self.durations,
+            [
+                "class org.mozilla.fenix.ui.HistoryTest#deleteAllHistoryTest",
+                "package org.mozilla.fenix.ui",
+                "notClass org.mozilla.fenix.ui.BookmarksTest,org.mozilla.fenix.ui.HistoryTest#verifyEmptyHistoryMenuTest",
+                "class org.mozilla.fenix.ui.MainMenuTest#goBackTest",
+            ],
+        )
+        self.assertNotIn("org.mozilla.fenix.ui.BookmarksTest#editBookmarkTest", durations)
+        self.assertNotIn(
+            "org.mozilla.fenix.ui.HistoryTest#verifyEmptyHistoryMenuTest", durations
+        )
+        self.assertNotIn(
+            "org.mozilla.fenix.screenshots.ThreeDotMenuTest#threeDotMenuTest", durations
+        )
+        self.assertIn("org.mozilla.fenix.ui.MainMenuTest#goForwardTest", durations)
+        # Also selected by its package, so the whole class may be planned
+        self.assertEqual(method_tests, set())
+
+    def test_plan_shards_balances_load(self):
+        shards = shard_planner.plan_shards(self.durations, 4)
+        self.assertEqual(len(shards), 4)
+        total = sum(self.durations.values())
+        self.assertLess(shards[0][0], total / 4 * 1.25)
+        planned = {target for _, targets in shards for target in targets}
+        self.assertEqual(
+            {target.split("#")[0] for target in planned},
+            {test.split("#")[0] for test in self.durations},
+        )
+
+    def test_plan_shards_keeps_method_tests_separate(self):
+        method_tests = {
+            "org.mozilla.fenix.ui.HistoryTest#deleteAllHistoryTest",
+            "org.mozilla.fenix.ui.HistoryTest#verifyEmptyHistoryMenuTest",
+        }
+        durations = {test: self.durations[test] for test in method_tests}
+        shards = shard_planner.plan_shards(durations, 1, method_tests)
+        self.assertEqual(shards, [(sum(durations.values()), sorted(method_tests))])
+
+
+if __name__ == "__main__":
+    unittest.main()
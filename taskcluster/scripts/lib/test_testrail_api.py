@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import unittest
+from unittest import mock
+
+import testrail_api
+
+PAGE_SIZE = 250
+
+
+class FakeTestRail:
+    """The state of a TestRail project served by FakeTestRailHandler."""
+
+    def __init__(self, case_count):
+        self.lock = threading.Lock()
+        self.cases = [{"id": case_id} for case_id in range(1, case_count + 1)]
+        self.milestones = []
+        self.runs = []
+        self.results = {}
+        self.posts = []
+        # Methods (e.g. "add_run") whose next call is applied, then answered with a 500
+        self.fail_after_create = set()
+
+    def get(self, method, params):
+        if method == "get_cases":
+            entities = self.cases
+        elif method == "get_milestones":
+            completed = params.get("is_completed") == "1"
+            entities = [m for m in self.milestones if m["is_completed"] == completed]
+        elif method == "get_runs":
+            milestone_id = int(params["milestone_id"])
+            entities = [run for run in self.runs if run["milestone_id"] == milestone_id]
+        else:
+            return 404, {"error": f"Unknown method {method}"}
+        return 200, self._page(method, params, entities)
+
+    def post(self, method, project_or_run_id, data):
+        with self.lock:
+            self.posts.append(method)
+            if method == "add_milestone":
+                entity = {
+                    "id": len(self.milestones) + 1,
+                    "name": data["name"],
+                    "is_completed": False,
+                }
+                self.milestones.append(entity)
+            elif method == "add_run":
+                entity = {
+                    "id": len(self.runs) + 1,
+                    "name": data["name"],
+                    "milestone_id": data["milestone_id"],
+                }
+                self.runs.append(entity)
+            elif method == "add_results_for_cases":
+                self.results.setdefault(project_or_run_id, []).extend(data["results"])
+                entity = []
+            else:
+                return 404, {"error": f"Unknown method {method}"}
+
+            if method in self.fail_after_create:
+                self.fail_after_create.discard(method)
+                return 500, {"error": "Gateway timeout after the request was applied"}
+        return 200, entity
+
+    def _page(self, method, params, entities):
+        offset = int(params.get("offset", 0))
+        page = entities[offset : offset + PAGE_SIZE]
+        next_link = None
+        if offset + PAGE_SIZE < len(entities):
+            query = "".join(
+                f"&{key}={value}"
+                for key, value in params.items()
+                if key not in ("id", "offset")
+            )
+            next_link = (
+                f"/api/v2/{method}/{params['id']}{query}&offset={offset + PAGE_SIZE}"
+            )
+        return {
+            "offset": offset,
+            "size": len(page),
+            "_links": {"next": next_link},
+            method[len("get_") :]: page,
+        }
+
+
+class FakeTestRailHandler(BaseHTTPRequestHandler):
+    """Serves `index.php?/api/v2/<method>/<id>&<params>` like TestRail 6.7 and later."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse(self):
+        uri = self.path.split("?/api/v2/", 1)[1]
+        path, *params = uri.split("&")
+        method, entity_id = path.split("/")
+        params = dict(param.split("=", 1) for param in params)
+        params["id"] = entity_id
+        return method, entity_id, params
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        method, _, params = self._parse()
+        self._reply(*self.server.testrail.get(method, params))
+
+    def do_POST(self):
+        method, entity_id, _ = self._parse()
+        data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self._reply(*self.server.testrail.post(method, entity_id, data))
+
+
+class TestRailTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testrail, self.client = self.start_server()
+        # Retries would otherwise wait for the back-off delay
+        patcher = mock.patch.object(testrail_api.time, "sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start_server(self):
+        """Starts a fake TestRail server, returning it and a TestRail client for it."""
+        testrail = FakeTestRail(case_count=600)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTestRailHandler)
+        server.testrail = testrail
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = testrail_api.TestRail(
+            f"http://127.0.0.1:{server.server_port}", "user", "password"
+        )
+        return testrail, client
+
+    def test_get_test_cases_follows_pagination_links(self):
+        cases = self.client._get_test_cases(1, 2)
+        self.assertEqual([case["id"] for case in cases], list(range(1, 601)))
+
+    def test_create_milestone_and_test_runs(self):
+        devices = ["Pixel 2", "Pixel 6", "Galaxy S21"]
+        milestone_id = self.client.create_milestone_and_test_runs(
+            1, "Build 1", "Description", devices, 2
+        )
+
+        self.assertEqual(milestone_id, 1)
+        self.assertEqual(
+            sorted(run["name"] for run in self.testrail.runs), sorted(devices)
+        )
+        for run in self.testrail.runs:
+            results = self.testrail.results[str(run["id"])]
+            self.assertEqual(
+                sorted(result["case_id"] for result in results), list(range(1, 601))
+            )
+        # 600 results are sent in batches of 250
+        self.assertEqual(self.testrail.posts.count("add_results_for_cases"), 3 * 3)
+
+    def test_retry_after_partial_create_does_not_duplicate(self):
+        self.testrail.fail_after_create = {"add_milestone", "add_run"}
+        devices = ["Pixel 2", "Pixel 6"]
+
+        milestone_id = self.client.create_milestone_and_test_runs(
+            1, "Build 1", "Description", devices, 2
+        )
+
+        self.assertEqual(len(self.testrail.milestones), 1)
+        self.assertEqual(milestone_id, self.testrail.milestones[0]["id"])
+        self.assertEqual(
+            sorted(run["name"] for run in self.testrail.runs), sorted(devices)
+        )
+        self.assertEqual(self.testrail.posts.count("add_milestone"), 1)
+        self.assertEqual(self.testrail.posts.count("add_run"), 2)
+        for run in self.testrail.runs:
+            self.assertEqual(len(self.testrail.results[str(run["id"])]), 600)
+
+    def test_does_milestone_exist_searches_completed_milestones(self):
+        self.testrail.milestones = [
+            {"id": index, "name": f"Build {index}", "is_completed": True}
+            for index in range(1, 301)
+        ]
+        self.assertTrue(self.client.does_milestone_exist(1, "Build 300"))
+        self.assertFalse(self.client.does_milestone_exist(1, "Build 301"))
+
+    def test_milestone_indexes_are_not_shared_between_clients(self):
+        self.testrail.milestones = [{"id": 1, "name": "Build 1", "is_completed": False}]
+        other_testrail, other_client = self.start_server()
+        self.assertTrue(self.client.does_milestone_exist(1, "Build 1"))
+        # Same project id, on another TestRail server
+        self.assertFalse(other_client.does_milestone_exist(1, "Build 1"))
+
+        other_client.create_milestone(1, "Build 2", "Description")
+        self.assertEqual(len(other_testrail.milestones), 1)
+        self.assertFalse(self.client.does_milestone_exist(1, "Build 2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,18 +12,28 @@ Key Components:
 - TestRail Class: A class providing methods for interacting with TestRail's API.
   - create_milestone: Create a new milestone in a TestRail project.
   - create_milestone_and_test_runs: Create a milestone and associated test runs for multiple devices in a project.
+    The suite's test cases are fetched once, the test runs are created concurrently and the results are
+    uploaded in batches.
   - create_test_run: Create a test run within a TestRail project.
   - does_milestone_exist: Check if a milestone already exists in a TestRail project.
+  - milestone_index: Return the cached MilestoneIndex of a TestRail project.
   - update_test_cases_to_passed: Update the status of test cases to 'passed' in a test run.
+- MilestoneIndex Class: A lazily populated lookup of a project's milestones by name. Open milestones are searched
+  before completed ones and pages are only requested until the milestone is found. Each TestRail instance caches
+  the index of a project for its lifetime.
 - Private Methods: Utility methods for internal use to fetch test cases, update test run results, and retrieve milestones.
-- Retry Mechanism: A method to retry API calls with a specified number of attempts and delay, improving reliability in case of intermittent network issues.
+- Retry Mechanism: A method to retry API calls with exponential backoff. Calls that create resources can be given a
+  lookup used before each retry, so that a request which reached TestRail but failed on the way back does not
+  create a duplicate milestone or test run.
 
 Usage:
 This module is intended to be used as part of a larger automated testing system, where integration with TestRail is required for test management and reporting.
 
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import os
+import random
 import sys
 import time
 
@@ -35,34 +45,136 @@ if script_directory not in sys.path:
 from testrail_conn import APIClient
 
 
+# TestRail status id for "Passed"
+PASSED_STATUS_ID = 1
+# Number of results sent in a single add_results_for_cases request
+RESULTS_BATCH_SIZE = 250
+# Upper bound on the number of devices handled at the same time
+MAX_WORKERS = 8
+
+
+def _iter_pages(client, uri, key):
+    """
+    Yields the pages of entities returned by a GET endpoint, following pagination links.
+
+    TestRail 6.7 and later wrap bulk responses in an object holding one page of
+    entities under `key` and a link to the next page; older versions return a list.
+
+    :param client: The APIClient to send the requests with.
+    :param uri: The API method to call including parameters.
+    :param key: Name of the field holding the entities in a paginated response.
+    """
+    while uri:
+        response = client.send_get(uri)
+        if isinstance(response, list):
+            yield response
+            return
+        yield response[key]
+        next_uri = response.get("_links", {}).get("next")
+        uri = next_uri.split("/api/v2/", 1)[-1] if next_uri else None
+
+
+class MilestoneIndex:
+    """
+    Name lookup over the milestones of a single TestRail project.
+
+    Milestones are fetched one page at a time, open milestones first, and only as far as
+    needed to answer a lookup. Everything fetched so far is kept, so repeated lookups and
+    lookups for milestones created by this process do not hit the API again.
+    """
+
+    FILTERS = ("is_completed=0", "is_completed=1")
+
+    def __init__(self, client, testrail_project_id):
+        self.client = client
+        self.testrail_project_id = testrail_project_id
+        self.refresh()
+
+    def __contains__(self, milestone_name):
+        return self.find(milestone_name) is not None
+
+    def add(self, milestone):
+        self._milestones[milestone["name"]] = milestone
+
+    def find(self, milestone_name):
+        while milestone_name not in self._milestones and self._pending_pages:
+            try:
+                page = next(self._pending_pages[0])
+            except StopIteration:
+                self._pending_pages.pop(0)
+                continue
+            for milestone in page:
+                self._milestones.setdefault(milestone["name"], milestone)
+        return self._milestones.get(milestone_name)
+
+    def refresh(self):
+        """Forget everything fetched so far; the next lookup queries TestRail again."""
+        self._milestones = {}
+        self._pending_pages = [
+            _iter_pages(
+                self.client,
+                f"get_milestones/{self.testrail_project_id}&{completed_filter}",
+                "milestones",
+            )
+            for completed_filter in self.FILTERS
+        ]
+
+
 class TestRail:
     def __init__(self, host, username, password):
         self.client = APIClient(host)
         self.client.user = username
         self.client.password = password
+        # MilestoneIndex instances, keyed by TestRail project id
+        self._milestone_indexes = {}
 
     # Public Methods
 
     def create_milestone(self, testrail_project_id, title, description):
         data = {"name": title, "description": description}
-        return self.client.send_post(f"add_milestone/{testrail_project_id}", data)
+        milestone = self.client.send_post(f"add_milestone/{testrail_project_id}", data)
+        self.milestone_index(testrail_project_id).add(milestone)
+        return milestone
 
     def create_milestone_and_test_runs(
         self, project_id, milestone_name, milestone_description, devices, test_suite_id
     ):
         # Create milestone
         milestone_id = self._retry_api_call(
-            self.create_milestone, project_id, milestone_name, milestone_description
+            self.create_milestone,
+            project_id,
+            milestone_name,
+            milestone_description,
+            lookup=lambda: self._find_milestone(project_id, milestone_name),
         )["id"]
 
+        # The test cases are the same for every device, only fetch them once
+        test_cases = self._retry_api_call(
+            self._get_test_cases, project_id, test_suite_id
+        )
+        results = [
+            {"case_id": test_case["id"], "status_id": PASSED_STATUS_ID}
+            for test_case in test_cases
+        ]
+
         # Create test runs for each device
-        for device in devices:
+        def create_device_run(device):
             test_run_id = self._retry_api_call(
-                self.create_test_run, project_id, milestone_id, device, test_suite_id
+                self.create_test_run,
+                project_id,
+                milestone_id,
+                device,
+                test_suite_id,
+                lookup=lambda: self._find_test_run(project_id, milestone_id, device),
             )["id"]
-            self._retry_api_call(
-                self.update_test_cases_to_passed, project_id, test_run_id, test_suite_id
-            )
+            self._add_results_in_batches(test_run_id, results)
+
+        if devices:
+            with ThreadPoolExecutor(
+                max_workers=min(len(devices), MAX_WORKERS)
+            ) as executor:
+                # list() re-raises the first exception hit by a worker
+                list(executor.map(create_device_run, devices))
 
         return milestone_id
 
@@ -77,16 +189,15 @@ class TestRail:
         return self.client.send_post(f"add_run/{testrail_project_id}", data)
 
     def does_milestone_exist(self, testrail_project_id, milestone_name):
-        num_of_milestones_to_check = 10  # check last 10 milestones
-        milestones = self._get_milestones(
-            testrail_project_id
-        )  # returns reverse chronological order
-        for milestone in milestones[
-            -num_of_milestones_to_check:
-        ]:  # check last 10 api responses
-            if milestone_name == milestone["name"]:
-                return True
-        return False
+        return milestone_name in self.milestone_index(testrail_project_id)
+
+    def milestone_index(self, testrail_project_id):
+        key = str(testrail_project_id)
+        if key not in self._milestone_indexes:
+            self._milestone_indexes[key] = MilestoneIndex(
+                self.client, testrail_project_id
+            )
+        return self._milestone_indexes[key]
 
     def update_test_cases_to_passed(
         self, testrail_project_id, testrail_run_id, testrail_suite_id
@@ -94,7 +205,8 @@ class TestRail:
         test_cases = self._get_test_cases(testrail_project_id, testrail_suite_id)
         data = {
             "results": [
-                {"case_id": test_case["id"], "status_id": 1} for test_case in test_cases
+                {"case_id": test_case["id"], "status_id": PASSED_STATUS_ID}
+                for test_case in test_cases
             ]
         }
         return self._update_test_run_results(testrail_run_id, data)
@@ -102,29 +214,68 @@ class TestRail:
     # Private Methods
 
     def _get_test_cases(self, testrail_project_id, testrail_test_suite_id):
-        return self.client.send_get(
-            f"get_cases/{testrail_project_id}&suite_id={testrail_test_suite_id}"
+        return self._get_all(
+            f"get_cases/{testrail_project_id}&suite_id={testrail_test_suite_id}",
+            "cases",
         )
 
+    def _get_all(self, uri, key):
+        return [
+            entity for page in _iter_pages(self.client, uri, key) for entity in page
+        ]
+
+    def _add_results_in_batches(self, testrail_run_id, results):
+        for start in range(0, len(results), RESULTS_BATCH_SIZE):
+            data = {"results": results[start : start + RESULTS_BATCH_SIZE]}
+            # Adding the same "passed" result twice is harmless, no lookup needed
+            self._retry_api_call(self._update_test_run_results, testrail_run_id, data)
+
     def _update_test_run_results(self, testrail_run_id, data):
         return self.client.send_post(f"add_results_for_cases/{testrail_run_id}", data)
 
-    def _get_milestones(self, testrail_project_id):
-        return self.client.send_get(f"get_milestones/{testrail_project_id}")
+    def _find_milestone(self, testrail_project_id, milestone_name):
+        # Only used before retrying a creation, the cached pages may be stale by now
+        milestone_index = self.milestone_index(testrail_project_id)
+        milestone_index.refresh()
+        return milestone_index.find(milestone_name)
 
-    def _retry_api_call(self, api_call, *args, max_retries=3, delay=5):
+    def _find_test_run(self, testrail_project_id, testrail_milestone_id, name_run):
+        runs = self._get_all(
+            f"get_runs/{testrail_project_id}&milestone_id={testrail_milestone_id}",
+            "runs",
+        )
+        return next((run for run in runs if run["name"] == name_run), None)
+
+    def _retry_api_call(
+        self, api_call, *args, max_retries=5, base_delay=2, max_delay=60, lookup=None
+    ):
         """
-        Retries the given API call up to max_retries times with a delay between attempts.
+        Retries the given API call up to max_retries times with exponential backoff and jitter.
+
+        POST requests are not idempotent: a request may have been applied by TestRail even though
+        the client saw an error. For calls that create resources, pass a lookup that returns the
+        resource if it already exists; it is consulted before every retry and its result is
+        returned instead of creating the resource a second time.
 
         :param api_call: The API call method to retry.
         :param args: Arguments to pass to the API call.
-        :param max_retries: Maximum number of retries.
-        :param delay: Delay between retries in seconds.
+        :param max_retries: Maximum number of attempts.
+        :param base_delay: Delay before the first retry in seconds, doubled on each attempt.
+        :param max_delay: Upper bound on the delay between attempts in seconds.
+        :param lookup: Optional callable returning the already created resource, or None.
         """
         for attempt in range(max_retries):
+            if attempt > 0 and lookup is not None:
+                try:
+                    existing = lookup()
+                except Exception:
+                    existing = None
+                if existing is not None:
+                    return existing
             try:
                 return api_call(*args)
-            except Exception as e:
+            except Exception:
                 if attempt == max_retries - 1:
                     raise  # Reraise the last exception
-                time.sleep(delay)
+                delay = min(max_delay, base_delay * 2**attempt)
+                time.sleep(random.uniform(delay / 2, delay))
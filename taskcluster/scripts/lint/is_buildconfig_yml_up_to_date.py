@@ -5,11 +5,19 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
+import argparse
+import hashlib
 import logging
 import os
 import sys
 
-from pygit2 import Repository
+from pygit2 import (
+    GIT_STATUS_WT_DELETED,
+    GIT_STATUS_WT_MODIFIED,
+    GIT_STATUS_WT_NEW,
+    Patch,
+    Repository,
+)
 from update_buildconfig_from_gradle import main as update_build_config
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -18,20 +26,122 @@ OUTPUT_DIR = os.path.join(PROJECT_DIR, "artifacts", "git")
 BUILDCONFIG_DIFF_FILE_NAME = "buildconfig.diff"
 BUILDCONFIG_DIFF_FILE = os.path.join(OUTPUT_DIR, BUILDCONFIG_DIFF_FILE_NAME)
 BUILDCONFIG_FILE_NAME = ".buildconfig.yml"
+BUILDCONFIG_FILES = tuple(
+    f"{gradle_root}/{BUILDCONFIG_FILE_NAME}"
+    for gradle_root in ("android-components", "fenix", "focus-android")
+)
+_WORKDIR_CHANGED = GIT_STATUS_WT_MODIFIED | GIT_STATUS_WT_NEW | GIT_STATUS_WT_DELETED
+# Records the hash of the inputs of the last successful check, relative to the gradle root.
+# Only useful locally: lint tasks start from a fresh checkout without caches.
+INPUTS_HASH_FILE_NAME = os.path.join("build", "buildconfig-inputs.sha256")
+
+# Everything .buildconfig.yml is computed from lives in these directories...
+_INPUT_ROOTS = ("android-components", "fenix", "focus-android")
+# ...and in these files at the root of the repository
+_ROOT_INPUT_FILES = ("shared-settings.gradle",)
+_INPUT_FILE_NAMES = (
+    BUILDCONFIG_FILE_NAME,
+    "gradle.properties",
+    # The gradle version changes how dependencies get resolved
+    "gradle-wrapper.properties",
+)
+_INPUT_FILE_SUFFIXES = (".gradle", ".gradle.kts")
+_IGNORED_DIRECTORIES = {".git", ".gradle", ".idea", "build", "node_modules"}
 
 logger = logging.getLogger(__name__)
 
 
-def _are_buildconfig_files_changed(git_diff):
-    return any(
-        delta.new_file.path.endswith(BUILDCONFIG_FILE_NAME) for delta in git_diff.deltas
-    )
-
-
-def _execute_taskcluster_steps(diff, task_id):
+def _is_input_file(relative_dir, file_name):
+    if file_name in _INPUT_FILE_NAMES or file_name.endswith(_INPUT_FILE_SUFFIXES):
+        return True
+    # Included plugin builds, e.g. android-components/plugins/dependencies, configure the
+    # projects and declare their dependencies
+    return relative_dir.split(os.sep)[1:2] == ["plugins"]
+
+
+def _iter_input_files():
+    for file_name in _ROOT_INPUT_FILES:
+        yield file_name
+    for input_root in _INPUT_ROOTS:
+        for dir_path, dir_names, file_names in os.walk(
+            os.path.join(PROJECT_DIR, input_root)
+        ):
+            dir_names[:] = sorted(
+                dir_name for dir_name in dir_names if dir_name not in _IGNORED_DIRECTORIES
+            )
+            relative_dir = os.path.relpath(dir_path, PROJECT_DIR)
+            for file_name in sorted(file_names):
+                if _is_input_file(relative_dir, file_name):
+                    yield os.path.join(relative_dir, file_name)
+    # The way these scripts compute .buildconfig.yml matters too
+    for file_name in sorted(os.listdir(CURRENT_DIR)):
+        if file_name.endswith(".py"):
+            yield os.path.relpath(os.path.join(CURRENT_DIR, file_name), PROJECT_DIR)
+
+
+def _compute_inputs_hash(gradle_root):
+    digest = hashlib.sha256(os.path.basename(os.path.realpath(gradle_root)).encode())
+    for relative_path in _iter_input_files():
+        digest.update(relative_path.encode() + b"\0")
+        with open(os.path.join(PROJECT_DIR, relative_path), "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def _get_inputs_hash_file(gradle_root):
+    return os.path.join(gradle_root, INPUTS_HASH_FILE_NAME)
+
+
+def _read_inputs_hash(hash_file):
+    try:
+        with open(hash_file) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _write_inputs_hash(hash_file, inputs_hash):
+    os.makedirs(os.path.dirname(os.path.abspath(hash_file)), exist_ok=True)
+    with open(hash_file, "w") as f:
+        f.write(inputs_hash)
+
+
+def _get_buildconfig_patch(repository):
+    """Returns the diff between the index and the working tree of the .buildconfig.yml files only.
+
+    Unlike diffing the whole working tree, this costs the same whatever the size of the
+    repository.
+    """
+    patches = []
+    for path in BUILDCONFIG_FILES:
+        try:
+            status = repository.status_file(path)
+        except KeyError:
+            # Neither tracked nor present in the working tree
+            continue
+        if not status & _WORKDIR_CHANGED:
+            continue
+
+        old_blob = (
+            repository[repository.index[path].id] if path in repository.index else None
+        )
+        workdir_path = os.path.join(repository.workdir, path)
+        new_content = None
+        if os.path.exists(workdir_path):
+            with open(workdir_path, "rb") as f:
+                new_content = f.read()
+        patches.append(
+            Patch.create_from(
+                old_blob, new_content, old_as_path=path, new_as_path=path
+            ).text
+        )
+    return "".join(patches)
+
+
+def _execute_taskcluster_steps(patch, task_id):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     with open(BUILDCONFIG_DIFF_FILE, mode="w") as f:
-        f.write(diff.patch)
+        f.write(patch)
     tc_root_url = os.environ["TASKCLUSTER_ROOT_URL"]
     artifact_url = f"{tc_root_url}/api/queue/v1/task/{task_id}/artifacts/public%2Fgit%2F{BUILDCONFIG_DIFF_FILE_NAME}"  # noqa E501
     message = f"""{BUILDCONFIG_FILE_NAME} file changed! Please update it by running:
@@ -47,17 +157,42 @@ def _execute_local_steps():
     logger.error(f"{BUILDCONFIG_FILE_NAME} file updated! Please commit these changes.")
 
 
+def _parse_args(cmdln_args):
+    parser = argparse.ArgumentParser(
+        description=f"Checks {BUILDCONFIG_FILE_NAME} is up-to-date with gradle"
+    )
+    parser.add_argument(
+        "gradle_root",
+        metavar="GRADLE_ROOT",
+        help="The directory where to call gradle from",
+    )
+    # Other options are for update_buildconfig_from_gradle.py, which parses them itself
+    args, _ = parser.parse_known_args(args=cmdln_args)
+    return args
+
+
 def main():
+    gradle_root = _parse_args(sys.argv[1:]).gradle_root
+    hash_file = _get_inputs_hash_file(gradle_root)
+    inputs_hash = _compute_inputs_hash(gradle_root)
+    if inputs_hash == _read_inputs_hash(hash_file):
+        logger.info(
+            f"All good! Nothing {BUILDCONFIG_FILE_NAME} depends on changed since the last check."
+        )
+        return
+
     update_build_config()
-    diff = Repository(PROJECT_DIR).diff()
-    if _are_buildconfig_files_changed(diff):
+    patch = _get_buildconfig_patch(Repository(PROJECT_DIR))
+    if patch:
         task_id = os.environ.get("TASK_ID")
         if task_id:
-            _execute_taskcluster_steps(diff, task_id)
+            _execute_taskcluster_steps(patch, task_id)
         else:
             _execute_local_steps()
         sys.exit(1)
 
+    # Only remember inputs that are known to produce the committed .buildconfig.yml
+    _write_inputs_hash(hash_file, inputs_hash)
     logger.info(f"All good! {BUILDCONFIG_FILE_NAME} is up-to-date with gradle.")
 
 
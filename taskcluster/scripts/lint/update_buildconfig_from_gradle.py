@@ -9,10 +9,9 @@ import argparse
 import json
 import logging
 import os
-import re
 import subprocess
 import sys
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 import yaml
 from mergedeep import merge
@@ -20,52 +19,198 @@ from mergedeep import merge
 logger = logging.getLogger(__name__)
 
 _DEFAULT_GRADLE_COMMAND = ("./gradlew", "--console=plain", "--no-parallel")
-_LOCAL_DEPENDENCY_PATTERN = re.compile(
-    r"(\+|\\)--- project :(?P<local_dependency_name>\S+)\s?.*"
-)
+_EXPORT_TASK = "exportBuildConfig"
+_EXPORT_FILE = os.path.join("build", "buildconfig.json")
+_PROJECT_EXPORT_TASK = "exportUpstreamDependencies"
+_PROJECT_EXPORT_DIR = os.path.join("build", "buildconfig", "projects")
+# Stay well below the shortest command line limit we may hit (32767 characters on Windows)
+_MAX_COMMAND_LINE_LENGTH = 30000
+# Must match buildConfigExportVersion in android-components/buildconfig-export.gradle
+_EXPORT_VERSION = 1
 
 
-def _get_upstream_deps_per_gradle_project(gradle_root, existing_build_config):
-    project_dependencies = defaultdict(set)
-    gradle_projects = _get_gradle_projects(gradle_root, existing_build_config)
+class BuildConfigExportError(ValueError):
+    pass
 
-    logger.info(f"Looking for dependencies in {gradle_root}")
 
-    # This is eventually going to fail if there's ever enough projects to make the
-    # command line too long. If that happens, we'll need to split this list up and
-    # run gradle more than once.
-    cmd = list(_DEFAULT_GRADLE_COMMAND)
-    cmd.extend(
-        [f"{gradle_project}:dependencies" for gradle_project in sorted(gradle_projects)]
-    )
+def _stream_gradle_output(cmd, gradle_root):
+    """Yields the lines printed by a gradle command as they come, without buffering them all.
 
-    # Parsing output like this is not ideal but bhearsum couldn't find a way
-    # to get the dependencies printed in a better format. If we could convince
-    # gradle to spit out JSON that would be much better.
-    # This is filed as https://bugzilla.mozilla.org/show_bug.cgi?id=1795152
-    current_project_name = None
+    Raises subprocess.CalledProcessError if the command fails, like check_output() does.
+    """
     print(f"Running command: {' '.join(cmd)}")
-    for line in subprocess.check_output(
-        cmd, universal_newlines=True, cwd=gradle_root
-    ).splitlines():
-        # If we find the start of a new component section, update our tracking
-        # variable
-        if line.startswith("Project"):
-            current_project_name = line.split(":")[1].strip("'")
-
-        # If we find a new local dependency, add it.
-        local_dep_match = _LOCAL_DEPENDENCY_PATTERN.search(line)
-        if local_dep_match:
-            local_dependency_name = local_dep_match.group("local_dependency_name")
-            if (
-                local_dependency_name != current_project_name
-                # These lint rules are not part of android-components
-                and local_dependency_name != "mozilla-lint-rules"
+    with subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, universal_newlines=True, cwd=gradle_root
+    ) as process:
+        for line in process.stdout:
+            yield line.rstrip("\n")
+        return_code = process.wait()
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, cmd)
+
+
+def _run_gradle(cmd, gradle_root):
+    for line in _stream_gradle_output(cmd, gradle_root):
+        print(line)
+
+
+def _export_build_config(gradle_root):
+    """Runs gradle once and returns the dependencies and variants it exported."""
+    _run_gradle(list(_DEFAULT_GRADLE_COMMAND) + [_EXPORT_TASK], gradle_root)
+    return _load_build_config_export(os.path.join(gradle_root, _EXPORT_FILE))
+
+
+def _export_upstream_dependencies(gradle_root, gradle_projects, workers):
+    """Exports the dependencies of the projects in batches, one gradle invocation each.
+
+    Returns the same document as _export_build_config(), without variants.
+    """
+    jobs = [
+        lambda batch=batch: _run_gradle(_get_project_export_command(batch), gradle_root)
+        for batch in _split_into_batches(sorted(gradle_projects), workers)
+    ]
+    _run_gradle_jobs(jobs, workers)
+    return {
+        "version": _EXPORT_VERSION,
+        "projects": {
+            project_name: {
+                "upstream_dependencies": _load_upstream_dependencies(
+                    os.path.join(gradle_root, _PROJECT_EXPORT_DIR, f"{project_name}.json")
+                )
+            }
+            for project_name in gradle_projects
+        },
+    }
+
+
+def _get_project_export_command(gradle_projects):
+    cmd = list(_DEFAULT_GRADLE_COMMAND)
+    cmd.extend(f":{gradle_project}:{_PROJECT_EXPORT_TASK}" for gradle_project in gradle_projects)
+    return cmd
+
+
+def _split_into_batches(gradle_projects, workers):
+    """Splits projects into one batch per worker, keeping every command line short enough.
+
+    Projects are dealt round-robin so that batches end up with a similar amount of work.
+    """
+    workers = max(1, workers)
+    batches = [gradle_projects[index::workers] for index in range(workers)]
+    base_length = len(" ".join(_get_project_export_command([])))
+
+    safe_batches = []
+    for batch in batches:
+        current_batch, current_length = [], base_length
+        for gradle_project in batch:
+            # +1 for the space separating arguments
+            argument_length = len(f":{gradle_project}:{_PROJECT_EXPORT_TASK}") + 1
+            if current_batch and (
+                current_length + argument_length > _MAX_COMMAND_LINE_LENGTH
             ):
-                project_dependencies[current_project_name].add(local_dependency_name)
+                safe_batches.append(current_batch)
+                current_batch, current_length = [], base_length
+            current_batch.append(gradle_project)
+            current_length += argument_length
+        if current_batch:
+            safe_batches.append(current_batch)
+    return safe_batches
+
+
+def _run_gradle_jobs(jobs, workers):
+    """Runs jobs calling gradle and returns their results, in the order of the jobs.
+
+    The first job runs alone so that included builds are compiled once, before the other
+    jobs run concurrently, each in its own gradle daemon. Within a daemon, projects are
+    resolved one at a time (--no-parallel).
+    """
+    if not jobs:
+        return []
+
+    results = [jobs[0]()]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results.extend(executor.map(lambda job: job(), jobs[1:]))
+    return results
+
+
+def _load_upstream_dependencies(path):
+    """Loads the JSON list written by `gradle :<project>:exportUpstreamDependencies`."""
+    with open(path) as f:
+        upstream_dependencies = json.load(f)
+    if not (
+        isinstance(upstream_dependencies, list)
+        and all(isinstance(dep, str) for dep in upstream_dependencies)
+    ):
+        raise BuildConfigExportError(f"Invalid {path}: expected a list of strings")
+    return upstream_dependencies
+
+
+def _load_build_config_export(path):
+    """Loads the JSON written by `gradle exportBuildConfig` and validates its schema.
+
+    The expected document is:
+
+        {
+            "version": 1,
+            "projects": {"<project>": {"upstream_dependencies": ["<project>", ...]}, ...},
+            "variants": [{"name": str, "build_type": str, "apks": [{"abi": str|null, "fileName": str}]}]
+        }
+
+    where "variants" is only present for apps.
+    """
+    with open(path) as f:
+        export = json.load(f)
+
+    def check(condition, message):
+        if not condition:
+            raise BuildConfigExportError(f"Invalid {path}: {message}")
+
+    check(isinstance(export, dict), "expected an object")
+    check(
+        export.get("version") == _EXPORT_VERSION,
+        f"unsupported version {export.get('version')!r}, expected {_EXPORT_VERSION}",
+    )
+
+    projects = export.get("projects")
+    check(isinstance(projects, dict), '"projects" must be an object')
+    for project_name, project in projects.items():
+        check(
+            isinstance(project, dict)
+            and isinstance(project.get("upstream_dependencies"), list)
+            and all(isinstance(dep, str) for dep in project["upstream_dependencies"]),
+            f'"projects.{project_name}.upstream_dependencies" must be a list of strings',
+        )
+
+    variants = export.get("variants", [])
+    check(isinstance(variants, list), '"variants" must be a list')
+    for variant in variants:
+        check(
+            isinstance(variant, dict)
+            and isinstance(variant.get("name"), str)
+            and isinstance(variant.get("build_type"), str)
+            and isinstance(variant.get("apks"), list),
+            f"invalid variant {variant!r}",
+        )
+        for apk in variant["apks"]:
+            check(
+                isinstance(apk, dict)
+                and isinstance(apk.get("fileName"), str)
+                and (apk.get("abi") is None or isinstance(apk["abi"], str)),
+                f"invalid apk {apk!r} in variant {variant['name']}",
+            )
+
+    return export
+
+
+def _get_upstream_deps_per_gradle_project(gradle_root, existing_build_config, export):
+    gradle_projects = _get_gradle_projects(gradle_root, existing_build_config)
+    missing_projects = sorted(set(gradle_projects) - set(export["projects"]))
+    if missing_projects:
+        raise BuildConfigExportError(
+            f"gradle did not export {', '.join(missing_projects)}"
+        )
 
     return {
-        project_name: sorted(project_dependencies[project_name])
+        project_name: sorted(export["projects"][project_name]["upstream_dependencies"])
         for project_name in gradle_projects
     }
 
@@ -98,6 +243,12 @@ def _parse_args(cmdln_args):
         type=is_dir,
         help="The directory where to call gradle from",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of gradle invocations to run at the same time (android-components only)",
+    )
     return parser.parse_args(args=cmdln_args)
 
 
@@ -120,16 +271,6 @@ def _merge_build_config(
     return merge(existing_build_config, updated_build_config, updated_variant_config)
 
 
-def _get_variants(gradle_root):
-    cmd = list(_DEFAULT_GRADLE_COMMAND) + ["printVariants"]
-    output_lines = subprocess.check_output(
-        cmd, universal_newlines=True, cwd=gradle_root
-    ).splitlines()
-    variants_line = [line for line in output_lines if line.startswith("variants: ")][0]
-    variants_json = variants_line.split(" ", 1)[1]
-    return json.loads(variants_json)
-
-
 def _should_print_variants(gradle_root):
     return gradle_root.endswith("fenix") or gradle_root.endswith("focus-android")
 
@@ -143,13 +284,22 @@ def main():
     with open(build_config_file) as f:
         existing_build_config = yaml.safe_load(f)
 
+    if args.workers > 1 and not _should_print_variants(gradle_root):
+        export = _export_upstream_dependencies(
+            gradle_root,
+            _get_gradle_projects(gradle_root, existing_build_config),
+            args.workers,
+        )
+    else:
+        export = _export_build_config(gradle_root)
     upstream_deps_per_project = _get_upstream_deps_per_gradle_project(
-        gradle_root, existing_build_config
+        gradle_root, existing_build_config, export
     )
 
     variants_config = (
-        _get_variants(gradle_root) if _should_print_variants(gradle_root) else {}
+        export.get("variants", []) if _should_print_variants(gradle_root) else {}
     )
+
     merged_build_config = _merge_build_config(
         existing_build_config, upstream_deps_per_project, variants_config
     )
@@ -9,7 +9,9 @@ This module provides functionalities for sending notifications to Slack channels
 Key Features:
 - SLACK_SUCCESS_MESSAGE_TEMPLATE: A predefined template for formatting success messages to be sent to Slack. This template includes placeholders for dynamic content such as product version and release details.
 - SLACK_ERROR_MESSAGE_TEMPLATE: A template for error messages, used to notify about failures or issues in automated processes, particularly with TestRail API interactions.
-- send_slack_notification: A function that sends a Slack notification based on a provided template and value dictionary. It handles the construction of the message payload and interfaces with Taskcluster's Slack notification service.
+- SlackNotifier: A notification service that reuses a single Taskcluster Notify client and delivers queued messages from a background thread. Messages sent to the same channel within a short window are coalesced into one Block Kit payload, and rate-limited or failed requests are retried with backoff.
+- get_notifier: Returns the process-wide SlackNotifier for a set of Taskcluster options.
+- send_slack_notification: A function that sends a Slack notification based on a provided template and value dictionary. It handles the construction of the message payload and interfaces with Taskcluster's Slack notification service. The message is queued and delivered before the process exits; pass `wait=True` to block until it is delivered.
 - get_taskcluster_options: Retrieves configuration options for Taskcluster based on the current runtime environment, ensuring appropriate setup for notification delivery.
 - send_error_notification: A higher-level function that formats and sends error notifications to a specified Slack channel.
 - send_success_notification: Similarly, this function sends success notifications to a specified Slack channel, using the success message template.
@@ -51,9 +53,13 @@ values = {
 send_error_notification(values, 'channel_id', taskcluster_options)
 """
 
+import atexit
+from concurrent.futures import Future, wait as wait_futures
 import json
 import os
+import queue
 from string import Template
+import threading
 import time
 import traceback
 
@@ -130,8 +136,212 @@ SLACK_ERROR_MESSAGE_TEMPLATE = Template(
 """
 )
 
+# Messages to the same channel queued within this many seconds are sent as one payload
+COALESCE_WINDOW = 2.0
+# Slack rejects messages with more than 50 blocks
+MAX_BLOCKS_PER_MESSAGE = 50
+# Slack allows roughly one message per second and channel
+MIN_SECONDS_BETWEEN_MESSAGES = 1.0
+MAX_DELIVERY_ATTEMPTS = 5
+# How long messages still queued when the process exits are given to be delivered
+EXIT_FLUSH_TIMEOUT = 30.0
 
-def send_slack_notification(template, values, channel_id, options):
+
+class SlackNotifier:
+    """
+    Queues Slack messages and delivers them from a background thread through a single
+    Taskcluster Notify client.
+
+    Messages queued for the same channel within `coalesce_window` seconds of each other
+    are merged into one Block Kit payload, separated by dividers. Requests rejected with
+    HTTP 429 are retried, after the delay Slack asks for or with exponential backoff.
+    Other errors are not retried: a server error does not tell whether the message was
+    posted, and posting it again could duplicate it.
+
+    Waiting for messages with flush() sends them without waiting for the end of the
+    coalescing window.
+
+    The worker is a daemon thread, so messages still queued when the process exits are
+    flushed from an atexit handler, for up to EXIT_FLUSH_TIMEOUT seconds.
+    """
+
+    def __init__(self, options, coalesce_window=COALESCE_WINDOW):
+        self.client = taskcluster.Notify(options)
+        self.coalesce_window = coalesce_window
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._last_sent = 0.0
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+        atexit.register(self._flush_at_exit)
+
+    def send(self, blocks, channel_id):
+        """
+        Queues a message for delivery and returns immediately.
+
+        :param blocks: List of Block Kit blocks making up the message.
+        :param channel_id: Slack channel ID to send the message to.
+        :return: A Future resolved with the API response once the message is delivered.
+        """
+        future = Future()
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._forget)
+        self._queue.put((channel_id, blocks, future))
+        return future
+
+    def send_queued(self):
+        """Sends the queued messages without waiting for more messages to coalesce them with."""
+        self._queue.put(_SEND_QUEUED)
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every message queued so far has been delivered or has failed.
+
+        :param timeout: Maximum number of seconds to wait, or None to wait indefinitely.
+        :return: The number of messages still undelivered when the timeout expired.
+        """
+        with self._pending_lock:
+            pending = list(self._pending)
+        if pending:
+            self.send_queued()
+        return len(wait_futures(pending, timeout=timeout).not_done)
+
+    def _forget(self, future):
+        with self._pending_lock:
+            self._pending.discard(future)
+
+    def _flush_at_exit(self):
+        undelivered = self.flush(timeout=EXIT_FLUSH_TIMEOUT)
+        if undelivered:
+            print(
+                f"Dropping {undelivered} Slack message(s) not delivered "
+                f"within {EXIT_FLUSH_TIMEOUT:.0f}s of exiting"
+            )
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.coalesce_window
+            while batch[-1] is not _SEND_QUEUED:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            messages_per_channel = {}
+            for item in batch:
+                if item is _SEND_QUEUED:
+                    continue
+                channel_id, blocks, future = item
+                messages_per_channel.setdefault(channel_id, []).append((blocks, future))
+
+            for channel_id, messages in messages_per_channel.items():
+                try:
+                    for payload, futures in self._build_payloads(channel_id, messages):
+                        try:
+                            self._deliver(payload, futures)
+                        except Exception as e:
+                            # The worker must survive, or nothing else would ever be sent
+                            _fail_pending(futures, e)
+                except Exception as e:
+                    _fail_pending([future for _, future in messages], e)
+
+            for _ in batch:
+                self._queue.task_done()
+
+    def _build_payloads(self, channel_id, messages):
+        payloads = []
+        blocks, futures = [], []
+        for message_blocks, future in messages:
+            separator = [{"type": "divider"}] if blocks else []
+            if (
+                blocks
+                and len(blocks) + len(separator) + len(message_blocks)
+                > MAX_BLOCKS_PER_MESSAGE
+            ):
+                payloads.append((blocks, futures))
+                blocks, futures, separator = [], [], []
+            blocks = blocks + separator + message_blocks
+            futures.append(future)
+        payloads.append((blocks, futures))
+
+        return [
+            (
+                {
+                    "channelId": channel_id,
+                    # workaround for https://github.com/taskcluster/taskcluster/issues/6801
+                    "text": str(int(time.time())),
+                    "blocks": blocks,
+                },
+                futures,
+            )
+            for blocks, futures in payloads
+        ]
+
+    def _deliver(self, payload, futures):
+        for attempt in range(MAX_DELIVERY_ATTEMPTS):
+            wait = self._last_sent + MIN_SECONDS_BETWEEN_MESSAGES - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = self.client.slack(payload)
+                self._last_sent = time.monotonic()
+                for future in futures:
+                    future.set_result(response)
+                return
+            except Exception as e:
+                self._last_sent = time.monotonic()
+                # Only a rate-limited message is known not to have been posted
+                retryable = getattr(e, "status_code", None) == 429
+                if not retryable or attempt == MAX_DELIVERY_ATTEMPTS - 1:
+                    for future in futures:
+                        future.set_exception(e)
+                    return
+                time.sleep(_retry_after(e) or 2**attempt)
+
+
+# Queued by send_queued() to end the coalescing window early
+_SEND_QUEUED = object()
+
+
+def _fail_pending(futures, error):
+    for future in futures:
+        if not future.done():
+            future.set_exception(error)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+_notifiers = {}
+_notifiers_lock = threading.Lock()
+
+
+def get_notifier(options):
+    """
+    Returns the SlackNotifier shared by every caller using the same Taskcluster options.
+
+    :param options: Taskcluster options for the notification service.
+    """
+    key = json.dumps(options, sort_keys=True, default=str)
+    with _notifiers_lock:
+        if key not in _notifiers:
+            _notifiers[key] = SlackNotifier(options)
+        return _notifiers[key]
+
+
+def send_slack_notification(template, values, channel_id, options, wait=False):
     """
     Sends a Slack notification based on the provided template and values.
 
@@ -139,25 +349,35 @@ def send_slack_notification(template, values, channel_id, options):
     :param values: Dictionary containing values to substitute in the template.
     :param channel_id: Slack channel ID to send the message to.
     :param options: Taskcluster options for the notification service.
+    :param wait: Whether to block until the message is delivered. Otherwise, the message
+        is delivered in the background, at the latest when the process exits.
+    :return: A Future resolved once the message is delivered.
     """
     slack_message = json.loads(template.safe_substitute(**values))
-    # workaround for https://github.com/taskcluster/taskcluster/issues/6801
-    duplicate_message_workaround = str(int(time.time()))
-    payload = {
-        "channelId": channel_id,
-        "text": duplicate_message_workaround,
-        "blocks": slack_message,
-    }
+    notifier = get_notifier(options)
+    future = notifier.send(slack_message, channel_id)
+    future.add_done_callback(_report_delivery)
+    if wait:
+        notifier.send_queued()
+        try:
+            future.result()
+        except Exception:
+            # Already reported by _report_delivery
+            pass
+    return future
 
-    try:
-        response = taskcluster.Notify(options).slack(payload)
-        print("Response from API:", response)
-    except Exception as e:
-        print(f"Error sending Slack message: {e}")
-        traceback.print_exc()
 
-        if hasattr(e, "response"):
-            print("Response content:", e.response.text)
+def _report_delivery(future):
+    e = future.exception()
+    if e is None:
+        print("Response from API:", future.result())
+        return
+
+    print(f"Error sending Slack message: {e}")
+    traceback.print_exception(type(e), e, e.__traceback__)
+
+    if hasattr(e, "response"):
+        print("Response content:", e.response.text)
 
 
 def get_taskcluster_options():
@@ -180,15 +400,17 @@ def get_taskcluster_options():
     return options
 
 
-def send_error_notification(error_message, channel_id, options):
+def send_error_notification(error_message, channel_id, options, wait=False):
     values = {
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
         "error_message": error_message,
     }
-    send_slack_notification(SLACK_ERROR_MESSAGE_TEMPLATE, values, channel_id, options)
+    return send_slack_notification(
+        SLACK_ERROR_MESSAGE_TEMPLATE, values, channel_id, options, wait
+    )
 
 
-def send_success_notification(success_values, channel_id, options):
-    send_slack_notification(
-        SLACK_SUCCESS_MESSAGE_TEMPLATE, success_values, channel_id, options
+def send_success_notification(success_values, channel_id, options, wait=False):
+    return send_slack_notification(
+        SLACK_SUCCESS_MESSAGE_TEMPLATE, success_values, channel_id, options, wait
     )
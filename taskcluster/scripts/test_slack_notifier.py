@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import contextlib
+import io
+import threading
+import unittest
+from unittest import mock
+
+import slack_notifier
+
+CHANNEL_ID = "C0123456"
+
+
+class SlackError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+        self.response = mock.Mock(headers=headers, text="")
+
+
+class FakeNotify:
+    """Stands for taskcluster.Notify, recording the payloads posted to Slack."""
+
+    def __init__(self, options):
+        self.payloads = []
+        # Exceptions to raise, one per call, before posting again succeeds
+        self.errors = []
+        # Cleared to hold calls until it is set
+        self.unblocked = threading.Event()
+        self.unblocked.set()
+
+    def slack(self, payload):
+        self.unblocked.wait()
+        if self.errors:
+            raise self.errors.pop(0)
+        self.payloads.append(payload)
+        return {"ok": True}
+
+
+def patch(test_case, target, attribute, new):
+    patcher = mock.patch.object(target, attribute, new)
+    test_case.addCleanup(patcher.stop)
+    return patcher.start()
+
+
+def message(text, size=1):
+    return [{"type": "section", "text": {"type": "mrkdwn", "text": text}}] * size
+
+
+class SlackNotifierTestCase(unittest.TestCase):
+    def setUp(self):
+        patch(self, slack_notifier.taskcluster, "Notify", FakeNotify)
+        patch(self, slack_notifier, "atexit", mock.Mock())
+        # Spacing messages and backing off would slow the tests down
+        self.sleep = patch(self, slack_notifier.time, "sleep", mock.Mock())
+
+    def notifier(self, coalesce_window=0.2):
+        notifier = slack_notifier.SlackNotifier({}, coalesce_window=coalesce_window)
+        self.addCleanup(notifier.flush, 5)
+        return notifier
+
+    def test_coalescing(self):
+        notifier = self.notifier()
+        futures = [
+            notifier.send(message("first"), CHANNEL_ID),
+            notifier.send(message("second"), CHANNEL_ID),
+            notifier.send(message("elsewhere"), "C0654321"),
+        ]
+        for future in futures:
+            self.assertEqual(future.result(timeout=5), {"ok": True})
+
+        payloads = notifier.client.payloads
+        self.assertEqual(len(payloads), 2)
+        self.assertEqual(payloads[0]["channelId"], CHANNEL_ID)
+        self.assertEqual(
+            payloads[0]["blocks"],
+            message("first") + [{"type": "divider"}] + message("second"),
+        )
+        self.assertEqual(payloads[1]["blocks"], message("elsewhere"))
+
+    def test_split_at_max_blocks(self):
+        notifier = self.notifier()
+        futures = [
+            notifier.send(message(str(number), size=20), CHANNEL_ID)
+            for number in range(3)
+        ]
+        for future in futures:
+            future.result(timeout=5)
+
+        sizes = [len(payload["blocks"]) for payload in notifier.client.payloads]
+        # 20 + divider + 20, then 20: a third message would not fit in 50 blocks
+        self.assertEqual(sizes, [41, 20])
+        self.assertTrue(all(size <= slack_notifier.MAX_BLOCKS_PER_MESSAGE for size in sizes))
+
+    def test_rate_limited_message_is_retried_after_delay(self):
+        notifier = self.notifier()
+        notifier.client.errors = [SlackError(429, retry_after=7)]
+        future = notifier.send(message("retried"), CHANNEL_ID)
+
+        self.assertEqual(future.result(timeout=5), {"ok": True})
+        self.assertEqual(len(notifier.client.payloads), 1)
+        self.assertIn(mock.call(7.0), self.sleep.call_args_list)
+
+    def test_server_error_is_not_retried(self):
+        notifier = self.notifier()
+        error = SlackError(502)
+        notifier.client.errors = [error]
+        future = notifier.send(message("maybe posted"), CHANNEL_ID)
+
+        self.assertIs(future.exception(timeout=5), error)
+        self.assertEqual(notifier.client.payloads, [])
+        # The worker keeps delivering the next messages
+        self.assertEqual(
+            notifier.send(message("next"), CHANNEL_ID).result(timeout=5), {"ok": True}
+        )
+
+    def test_flush_at_exit(self):
+        # A window long enough that only the flush can send the message in time
+        notifier = self.notifier(coalesce_window=60)
+        (flush_at_exit,) = slack_notifier.atexit.register.call_args[0]
+        future = notifier.send(message("last words"), CHANNEL_ID)
+
+        flush_at_exit()
+        self.assertTrue(future.done())
+        self.assertEqual(len(notifier.client.payloads), 1)
+
+    def test_flush_at_exit_gives_up_after_timeout(self):
+        notifier = self.notifier()
+        notifier.client.unblocked.clear()
+        self.addCleanup(notifier.client.unblocked.set)
+        notifier.send(message("stuck"), CHANNEL_ID)
+
+        output = io.StringIO()
+        with mock.patch.object(slack_notifier, "EXIT_FLUSH_TIMEOUT", 0.3), (
+            contextlib.redirect_stdout(output)
+        ):
+            notifier._flush_at_exit()
+        self.assertIn("Dropping 1 Slack message(s)", output.getvalue())
+
+
+class SendSlackNotificationTestCase(unittest.TestCase):
+    def setUp(self):
+        patch(self, slack_notifier.taskcluster, "Notify", FakeNotify)
+        patch(self, slack_notifier, "atexit", mock.Mock())
+        patch(self, slack_notifier, "COALESCE_WINDOW", 60)
+        patcher = mock.patch.dict(slack_notifier._notifiers, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send_error(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return slack_notifier.send_error_notification(
+                "boom", CHANNEL_ID, {"rootUrl": "https://tc.example.com"}, **kwargs
+            )
+
+    def test_queues_by_default(self):
+        future = self.send_error()
+        self.assertFalse(future.done())
+        notifier = slack_notifier.get_notifier({"rootUrl": "https://tc.example.com"})
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(notifier.flush(timeout=5), 0)
+        self.assertTrue(future.done())
+
+    def test_wait_does_not_wait_for_the_coalescing_window(self):
+        future = self.send_error(wait=True)
+        # The window is 60s, waiting for it would hold the caller for a minute
+        self.assertTrue(future.done())
+        notifier = slack_notifier.get_notifier({"rootUrl": "https://tc.example.com"})
+        self.assertIn("boom", notifier.client.payloads[0]["blocks"][0]["text"]["text"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -66,7 +66,8 @@ def main():
 
     try:
         # Check if milestone exists
-        if testrail.does_milestone_exist(testrail_project_id, milestone_name):
+        milestone_index = testrail.milestone_index(testrail_project_id)
+        if milestone_name in milestone_index:
             print(f"Milestone for {milestone_name} already exists. Exiting script...")
             sys.exit()
 
@@ -14,13 +14,19 @@
 # Flank: https://flank.github.io/flank/
 
 import argparse
+import contextlib
+import importlib.util
+import io
+import json
 import logging
 import os
 import subprocess
 import sys
 from enum import Enum
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Callable, Dict, List, Optional, TextIO, Union
+
+import yaml
 
 
 # Worker paths and binaries
@@ -34,6 +40,124 @@ class Worker(Enum):
 ANDROID_TEST = "./automation/taskcluster/androidTest"
 
 
+class FlankOutputParser:
+    """Parse Flank output line by line while Flank is running.
+
+    The device list from the `AndroidArgs` section and the rows of the outcome table
+    are written to the markdown summary as soon as they are printed, so no log has to
+    be read back once Flank has finished.
+    """
+
+    def __init__(self, output_md: TextIO):
+        self.output_md = output_md
+        self.web_links: Dict[str, str] = {}
+        self.results_written = 0
+        self._android_args_lines: Optional[List[str]] = None
+        self._in_web_links = False
+        self._results_header_written = False
+
+    def feed(self, line: str) -> None:
+        """Consume a single line of Flank output."""
+        if self._android_args_lines is not None:
+            if line.endswith("RunTests\n"):
+                self._write_devices("".join(self._android_args_lines))
+                self._android_args_lines = None
+            else:
+                self._android_args_lines.append(line)
+            return
+
+        if line.endswith("AndroidArgs\n"):
+            self._android_args_lines = []
+            return
+
+        stripped = line.strip()
+        if stripped == "Matrices webLink":
+            self._in_web_links = True
+            return
+        if self._in_web_links:
+            fields = stripped.split()
+            if len(fields) == 2 and fields[0].startswith("matrix-"):
+                self.web_links[fields[0]] = fields[1]
+                return
+            self._in_web_links = False
+
+        # Outcome table: | OUTCOME | MATRIX ID | TEST AXIS VALUE | TEST DETAILS |
+        if stripped.startswith("\u2502"):
+            cells = [cell.strip() for cell in stripped.strip("\u2502").split("\u2502")]
+            if len(cells) == 4 and cells[1].startswith("matrix-"):
+                outcome, matrix_id, _, details = cells
+                self._write_result(
+                    matrix_id, outcome, self.web_links.get(matrix_id, ""), details
+                )
+
+    def finish(self, results_dir: str) -> None:
+        """Complete the markdown summary once Flank has exited.
+
+        The outcome table is only missing from the output when Flank failed early or
+        changed its output format; fall back to `matrix_ids.json` in that case.
+        """
+        if not self.results_written:
+            self._write_matrix_ids_results(Path(results_dir, "matrix_ids.json"))
+
+        write = self.output_md.write
+        write("---\n")
+        write("# References & Documentation\n")
+        write(
+            "* [Automated UI Testing Documentation](https://github.com/mozilla-mobile/shared-docs/blob/main/android/ui-testing.md)\n"
+        )
+        write(
+            "* Mobile Test Engineering on [Confluence](https://mozilla-hub.atlassian.net/wiki/spaces/MTE/overview) | [Slack](https://mozilla.slack.com/archives/C02KDDS9QM9) | [Alerts](https://mozilla.slack.com/archives/C0134KJ4JHL)\n"
+        )
+        self.output_md.flush()
+
+    def _write_matrix_ids_results(self, matrix_ids_path: Path) -> None:
+        # A summary is still worth writing without results, and Flank's exit code must
+        # not be replaced by a parsing error
+        try:
+            matrix_ids = json.loads(matrix_ids_path.read_text())
+            results = [
+                (
+                    matrix_result["matrixId"],
+                    matrix_result["outcome"],
+                    matrix_result["webLink"],
+                    axis["details"],
+                )
+                for matrix_result in matrix_ids.values()
+                for axis in matrix_result["axes"]
+            ]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.warning(msg=f"Could not read results from {matrix_ids_path}: {e}")
+            return
+        for result in results:
+            self._write_result(*result)
+
+    def _write_devices(self, android_args_yaml: str) -> None:
+        try:
+            android_args = yaml.safe_load(android_args_yaml)
+            devices = android_args["gcloud"]["device"]
+        except (yaml.YAMLError, KeyError, TypeError) as e:
+            logging.warning(msg=f"Could not parse AndroidArgs from Flank output: {e}")
+            return
+        self.output_md.write("# Devices\n")
+        self.output_md.write(yaml.safe_dump(devices))
+        self.output_md.flush()
+
+    def _write_result(
+        self, matrix_id: str, outcome: str, web_link: str, details: str
+    ) -> None:
+        if not self._results_header_written:
+            self.output_md.write("# Results\n")
+            self.output_md.write("| Matrix | Result | Firebase Test Lab | Details\n")
+            self.output_md.write("| --- | --- | --- | --- |\n")
+            self._results_header_written = True
+        self.output_md.write(
+            f"| {matrix_id} | {outcome}"
+            f"| [Firebase Test Lab]({web_link}) | {details}\n"
+        )
+        self.output_md.flush()
+        self.results_written += 1
+
+
 def setup_logging():
     """Configure logging for the script."""
     log_format = "%(message)s"
@@ -41,13 +165,16 @@ def setup_logging():
 
 
 def run_command(
-    command: List[Union[str, bytes]], log_path: Optional[str] = None
+    command: List[Union[str, bytes]],
+    log_path: Optional[str] = None,
+    line_handler: Optional[Callable[[str], None]] = None,
 ) -> int:
     """Execute a command, log its output, and check for errors.
 
     Args:
         command: The command to execute
         log_path: The path to a log file to write the command output to
+        line_handler: A callable invoked with every line of output as it arrives
     Returns:
         int: The exit code of the command
     """
@@ -55,14 +182,17 @@ def run_command(
     with subprocess.Popen(
         command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
     ) as process:
-        if log_path:
-            with open(log_path, "a") as log_file:
-                for line in process.stdout:
-                    sys.stdout.write(line)
-                    log_file.write(line)
-        else:
+        log_file = open(log_path, "a") if log_path else None
+        try:
             for line in process.stdout:
                 sys.stdout.write(line)
+                if log_file:
+                    log_file.write(line)
+                if line_handler:
+                    line_handler(line)
+        finally:
+            if log_file:
+                log_file.close()
         process.wait()
         sys.stdout.flush()
         if process.returncode != 0:
@@ -87,8 +217,59 @@ def setup_environment():
     )
 
 
+def plan_shards(flank_config: str, shard_history: Path) -> Optional[str]:
+    """Generate a Flank configuration balancing shards by the durations of earlier runs.
+
+    Args:
+        flank_config: The YML configuration for Flank to use e.g, automation/taskcluster/androidTest/flank-<config>.yml
+        shard_history: Directory containing JUnit reports of earlier runs
+    Returns:
+        str: The path of the generated configuration, or None if there is no usable history
+            and Flank's sharding is to be used
+    """
+    sys.path.append(str(Path(__file__).resolve().parents[1].joinpath("lib")))
+    import shard_planner
+
+    base_config_path = f"{ANDROID_TEST}/flank-{flank_config}.yml"
+    try:
+        durations, method_tests = shard_planner.select_tests(
+            shard_planner.load_durations(sorted(shard_history.rglob("*.xml"))),
+            shard_planner.read_test_targets(base_config_path),
+        )
+        if not durations:
+            logging.info(
+                msg=f"No test durations in {shard_history}, using Flank's sharding"
+            )
+            return None
+
+        shards = shard_planner.plan_shards(
+            durations,
+            shard_planner.shard_count_for_config(base_config_path),
+            method_tests,
+        )
+        config_path = os.path.join(
+            Worker.ARTIFACTS_DIR.value, f"flank-{flank_config}.yml"
+        )
+        shard_planner.write_flank_config(base_config_path, shards, config_path)
+    except Exception:
+        # A broken history must not keep the tests from running
+        logging.exception(
+            msg=f"Could not plan shards from {shard_history}, using Flank's sharding"
+        )
+        return None
+
+    logging.info(
+        msg=f"Planned {len(shards)} shards, slowest expected to take {shards[0][0]:.0f}s"
+    )
+    return config_path
+
+
 def execute_tests(
-    flank_config: str, apk_app: Path, apk_test: Optional[Path] = None
+    flank_config: str,
+    apk_app: Path,
+    apk_test: Optional[Path] = None,
+    output_parser: Optional[FlankOutputParser] = None,
+    config_path: Optional[str] = None,
 ) -> int:
     """Run UI tests on Firebase Test Lab using Flank.
 
@@ -96,6 +277,8 @@ def execute_tests(
         flank_config: The YML configuration for Flank to use e.g, automation/taskcluster/androidTest/flank-<config>.yml
         apk_app: Absolute path to a Android APK application package (optional) for robo test or instrumentation test
         apk_test: Absolute path to a Android APK androidTest package
+        output_parser: Parser fed with Flank's output while the tests are running
+        config_path: Path of a generated Flank configuration to use instead of flank_config
     Returns:
         int: The exit code of the command
     """
@@ -109,7 +292,7 @@ def execute_tests(
         "android",
         "run",
         "--config",
-        f"{ANDROID_TEST}/flank-{flank_config}.yml",
+        config_path or f"{ANDROID_TEST}/flank-{flank_config}.yml",
         "--app",
         str(apk_app),
         "--local-result-dir",
@@ -124,56 +307,51 @@ def execute_tests(
     if apk_test:
         flank_command.extend(["--test", str(apk_test)])
 
-    exit_code = run_command(flank_command, "flank.log")
+    exit_code = run_command(
+        flank_command,
+        "flank.log",
+        output_parser.feed if output_parser else None,
+    )
     if exit_code == 0:
         logging.info(msg="All UI test(s) have passed!")
     return exit_code
 
 
-def process_results(flank_config: str, test_type: str = "instrumentation") -> None:
+def load_android_test_script(name: str):
+    """Import one of the scripts in ANDROID_TEST, whose file names are not valid module names."""
+    spec = importlib.util.spec_from_file_location(
+        name.replace("-", "_"), os.path.join(ANDROID_TEST, f"{name}.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def process_results(
+    output_parser: FlankOutputParser, test_type: str = "instrumentation"
+) -> None:
     """Process and parse test results.
 
     Args:
-        flank_config: The YML configuration for Flank to use e.g, automation/taskcluster/androidTest/flank-<config>.yml
+        output_parser: The parser that was fed with Flank's output
+        test_type: The type of test that was run: robo or instrumentation
     """
 
-    # Ensure directories exist and scripts are executable
-    github_dir = os.path.join(Worker.ARTIFACTS_DIR.value, "github")
-    os.makedirs(github_dir, exist_ok=True)
-
-    parse_ui_test_script = os.path.join(ANDROID_TEST, "parse-ui-test.py")
-    parse_ui_test_fromfile_script = os.path.join(
-        ANDROID_TEST, "parse-ui-test-fromfile.py"
-    )
-
-    os.chmod(parse_ui_test_script, 0o755)
-    os.chmod(parse_ui_test_fromfile_script, 0o755)
-
-    # Run parsing scripts and check for errors
-    run_command(
-        [
-            parse_ui_test_script,
-            "--exit-code",
-            str(0),
-            "--log",
-            "flank.log",
-            "--results",
-            Worker.RESULTS_DIR.value,
-            "--output-md",
-            os.path.join(github_dir, "customCheckRunText.md"),
-            "--device-type",
-            flank_config,
-        ],
-        "flank.log",
-    )
+    output_parser.finish(Worker.RESULTS_DIR.value)
 
     # Process the results differently based on the test type: robo or instrumentation
     # Currently, robo test does not have a test file artifact to parse
     if test_type == "instrumentation":
-        run_command(
-            [parse_ui_test_fromfile_script, "--results", Worker.RESULTS_DIR.value],
-            "flank.log",
-        )
+        parse_ui_test_fromfile = load_android_test_script("parse-ui-test-fromfile")
+        failure_table = io.StringIO()
+        with contextlib.redirect_stdout(failure_table):
+            parse_ui_test_fromfile.parse_print_failure_results(
+                Path(Worker.RESULTS_DIR.value, "FullJUnitReport.xml")
+            )
+        # The failure table is read from flank.log, after Flank's own output
+        sys.stdout.write(failure_table.getvalue())
+        with open("flank.log", "a") as log_file:
+            log_file.write(failure_table.getvalue())
 
 
 def main():
@@ -193,21 +371,46 @@ def main():
         help="Absolute path to a Android APK androidTest package",
         default=None,
     )
+    parser.add_argument(
+        "--shard-history",
+        help="Directory containing JUnit reports of earlier runs, used to balance shards by test duration",
+        type=Path,
+        default=None,
+    )
     args = parser.parse_args()
 
     setup_environment()
 
-    # Only resolve apk_test if it is provided
-    apk_test_path = Path(args.apk_test).resolve() if args.apk_test else None
-    exit_code = execute_tests(
-        flank_config=args.flank_config,
-        apk_app=Path(args.apk_app).resolve(),
-        apk_test=apk_test_path,
-    )
+    github_dir = os.path.join(Worker.ARTIFACTS_DIR.value, "github")
+    os.makedirs(github_dir, exist_ok=True)
+
+    with open(
+        os.path.join(github_dir, "customCheckRunText.md"), "w", encoding="utf-8"
+    ) as output_md:
+        output_parser = FlankOutputParser(output_md)
+
+        # Sharding by duration only applies to instrumentation tests
+        config_path = None
+        if args.shard_history and args.apk_test:
+            config_path = plan_shards(args.flank_config, args.shard_history)
+
+        # Only resolve apk_test if it is provided
+        apk_test_path = Path(args.apk_test).resolve() if args.apk_test else None
+        exit_code = execute_tests(
+            flank_config=args.flank_config,
+            apk_app=Path(args.apk_app).resolve(),
+            apk_test=apk_test_path,
+            output_parser=output_parser,
+            config_path=config_path,
+        )
 
-    # Determine the instrumentation type to process the results differently
-    instrumentation_type = "instrumentation" if args.apk_test else "robo"
-    process_results(flank_config=args.flank_config, test_type=instrumentation_type)
+        # Determine the instrumentation type to process the results differently
+        instrumentation_type = "instrumentation" if args.apk_test else "robo"
+        try:
+            process_results(output_parser=output_parser, test_type=instrumentation_type)
+        except Exception:
+            # Reporting problems must not hide the outcome of the tests
+            logging.exception(msg="Could not process the test results")
 
     sys.exit(exit_code)
 
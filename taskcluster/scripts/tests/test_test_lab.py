@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.realpath(__file__))
+FIXTURES_DIR = os.path.join(TESTS_DIR, "fixtures")
+FULL_JUNIT_REPORT = os.path.join(TESTS_DIR, "..", "lib", "fixtures", "FullJUnitReport.xml")
+FENIX_ANDROID_TEST = os.path.join(
+    TESTS_DIR, "..", "..", "..", "fenix", "automation", "taskcluster", "androidTest"
+)
+
+# test-lab.py is not a valid module name
+spec = importlib.util.spec_from_file_location(
+    "test_lab", os.path.join(TESTS_DIR, "test-lab.py")
+)
+test_lab = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(test_lab)
+
+WEB_LINK = "https://console.firebase.google.com/project/moz-fenix/testlab/histories/bh.66b7091e15d53d45/matrices/{}"
+
+
+class FlankOutputParserTestCase(unittest.TestCase):
+    def setUp(self):
+        self.results_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.results_dir.cleanup)
+        self.output_md = io.StringIO()
+        self.parser = test_lab.FlankOutputParser(self.output_md)
+
+    def feed_fixture(self, name):
+        with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+            for line in f:
+                self.parser.feed(line)
+
+    def write_matrix_ids(self, content):
+        with open(os.path.join(self.results_dir.name, "matrix_ids.json"), "w") as f:
+            f.write(content)
+
+    def test_flank_output(self):
+        self.feed_fixture("flank-output.log")
+        self.parser.finish(self.results_dir.name)
+
+        self.assertEqual(
+            self.output_md.getvalue().split("---\n")[0],
+            "# Devices\n"
+            "- locale: en_US\n"
+            "  model: Pixel2.arm\n"
+            "  orientation: portrait\n"
+            "  version: 30\n"
+            "# Results\n"
+            "| Matrix | Result | Firebase Test Lab | Details\n"
+            "| --- | --- | --- | --- |\n"
+            "| matrix-1kd2qwf8mlaz7 | success"
+            f"| [Firebase Test Lab]({WEB_LINK.format(8617491127436562137)})"
+            " | 205 test cases passed, 1 flaky\n"
+            "| matrix-3pbs0ks6w4lby | failure"
+            f"| [Firebase Test Lab]({WEB_LINK.format(6049285218743205093)})"
+            " | 1 test cases failed, 206 passed\n",
+        )
+
+    def test_outcome_table_takes_precedence_over_matrix_ids(self):
+        self.write_matrix_ids("not json")
+        self.feed_fixture("flank-output.log")
+        self.parser.finish(self.results_dir.name)
+        self.assertEqual(self.parser.results_written, 2)
+
+    def test_matrix_ids_fallback(self):
+        self.write_matrix_ids(
+            json.dumps(
+                {
+                    "matrix-1kd2qwf8mlaz7": {
+                        "matrixId": "matrix-1kd2qwf8mlaz7",
+                        "outcome": "success",
+                        "webLink": "https://example.com/matrix",
+                        "axes": [{"details": "3 test cases passed"}],
+                    }
+                }
+            )
+        )
+        self.parser.finish(self.results_dir.name)
+        self.assertIn(
+            "| matrix-1kd2qwf8mlaz7 | success| [Firebase Test Lab](https://example.com/matrix)"
+            " | 3 test cases passed\n",
+            self.output_md.getvalue(),
+        )
+
+    def test_missing_or_malformed_matrix_ids(self):
+        for content in (None, "{", '{"matrix-1": {"outcome": "success"}}'):
+            with self.subTest(content=content):
+                self.setUp()
+                if content is not None:
+                    self.write_matrix_ids(content)
+                with self.assertLogs(level="WARNING"):
+                    self.parser.finish(self.results_dir.name)
+                self.assertEqual(self.parser.results_written, 0)
+                self.assertIn("# References & Documentation\n", self.output_md.getvalue())
+
+
+class PlanShardsTestCase(unittest.TestCase):
+    def setUp(self):
+        shard_history = tempfile.TemporaryDirectory()
+        self.addCleanup(shard_history.cleanup)
+        self.shard_history = Path(shard_history.name)
+        patcher = mock.patch.object(test_lab, "ANDROID_TEST", FENIX_ANDROID_TEST)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_report(self, content):
+        with open(self.shard_history / "JUnitReport.xml", "w") as f:
+            f.write(content)
+
+    def test_no_history(self):
+        with self.assertLogs(level="INFO") as logs:
+            self.assertIsNone(test_lab.plan_shards("arm64-v8a", self.shard_history))
+        self.assertIn("No test durations", logs.output[0])
+
+    def test_unusable_history_falls_back_to_flank_sharding(self):
+        with open(FULL_JUNIT_REPORT) as f:
+            report = f.read()
+        for problem, content in (
+            ("truncated", report[: len(report) // 2]),
+            ("bad duration", report.replace('time="41.532"', 'time="41,532"')),
+        ):
+            with self.subTest(problem=problem):
+                self.write_report(content)
+                with self.assertLogs(level="ERROR") as logs:
+                    self.assertIsNone(
+                        test_lab.plan_shards("arm64-v8a", self.shard_history)
+                    )
+                self.assertIn("using Flank's sharding", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()